@@ -0,0 +1,78 @@
+"""
+Leaner JSON API responses.
+
+- ``project`` trims rows down to the columns an endpoint actually needs.
+- ``init_app`` registers an after_request hook that gives /api/ JSON
+  responses (or any of ``mimetypes``) a strong ETag (304 on a matching
+  If-None-Match) and gzip or brotli compression, negotiated from
+  Accept-Encoding.
+"""
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # optional - gzip only without it
+    brotli = None
+
+from flask import request
+
+from metrics import timed
+
+MIN_COMPRESS_BYTES = 512
+
+
+def project(row, columns):
+    """Copy of ``row`` with only ``columns`` (plus computed distance_km if present)."""
+    projected = {column: row.get(column) for column in columns}
+    if 'distance_km' in row:
+        projected['distance_km'] = row['distance_km']
+    return projected
+
+
+def _accepts(request, coding):
+    return request.accept_encodings[coding] > 0
+
+
+def _pick_encoding(request, size):
+    if size < MIN_COMPRESS_BYTES:
+        return None
+    if brotli is not None and _accepts(request, 'br'):
+        return 'br'
+    if _accepts(request, 'gzip'):
+        return 'gzip'
+    return None
+
+
+def init_app(app, prefix='/api/', mimetypes=('application/json',)):
+    @app.after_request
+    def conditional_compressed_json(response):
+        if (not request.path.startswith(prefix) or request.method not in ('GET', 'HEAD')
+                or response.status_code != 200 or response.mimetype not in mimetypes
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        body = response.get_data()
+        encoding = _pick_encoding(request, len(body))
+        # Strong ETags must differ per content-coding, so tag the encoded variants
+        etag = hashlib.sha1(body).hexdigest()
+        if encoding:
+            etag = f'{etag}-{encoding}'
+        response.set_etag(etag)
+        response.headers.setdefault('Cache-Control', 'private, no-cache')
+        response.vary.add('Accept-Encoding')
+
+        response.make_conditional(request)
+        if response.status_code == 304 or not encoding:
+            return response
+
+        with timed('compress', 'response_compress_seconds', 'Response body compression.', encoding=encoding):
+            if encoding == 'br':
+                response.set_data(brotli.compress(body, quality=5))
+            else:
+                response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return app
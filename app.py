@@ -1,45 +1,142 @@
 # Import necessary libraries
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-from geopy.distance import geodesic
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash, g, has_request_context
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import contextvars
 from datetime import datetime
 from dotenv import load_dotenv
 import os
 import hashlib
 import uuid
-import requests
 import json
+import math
+import tempfile
+import threading
+import time
+
+import api_responses
+import map_payloads
+import metrics
+import resilience
+from api_responses import project
+from background_index import BackgroundIndex
+from chat import conversation_key, parse_message
+from chat_mailbox import Mailboxes
+from geo_distance import rank_by_distance
+from geo_index import GeoGridIndex, cell_key, cells_covering
+from geo_snapshot import SharedGeoSnapshot
+from health_probe import HealthProbe
+from heatmap import LAYERS as HEAT_LAYERS, HexGrid
+from live_updates import KINDS as LIVE_KINDS, Area, SpatialPubSub
+from location_updates import LocationBuffer
+from map_clusters import ClusterGrid, MAX_ZOOM
+from neighborhoods import NeighborhoodIndex
+from pagination import decode_cursor, encode_cursor, page_limit
+from resilience import CircuitBreaker
+from review_stats import MAX_COMMENT_LENGTH, parse_rating, totals_of
+from search_index import SearchIndex
+from seed import demo_dataset
+from storage import MemoryBackend, SupabaseBackend
+from supabase_client import CircuitOpenError, SupabaseClient, SupabaseError
+from swr_cache import StaleWhileRevalidateCache
+from user_cache import UserCache
 
 # Load environment variables
 load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+metrics.init_app(app)  # Server-Timing on every response + /metrics for Prometheus
+# ETag + gzip/brotli for /api/ JSON and the compact map formats
+api_responses.init_app(app, mimetypes=('application/json', map_payloads.COLUMNAR_MIMETYPE, map_payloads.BINARY_MIMETYPE))
 
 # 🚀 SUPABASE REST API - ULTRA FAST & RELIABLE!
 SUPABASE_URL = os.environ.get('SUPABASE_URL', 'https://your-project.supabase.co')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY', 'your-anon-key')
 
-# Supabase REST API headers
-SUPABASE_HEADERS = {
-    'apikey': SUPABASE_KEY,
-    'Authorization': f'Bearer {SUPABASE_KEY}',
-    'Content-Type': 'application/json',
-    'Prefer': 'return=representation'
-}
-
-# Check if Supabase is configured
-try:
-    if not SUPABASE_URL or not SUPABASE_KEY or 'your-project' in SUPABASE_URL:
-        raise Exception("Supabase credentials not configured")
-
-    # Test connection with a simple request
-    test_response = requests.get(f'{SUPABASE_URL}/rest/v1/', headers=SUPABASE_HEADERS, timeout=5)
-    SUPABASE_CONNECTED = True
-    print("🚀 Supabase REST API connected successfully!")
-except Exception as e:
-    print(f"⚠️  Supabase connection failed: {e}")
-    print("📝 Using mock data for development")
-    SUPABASE_CONNECTED = False
+# ⏱️ Every request gets a time budget, and a breaker stops us hammering a Supabase that's down!
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 8))
+supabase_breaker = CircuitBreaker(
+    failure_ratio=float(os.environ.get('SUPABASE_BREAKER_FAILURE_RATIO', 0.5)),
+    min_calls=int(os.environ.get('SUPABASE_BREAKER_MIN_CALLS', 20)),
+    open_seconds=float(os.environ.get('SUPABASE_BREAKER_OPEN_SECONDS', 15)),
+    name='Supabase REST API',
+)
+
+# One pooled, keep-alive client for every Supabase call - no handshake per query!
+supabase = SupabaseClient(
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    pool_size=int(os.environ.get('SUPABASE_POOL_SIZE', 10)),
+    keep_alive=os.environ.get('SUPABASE_KEEP_ALIVE', '1') != '0',
+    connect_timeout=float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.environ.get('SUPABASE_READ_TIMEOUT', 10)),
+    max_retries=int(os.environ.get('SUPABASE_MAX_RETRIES', 2)),
+    on_request=metrics.observe_supabase,
+    deadline=resilience.remaining,
+    breaker=supabase_breaker,
+    hedge_reads=os.environ.get('SUPABASE_HEDGE_READS', '1') != '0',
+    single_flight=os.environ.get('SUPABASE_SINGLE_FLIGHT', '1') != '0',
+)
+metrics.registry.add_collector(lambda: [
+    ('supabase_circuit_open', 'Is the Supabase circuit breaker open (1) or half-open (0.5)?', {},
+     {'closed': 0, 'half_open': 0.5, 'open': 1}[supabase_breaker.state]),
+    ('supabase_circuit_rejected', 'Calls failed fast by the open circuit breaker.', {}, supabase_breaker.rejected),
+] + [(f'supabase_{name}', f'Supabase {name.replace("_", " ")}.', {}, value) for name, value in supabase.stats().items()])
+metrics.registry.add_collector(lambda: [
+    sample
+    for table, (sent, collapsed) in supabase.single_flight_stats().items()
+    for sample in (
+        ('supabase_single_flight_queries', 'Supabase GETs actually sent (single-flight leaders).', {'table': table}, sent),
+        ('supabase_single_flight_collapsed', 'Supabase GETs that shared an identical query in flight.', {'table': table}, collapsed),
+    )
+])
+
+@app.before_request
+def start_request_deadline():
+    g.deadline_token = resilience.set_deadline(REQUEST_DEADLINE_SECONDS)
+
+@app.teardown_request
+def end_request_deadline(exc):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        resilience.reset_deadline(token)
+
+@app.errorhandler(SupabaseError)
+def backend_unavailable(e):
+    """Supabase down, slow or out of budget -> a quick 503 with Retry-After, not a hang or a 500"""
+    unavailable = e.status is None or e.status >= 500 or e.status == 429
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': 'Backend temporarily unavailable, try again shortly' if unavailable else str(e)})
+    else:
+        response = Response(f"""
+        <h1>⏳ PingGov can't reach its database right now</h1>
+        <p>Please try again in a few seconds.</p>
+        <p><a href="{url_for('home')}">Go to Home Page</a></p>
+        """, mimetype='text/html')
+    response.status_code = 503 if unavailable else 500
+    if unavailable:
+        retry_after = e.retry_after if isinstance(e, CircuitOpenError) else 1
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+# Check Supabase lazily in the background - importing the app never blocks on the network!
+SUPABASE_CONFIGURED = bool(SUPABASE_URL and SUPABASE_KEY and 'your-project' not in SUPABASE_URL)
+supabase_health = HealthProbe(
+    lambda: supabase.ping(timeout=5),
+    interval=float(os.environ.get('SUPABASE_HEALTH_INTERVAL', 30)),
+    first_wait=float(os.environ.get('SUPABASE_HEALTH_FIRST_WAIT', 1)),
+    name='Supabase REST API',
+)
+
+def supabase_connected():
+    """Is Supabase configured and has it answered since boot? Until then we serve mock data"""
+    return SUPABASE_CONFIGURED and supabase_health.is_up()
+
+if SUPABASE_CONFIGURED:
+    supabase_health.start()
+else:
+    print("📝 Supabase not configured - using mock data for development")
 
 # Simple session management (no complex Flask-Login needed)
 def hash_password(password):
@@ -58,27 +155,27 @@ def require_login(f):
 
 def get_current_user():
     if 'user_id' in session:
-        if not SUPABASE_CONNECTED:
-            return next((user for user in MOCK_USERS if user['id'] == session['user_id']), None)
-
-        response = requests.get(
-            f'{SUPABASE_URL}/rest/v1/users?id=eq.{session["user_id"]}',
-            headers=SUPABASE_HEADERS
-        )
-        data = response.json()
-        return data[0] if data else None
+        return get_user_by_id(session['user_id'])
     return None
 # 🚀 NO DATABASE MODELS NEEDED!
 # Supabase handles everything automatically with tables:
-# - users (id, username, email, password, user_type, latitude, longitude, bio, business_name, business_category, rating, created_at)
-# - forum_posts (id, user_id, content, latitude, longitude, created_at)
-# - chats (id, sender_id, receiver_id, message, created_at)
+# - users (id, username, email, password, user_type, latitude, longitude, bio, business_name, business_category, rating, created_at,
+#          review_count, rating_sum, rating_histogram, neighborhood_id) - rating is the average of the business's reviews
+# - forum_posts (id, user_id, content, latitude, longitude, cell, neighborhood_id, created_at)
+#     cell = grid bucket of (latitude, longitude), index it: (cell, created_at desc, id desc)
+#     neighborhood_id = polygon from data/neighborhoods.geojson, index it: (neighborhood_id, created_at desc, id desc)
+# - chats (id, conversation, sender_id, receiver_id, message, created_at)
+#     conversation = both user ids, sorted, index it: (conversation, created_at desc, id desc)
+# - conversations (id, owner_id, other_id, last_message_id, last_sender_id, last_message, last_message_at,
+#                  message_count, unread_count) - one summary per person per chat, index (owner_id, last_message_at desc, id desc)
+# - reviews (id, business_id, reviewer_id, rating, comment, created_at, updated_at), unique (business_id, reviewer_id)
+# - heatmap_cells (id, zoom, layer, q, r, tile_x, tile_y, count) - one counter per hexagon, index (zoom, tile_x, tile_y)
 
 # 🎭 MOCK DATA for local development (when Supabase not configured)
 MOCK_USERS = [
     {'id': '1', 'username': 'john_nyc', 'email': 'john@example.com', 'password': hash_password('password123'), 'user_type': 'person', 'latitude': 40.7589, 'longitude': -73.9851, 'bio': 'Love exploring NYC!', 'rating': 4.5},
     {'id': '2', 'username': 'sarah_manhattan', 'email': 'sarah@example.com', 'password': hash_password('password123'), 'user_type': 'person', 'latitude': 40.7505, 'longitude': -73.9934, 'bio': 'Coffee enthusiast', 'rating': 4.8},
-    {'id': '3', 'username': 'joes_coffee', 'email': 'info@joescoffee.com', 'password': hash_password('business123'), 'user_type': 'business', 'latitude': 40.7614, 'longitude': -73.9776, 'business_name': "Joe's Coffee Shop", 'business_category': 'Restaurant', 'bio': 'Best coffee in NYC!', 'rating': 4.7}
+    {'id': '3', 'username': 'joes_coffee', 'email': 'info@joescoffee.com', 'password': hash_password('business123'), 'user_type': 'business', 'latitude': 40.7614, 'longitude': -73.9776, 'business_name': "Joe's Coffee Shop", 'business_category': 'Restaurant', 'bio': 'Best coffee in NYC!', 'rating': None, 'review_count': 0, 'rating_sum': 0, 'rating_histogram': [0, 0, 0, 0, 0]}
 ]
 
 MOCK_POSTS = [
@@ -86,28 +183,39 @@ MOCK_POSTS = [
     {'id': '2', 'user_id': '2', 'content': 'New coffee shop opened on 8th Ave! Great espresso ☕', 'latitude': 40.7505, 'longitude': -73.9934, 'created_at': '2025-01-27T09:00:00Z', 'users': {'username': 'sarah_manhattan', 'user_type': 'person'}}
 ]
 
+# ⚡ USER CACHE - hot user rows stay in memory, and are read once per request!
+user_cache = UserCache(
+    max_entries=int(os.environ.get('USER_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('USER_CACHE_TTL', 60)),
+)
+metrics.registry.add_collector(lambda: [
+    (f'user_cache_{name}', f'User cache {name.replace("_", " ")}.', {}, value)
+    for name, value in user_cache.stats().items()
+] + [('supabase_up', 'Serving from Supabase (1) or, before it first answered, mock data (0).', {}, int(bool(supabase_health.healthy)))])
+
+def cached_user(field, value, load):
+    """Look a user up in the request memo, then the shared cache, then the backend"""
+    memo = g.setdefault('user_memo', {}) if has_request_context() else None
+    if memo is not None and (field, value) in memo:
+        user_cache.request_hits += 1
+        return memo[(field, value)]
+    user = user_cache.get(field, value)
+    if user is None:
+        user = load()
+        user_cache.put(user)
+    if memo is not None:
+        memo[(field, value)] = user
+    return user
+
+def invalidate_user(user):
+    """Call after ANY write to a users row (registration, profile or location update)"""
+    user_cache.invalidate(user.get('id'), user.get('email'), user.get('username'))
+    if has_request_context():
+        g.pop('user_memo', None)
+
 # Helper functions for database operations
 def create_user(username, email, password, user_type, latitude=None, longitude=None, bio=None, business_name=None, business_category=None):
     """Create a new user - ONE LINE!"""
-    if not SUPABASE_CONNECTED:
-        # Mock response for local development
-        user_data = {
-            'id': str(uuid.uuid4()),
-            'username': username,
-            'email': email,
-            'password': hash_password(password),
-            'user_type': user_type,
-            'latitude': latitude,
-            'longitude': longitude,
-            'bio': bio,
-            'business_name': business_name,
-            'business_category': business_category,
-            'rating': 4.5,
-            'created_at': datetime.utcnow().isoformat()
-        }
-        MOCK_USERS.append(user_data)
-        return type('MockResult', (), {'data': [user_data]})()
-
     user_data = {
         'id': str(uuid.uuid4()),
         'username': username,
@@ -119,110 +227,711 @@ def create_user(username, email, password, user_type, latitude=None, longitude=N
         'bio': bio,
         'business_name': business_name,
         'business_category': business_category,
-        'rating': 4.5,
+        'rating': None,  # set by the first review
+        'review_count': 0,
+        'rating_sum': 0,
+        'rating_histogram': [0, 0, 0, 0, 0],
+        'neighborhood_id': neighborhoods.locate_id(latitude, longitude),
         'created_at': datetime.utcnow().isoformat()
     }
-    # Insert user via REST API
-    response = requests.post(
-        f'{SUPABASE_URL}/rest/v1/users',
-        headers=SUPABASE_HEADERS,
-        json=user_data
-    )
-    return response.json()
+    created = store().create_user(user_data)
+    invalidate_user(user_data)
+    invalidate_business(user_data)
+    index_business_search(user_data)
+    index_user_location(user_data)
+    record_heat(heat_grid.changes(user_type, new=(latitude, longitude)))
+    publish_user_location(user_data)
+    return created
+
+def _load_user(field, value):
+    return store().get_user(field, value)
+
+def get_user_by_id(user_id):
+    """Get user by id - CACHED!"""
+    return cached_user('id', user_id, lambda: _load_user('id', user_id))
 
 def get_user_by_email(email):
-    """Get user by email - ONE LINE!"""
-    if not SUPABASE_CONNECTED:
-        return next((user for user in MOCK_USERS if user['email'] == email), None)
-
-    response = requests.get(
-        f'{SUPABASE_URL}/rest/v1/users?email=eq.{email}',
-        headers=SUPABASE_HEADERS
-    )
-    data = response.json()
-    return data[0] if data else None
+    """Get user by email - CACHED!"""
+    return cached_user('email', email, lambda: _load_user('email', email))
 
 def get_user_by_username(username):
-    """Get user by username - ONE LINE!"""
-    if not SUPABASE_CONNECTED:
-        return next((user for user in MOCK_USERS if user['username'] == username), None)
-
-    response = requests.get(
-        f'{SUPABASE_URL}/rest/v1/users?username=eq.{username}',
-        headers=SUPABASE_HEADERS
+    """Get user by username - CACHED!"""
+    return cached_user('username', username, lambda: _load_user('username', username))
+
+# 📍 SPATIAL INDEX - nearby queries only touch the grid cells around you!
+DEFAULT_LOCATION = (40.7589, -73.9851)  # Times Square
+NEARBY_DEFAULT_RADIUS_KM = float(os.environ.get('NEARBY_DEFAULT_RADIUS_KM', 5))
+NEARBY_MAX_RESULTS = int(os.environ.get('NEARBY_MAX_RESULTS', 200))
+GEO_INDEX_REFRESH_SECONDS = int(os.environ.get('GEO_INDEX_REFRESH_SECONDS', 300))
+GEO_INDEX_PAGE_SIZE = 1000
+
+# 🔒 Only the columns the map needs - never emails or password hashes!
+NEARBY_USER_COLUMNS = ('id', 'username', 'user_type', 'latitude', 'longitude', 'bio', 'rating')
+NEARBY_BUSINESS_COLUMNS = NEARBY_USER_COLUMNS + ('business_name', 'business_category', 'review_count')
+CLUSTER_MAX_ZOOM = int(os.environ.get('CLUSTER_MAX_ZOOM', 14))
+CLUSTER_POINT_THRESHOLD = int(os.environ.get('CLUSTER_POINT_THRESHOLD', 150))
+
+def new_geo_index():
+    # Per-zoom cluster aggregates ride along with the index, updated on every write
+    return GeoGridIndex(clusters=ClusterGrid(max_cluster_zoom=CLUSTER_MAX_ZOOM))
+
+def build_geo_index():
+    with metrics.timed('geo_index', 'geo_index_build_seconds', 'Full spatial index rebuilds.'):
+        index = new_geo_index()
+        for user_id, latitude, longitude, user_type, _ in store().iter_user_locations():
+            index.upsert(user_id, latitude, longitude, user_type)
+    return index
+
+# 🗺️ One memory-mapped snapshot of every location, shared by ALL worker processes - no copy per worker!
+GEO_SNAPSHOT = os.environ.get('GEO_SNAPSHOT', '1') != '0'
+GEO_SNAPSHOT_PATH = os.environ.get('GEO_SNAPSHOT_PATH') or os.path.join(
+    tempfile.gettempdir(), f'pinggov-geo-{hashlib.sha1(SUPABASE_URL.encode()).hexdigest()[:10]}.snapshot')
+
+def load_snapshot_points():
+    with metrics.timed('geo_index', 'geo_index_build_seconds', 'Full spatial index rebuilds.'):
+        return list(supabase_backend.iter_user_locations())
+
+geo_snapshot = SharedGeoSnapshot(
+    GEO_SNAPSHOT_PATH,
+    load_snapshot_points,
+    max_age=GEO_INDEX_REFRESH_SECONDS,
+    max_cluster_zoom=CLUSTER_MAX_ZOOM,
+)
+metrics.registry.add_collector(lambda: [
+    (f'geo_snapshot_{name}', f'Shared geo snapshot {name.replace("_", " ")}.', {}, value)
+    for name, value in geo_snapshot.stats().items()
+])
+
+# Without the snapshot: one index per worker, built and refreshed off the request path
+geo_index = BackgroundIndex(build_geo_index, max_age=GEO_INDEX_REFRESH_SECONDS, name='Spatial index')
+
+def get_geo_index():
+    """Spatial index of user locations - a 503 while the first full build runs in the background"""
+    index = store().spatial_index()
+    if index is not None:
+        return index  # the in-memory store indexes its own writes
+    index = geo_snapshot.index() if GEO_SNAPSHOT else geo_index.get()
+    if index is None:
+        raise SupabaseError('Spatial index is still loading', status=503)
+    return index
+
+def index_user_location(user):
+    """Keep the spatial index current after a user registers or moves"""
+    if not user or store().spatial_index() is not None:
+        return
+    index = geo_snapshot.current() if GEO_SNAPSHOT else geo_index.current()
+    if index is not None:
+        index.upsert(user['id'], user.get('latitude'), user.get('longitude'), user['user_type'])
+
+def get_users_by_ids(user_ids, columns=None):
+    """Fetch user rows for a list of ids, keeping the order of user_ids
+
+    With columns, rows are projected and only those columns are selected from
+    Supabase (partial rows are not put in the user cache).
+    """
+    if not user_ids:
+        return []
+    by_id = {}
+    for user_id in user_ids:
+        user = user_cache.get('id', user_id)
+        if user is not None:
+            by_id[user_id] = user
+    missing = [user_id for user_id in user_ids if user_id not in by_id]
+    rows = store().get_users(missing, columns) if missing else []
+    for user in rows:
+        if not columns:
+            user_cache.put(user)
+        by_id[user['id']] = user
+    users = [by_id[user_id] for user_id in user_ids if user_id in by_id]
+    return [project(user, columns) for user in users] if columns else users
+
+# 🏪 BUSINESS CACHE - business rows per map cell, served stale while a background refresh runs!
+BUSINESS_CELL_DEG = 0.05  # ~5.5 km
+BUSINESS_CACHE_FRESH_SECONDS = float(os.environ.get('BUSINESS_CACHE_FRESH_SECONDS', 60))
+BUSINESS_CACHE_MAX_STALE_SECONDS = float(os.environ.get('BUSINESS_CACHE_MAX_STALE_SECONDS', 600))
+
+def business_cell(latitude, longitude):
+    return math.floor(float(latitude) / BUSINESS_CELL_DEG), math.floor(float(longitude) / BUSINESS_CELL_DEG)
+
+def load_business_cells(cells):
+    """{cell: {id: row}} for a block of cells - ONE query for their bounding box"""
+    rows = [row for row, _ in cells]
+    cols = [col for _, col in cells]
+    loaded = {cell: {} for cell in cells}
+    with metrics.timed('business_cache', 'business_cache_load_seconds', 'Business cell loads from the store.'):
+        businesses = store().get_users_in_box(
+            'business', min(rows) * BUSINESS_CELL_DEG, min(cols) * BUSINESS_CELL_DEG,
+            (max(rows) + 1) * BUSINESS_CELL_DEG, (max(cols) + 1) * BUSINESS_CELL_DEG, NEARBY_BUSINESS_COLUMNS)
+    for business in businesses:
+        cell = business_cell(business['latitude'], business['longitude'])
+        if cell in loaded:
+            loaded[cell][business['id']] = project(business, NEARBY_BUSINESS_COLUMNS)
+    return loaded
+
+business_cache = StaleWhileRevalidateCache(
+    load_business_cells,
+    fresh_for=BUSINESS_CACHE_FRESH_SECONDS,
+    max_stale=BUSINESS_CACHE_MAX_STALE_SECONDS,
+    max_entries=int(os.environ.get('BUSINESS_CACHE_CELLS', 2000)),
+    name='business-refresh',
+)
+metrics.registry.add_collector(lambda: [
+    (f'business_cache_{name}', f'Business cell cache {name.replace("_", " ")}.', {}, value)
+    for name, value in business_cache.stats().items()
+])
+
+def get_businesses_by_ids(business_ids):
+    """Business rows for spatial index hits, from the per-cell cache (keeps the order of business_ids)"""
+    index = get_geo_index()
+    cells = {}
+    for business_id in business_ids:
+        point = index.get(business_id)
+        if point is not None:
+            cells[business_id] = business_cell(point[0], point[1])
+    by_cell = business_cache.get_many(set(cells.values())) if cells else {}
+    found, missing = {}, []
+    for business_id in business_ids:
+        row = by_cell.get(cells.get(business_id), {}).get(business_id)
+        if row is None:
+            missing.append(business_id)  # newer than its cell's entry (e.g. written by another worker)
+        else:
+            found[business_id] = row
+    for row in get_users_by_ids(missing, NEARBY_BUSINESS_COLUMNS):
+        found[row['id']] = row
+    return [found[business_id] for business_id in business_ids if business_id in found]
+
+def invalidate_business(user, previous=None):
+    """Call after a business registers, moves or edits its profile (previous = old (lat, lng))"""
+    if user.get('user_type') != 'business':
+        return
+    points = [(user.get('latitude'), user.get('longitude'))] + ([previous] if previous else [])
+    business_cache.invalidate(*{business_cell(lat, lng) for lat, lng in points if lat is not None and lng is not None})
+
+# 🔎 BUSINESS SEARCH - autocomplete straight from memory, no database round trip per keystroke!
+SEARCH_MAX_RESULTS = 50
+SEARCH_INDEX_REFRESH_SECONDS = int(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS', 300))
+
+def build_search_index(backend):
+    with metrics.timed('search_index', 'search_index_build_seconds', 'Full business search index builds.'):
+        index = SearchIndex()
+        for business in backend.iter_users('business', NEARBY_BUSINESS_COLUMNS):
+            index.add(project(business, NEARBY_BUSINESS_COLUMNS))
+    return index
+
+def get_search_index():
+    """Business search index - a 503 while the first full build runs in the background"""
+    backend = store()
+    # The in-memory store is scanned without network calls, so it's built right here
+    index = search_indexes[backend].get(block=backend is memory_backend)
+    if index is None:
+        raise SupabaseError('Business search index is still loading', status=503)
+    return index
+
+def index_business_search(user):
+    """Keep search current after a business registers or edits its profile"""
+    index = search_indexes[store()].current()
+    if index is not None and user.get('user_type') == 'business':
+        index.add(project(user, NEARBY_BUSINESS_COLUMNS))
+
+def move_business_search(user):
+    """A business's location changed: move it in the search index without re-indexing its text"""
+    index = search_indexes[store()].current()
+    if index is not None and user.get('user_type') == 'business':
+        index.move(user['id'], user['latitude'], user['longitude'])
+
+def resolve_origin(latitude, longitude):
+    if latitude is None or longitude is None:
+        return DEFAULT_LOCATION
+    return float(latitude), float(longitude)
+
+def find_nearby(user_type, latitude=None, longitude=None, radius_km=None, k=None, exclude_user_id=None):
+    """Radius or k-nearest lookup against the spatial index -> [(id, distance_km)]"""
+    latitude, longitude = resolve_origin(latitude, longitude)
+    index = get_geo_index()
+    if k:
+        return index.nearest(latitude, longitude, min(k, NEARBY_MAX_RESULTS), user_type,
+                             max_radius_km=radius_km, exclude_id=exclude_user_id)
+    return index.within_radius(latitude, longitude, radius_km or NEARBY_DEFAULT_RADIUS_KM, user_type,
+                               limit=NEARBY_MAX_RESULTS, exclude_id=exclude_user_id)
+
+# 🔀 FAN-OUT - independent backend queries for one page run side by side!
+backend_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BACKEND_FANOUT_WORKERS', 8)),
+    thread_name_prefix='backend-fanout'
+)
+
+def run_concurrently(**calls):
+    """Run zero-arg callables on the backend pool -> {name: result}; re-raises the first error"""
+    # Each call runs in a copy of this context, so its Supabase timings land on this request
+    futures = {name: backend_pool.submit(contextvars.copy_context().run, call) for name, call in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+def get_nearby(exclude_user_id=None, latitude=None, longitude=None, radius_km=None, k=None, accurate=False):
+    """People AND businesses around you, fetched concurrently -> {'users': [...], 'businesses': [...]}"""
+    return run_concurrently(
+        users=lambda: get_nearby_users(exclude_user_id, latitude, longitude, radius_km, k, accurate),
+        businesses=lambda: get_nearby_businesses(latitude, longitude, radius_km, k, accurate),
     )
-    data = response.json()
-    return data[0] if data else None
-
-def get_nearby_users(exclude_user_id=None):
-    """Get all nearby users - ONE LINE!"""
-    if not SUPABASE_CONNECTED:
-        users = [user for user in MOCK_USERS if user['user_type'] == 'person']
-        if exclude_user_id:
-            users = [user for user in users if user['id'] != exclude_user_id]
-        return users
-
-    url = f'{SUPABASE_URL}/rest/v1/users?user_type=eq.person'
-    if exclude_user_id:
-        url += f'&id=neq.{exclude_user_id}'
-
-    response = requests.get(url, headers=SUPABASE_HEADERS)
-    return response.json()
-
-def get_nearby_businesses():
-    """Get all nearby businesses - ONE LINE!"""
-    if not SUPABASE_CONNECTED:
-        return [user for user in MOCK_USERS if user['user_type'] == 'business']
-
-    response = requests.get(
-        f'{SUPABASE_URL}/rest/v1/users?user_type=eq.business',
-        headers=SUPABASE_HEADERS
+
+def get_viewport_layer(user_type, bbox, zoom, exclude_user_id=None, latitude=None, longitude=None):
+    """One map layer inside bbox - pre-aggregated clusters when zoomed out, real rows when zoomed in"""
+    south, west, north, east = bbox
+    index = get_geo_index()
+    if zoom <= CLUSTER_MAX_ZOOM:
+        clusters = index.clusters.clusters(user_type, zoom, south, west, north, east)
+        if sum(cluster['count'] for cluster in clusters) > CLUSTER_POINT_THRESHOLD:
+            return {'clustered': True, 'clusters': clusters, 'points': []}
+    user_ids = index.within_bbox(user_type, south, west, north, east,
+                                 limit=NEARBY_MAX_RESULTS, exclude_id=exclude_user_id)
+    rows = get_businesses_by_ids(user_ids) if user_type == 'business' else get_users_by_ids(user_ids, NEARBY_USER_COLUMNS)
+    points = rank_by_distance(rows, *resolve_origin(latitude, longitude))
+    return {'clustered': False, 'clusters': [], 'points': points}
+
+def get_viewport(bbox, zoom, exclude_user_id=None, latitude=None, longitude=None):
+    """Both map layers for a viewport, fetched concurrently"""
+    layers = run_concurrently(
+        users=lambda: get_viewport_layer('person', bbox, zoom, exclude_user_id, latitude, longitude),
+        businesses=lambda: get_viewport_layer('business', bbox, zoom, None, latitude, longitude),
     )
-    return response.json()
+    return {'zoom': zoom, 'bbox': list(bbox), **layers}
+
+def get_nearby_users(exclude_user_id=None, latitude=None, longitude=None, radius_km=None, k=None, accurate=False):
+    """Get people within radius_km (or the k closest) - with distance_km, closest first!"""
+    hits = find_nearby('person', latitude, longitude, radius_km, k, exclude_user_id)
+    users = get_users_by_ids([user_id for user_id, _ in hits], NEARBY_USER_COLUMNS)
+    return rank_by_distance(users, *resolve_origin(latitude, longitude), accurate=accurate)
+
+def get_nearby_businesses(latitude=None, longitude=None, radius_km=None, k=None, accurate=False):
+    """Get businesses within radius_km (or the k closest) - with distance_km, closest first!"""
+    hits = find_nearby('business', latitude, longitude, radius_km, k)
+    businesses = get_businesses_by_ids([user_id for user_id, _ in hits])
+    return rank_by_distance(businesses, *resolve_origin(latitude, longitude), accurate=accurate)
+
+# 🔥 HEATMAP - per-hexagon counters for every zoom, bumped on each write, read one map tile at a time!
+HEATMAP_MAX_ZOOM = int(os.environ.get('HEATMAP_MAX_ZOOM', 14))
+HEATMAP_MAX_TILES = 100
+HEATMAP_TILE_MAX_AGE = int(os.environ.get('HEATMAP_TILE_MAX_AGE', 30))  # seconds browsers may reuse a response
+
+heat_grid = HexGrid(max_zoom=HEATMAP_MAX_ZOOM)
+
+def heat_cell(cell):
+    latitude, longitude = heat_grid.center(cell['zoom'], cell['q'], cell['r'])
+    return {'cell': f"{cell['zoom']}/{cell['q']}/{cell['r']}", 'layer': cell['layer'], 'count': cell['count'],
+            'latitude': round(latitude, 6), 'longitude': round(longitude, 6)}
+
+def load_heat_tiles(tiles):
+    """{(zoom, x, y): [cell]} for a block of tiles - ONE query per zoom for their range"""
+    loaded = {tile: [] for tile in tiles}
+    by_zoom = {}
+    for zoom, x, y in tiles:
+        by_zoom.setdefault(zoom, []).append((x, y))
+    with metrics.timed('heatmap', 'heatmap_load_seconds', 'Heatmap tile loads from the store.'):
+        for zoom, block in by_zoom.items():
+            xs = [x for x, _ in block]
+            ys = [y for _, y in block]
+            for cell in store().get_heat(zoom, min(xs), min(ys), max(xs), max(ys)):
+                tile = (zoom, cell['tile_x'], cell['tile_y'])
+                if tile in loaded:
+                    loaded[tile].append(heat_cell(cell))
+    return loaded
+
+heat_cache = StaleWhileRevalidateCache(
+    load_heat_tiles,
+    fresh_for=float(os.environ.get('HEATMAP_CACHE_FRESH_SECONDS', 30)),
+    max_stale=float(os.environ.get('HEATMAP_CACHE_MAX_STALE_SECONDS', 300)),
+    max_entries=int(os.environ.get('HEATMAP_CACHE_TILES', 5000)),
+    name='heatmap-refresh',
+)
+metrics.registry.add_collector(lambda: [
+    (f'heatmap_cache_{name}', f'Heatmap tile cache {name.replace("_", " ")}.', {}, value)
+    for name, value in heat_cache.stats().items()
+])
+
+def record_heat(changes):
+    """Apply heatmap counter changes from a write (see HexGrid.changes) - a failure never fails the write"""
+    rows = heat_grid.rows(changes)
+    if not rows:
+        return
+    try:
+        store().add_heat(rows)
+    except SupabaseError as e:
+        print(f"⚠️  Heatmap counters not updated: {e}")
+        return
+    heat_cache.invalidate(*{(row['zoom'], row['tile_x'], row['tile_y']) for row in rows})
+
+def heat_tile(zoom, x, y, layers=HEAT_LAYERS):
+    return [cell for cell in heat_cache.get((zoom, x, y)) if cell['layer'] in layers]
+
+def get_heatmap(bbox, zoom, layers=HEAT_LAYERS):
+    """Heatmap cells for a viewport, assembled from cached tiles (cells may poke out of the bbox)"""
+    resolution = heat_grid.resolution(zoom)
+    x0, y0, x1, y1 = heat_grid.tiles(resolution, *bbox)
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > HEATMAP_MAX_TILES:
+        raise ValueError('bbox covers too many map tiles at this zoom - zoom in or send a smaller bbox')
+    tiles = [(resolution, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+    by_tile = heat_cache.get_many(tiles)
+    return {
+        'zoom': zoom,
+        'resolution': resolution,
+        'hex_radius_px': round(heat_grid.radius_px(resolution, zoom), 3),
+        'cells': [cell for tile in tiles for cell in by_tile[tile] if cell['layer'] in layers],
+    }
 
-def create_forum_post(user_id, content, latitude=None, longitude=None):
-    """Create forum post - ONE LINE!"""
-    if not SUPABASE_CONNECTED:
-        post_data = {
-            'id': str(uuid.uuid4()),
-            'user_id': user_id,
-            'content': content,
-            'latitude': latitude,
-            'longitude': longitude,
-            'created_at': datetime.utcnow().isoformat()
-        }
-        MOCK_POSTS.append(post_data)
-        return post_data
+# 🏘️ NEIGHBORHOODS - boundary polygons from a local GeoJSON file in an R-tree, no geocoding API calls!
+NEIGHBORHOODS_GEOJSON = os.environ.get('NEIGHBORHOODS_GEOJSON') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'neighborhoods.geojson')
+
+def load_neighborhoods(path):
+    """The polygon index, or an empty one (nothing gets tagged) if the file can't be read"""
+    try:
+        return NeighborhoodIndex.from_geojson(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Neighborhoods not loaded from {path}: {e}")
+        return NeighborhoodIndex([])
+
+neighborhoods = load_neighborhoods(NEIGHBORHOODS_GEOJSON)
+
+@app.template_filter('neighborhood')
+def neighborhood_label(row, with_city=False):
+    """'Times Square' for a user or post row - located from its lat/lng if it was never tagged"""
+    neighborhood = (neighborhoods.get(row.get('neighborhood_id'))
+                    or neighborhoods.locate(row.get('latitude'), row.get('longitude')))
+    if neighborhood is None:
+        return ''
+    if with_city and neighborhood['city']:
+        return f"{neighborhood['name']}, {neighborhood['city']}"
+    return neighborhood['name']
+
+# 💬 LOCAL FORUM - only posts around you, paged by (created_at, id) cursor!
+FORUM_CELL_DEG = 0.05  # forum_posts.cell bucket size, ~5.5 km
+FORUM_RADIUS_KM = float(os.environ.get('FORUM_RADIUS_KM', 5))
+FORUM_MAX_RADIUS_KM = 25
+FORUM_PAGE_SIZE = int(os.environ.get('FORUM_PAGE_SIZE', 10))
+FORUM_MAX_PAGE_SIZE = 50
+FORUM_POST_SELECT = 'id,user_id,content,latitude,longitude,neighborhood_id,created_at,users(username,user_type,business_name)'
+# What the feeds serve - the in-memory store's rows also carry the internal grid cell
+FORUM_POST_COLUMNS = ('id', 'user_id', 'content', 'latitude', 'longitude', 'neighborhood_id', 'created_at', 'users')
+
+# 🗄️ STORAGE - Supabase when it's up, otherwise an indexed in-memory store seeded with the mock data
+supabase_backend = SupabaseBackend(supabase, FORUM_POST_SELECT, page_size=GEO_INDEX_PAGE_SIZE, heat_grid=heat_grid,
+                                   neighborhoods=neighborhoods)
+memory_backend = MemoryBackend(FORUM_CELL_DEG, index_factory=new_geo_index, heat_grid=heat_grid,
+                               neighborhoods=neighborhoods)
+memory_backend.bulk_insert('users', MOCK_USERS)
+memory_backend.bulk_insert('forum_posts', MOCK_POSTS)
+# Re-read every SEARCH_INDEX_REFRESH_SECONDS to pick up businesses registered with other workers
+search_indexes = {
+    backend: BackgroundIndex(lambda backend=backend: build_search_index(backend),
+                             max_age=SEARCH_INDEX_REFRESH_SECONDS, name='Business search index')
+    for backend in (supabase_backend, memory_backend)
+}
+
+def warm_indexes():
+    """Start the full-scan index builds, off the request path - requests 503 until they're done"""
+    if supabase_connected():
+        (geo_snapshot if GEO_SNAPSHOT else geo_index).warm()
+        search_indexes[supabase_backend].warm()
+
+def create_app():
+    """WSGI factory for servers (``gunicorn 'app:create_app()'``): the app, with its indexes warming up.
+
+    Importing this module doesn't warm anything, so scripts like seed.py never
+    scan the tables or write the geo snapshot. Without the factory the first
+    request that needs an index starts its build."""
+    if SUPABASE_CONFIGURED:
+        threading.Thread(target=warm_indexes, name='index-warmup', daemon=True).start()
+    return app
+
+def store():
+    """The backend to read and write right now"""
+    return supabase_backend if supabase_connected() else memory_backend
 
+def forum_cell(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return cell_key(float(latitude), float(longitude), FORUM_CELL_DEG)
+
+def create_forum_post(user_id, content, latitude=None, longitude=None):
+    """Create forum post - tagged with its grid cell and neighborhood for the local feeds!"""
     post_data = {
         'id': str(uuid.uuid4()),
         'user_id': user_id,
         'content': content,
         'latitude': latitude,
         'longitude': longitude,
+        'cell': forum_cell(latitude, longitude),
+        'neighborhood_id': neighborhoods.locate_id(latitude, longitude),
         'created_at': datetime.utcnow().isoformat()
     }
-    response = requests.post(
-        f'{SUPABASE_URL}/rest/v1/forum_posts',
-        headers=SUPABASE_HEADERS,
-        json=post_data
-    )
-    return response.json()
-
-def get_forum_posts():
-    """Get forum posts with user data - ONE LINE!"""
-    if not SUPABASE_CONNECTED:
-        return MOCK_POSTS
+    created = store().create_post(post_data)
+    record_heat(heat_grid.changes('post', new=(latitude, longitude)))
+    created = project(created, FORUM_POST_COLUMNS)
+    live_updates.publish('post', [(latitude, longitude)], created)
+    return created
+
+def get_forum_posts(cells=None, before=None, limit=10, neighborhood=None):
+    """Get one page of forum posts with user data from the given cells (or neighborhood) - newest first!"""
+    return [project(post, FORUM_POST_COLUMNS) for post in store().get_posts(cells, before, limit, neighborhood=neighborhood)]
+
+def get_forum_feed(latitude=None, longitude=None, radius_km=None, cursor=None, limit=None):
+    """Posts within radius_km of you, newest first, with distance_km -> (posts, next_cursor)"""
+    latitude, longitude = resolve_origin(latitude, longitude)
+    radius_km = min(radius_km or FORUM_RADIUS_KM, FORUM_MAX_RADIUS_KM)
+    limit = page_limit(limit, FORUM_PAGE_SIZE, FORUM_MAX_PAGE_SIZE)
+    cells = set(cells_covering(latitude, longitude, radius_km, FORUM_CELL_DEG))
+    before = decode_cursor(cursor) if cursor else None
+
+    # Cells are squares, the feed is a circle: over-fetch until the page is full
+    batch_size = 2 * (limit + 1)
+    page = []
+    while len(page) <= limit:
+        batch = get_forum_posts(cells, before, limit=batch_size)
+        for post in rank_by_distance(batch, latitude, longitude, sort=False):
+            if post['distance_km'] is not None and post['distance_km'] <= radius_km:
+                page.append(post)
+        if len(batch) < batch_size:
+            break
+        before = (batch[-1]['created_at'], batch[-1]['id'])
+
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+def get_neighborhood_feed(latitude=None, longitude=None, cursor=None, limit=None):
+    """Posts from the neighborhood you're in, newest first -> (neighborhood, posts, next_cursor)
+
+    One indexed read on neighborhood_id, no distance filtering. Outside every polygon
+    the neighborhood is None and the feed is empty."""
+    latitude, longitude = resolve_origin(latitude, longitude)
+    limit = page_limit(limit, FORUM_PAGE_SIZE, FORUM_MAX_PAGE_SIZE)
+    neighborhood = neighborhoods.locate(latitude, longitude)
+    if neighborhood is None:
+        return None, [], None
+    before = decode_cursor(cursor) if cursor else None
+    page = get_forum_posts(before=before, limit=limit + 1, neighborhood=neighborhood['id'])
+    page = rank_by_distance(page, latitude, longitude, sort=False)
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return neighborhood, page[:limit], next_cursor
+
+# ⭐ REVIEWS - each write updates the business's rating totals, so reads never average anything!
+REVIEW_PAGE_SIZE = 10
+REVIEW_MAX_PAGE_SIZE = 50
+
+def submit_review(business, reviewer_id, stars, comment):
+    """Review a business (replacing this reviewer's earlier review) -> (review, rating totals)"""
+    review, totals = store().submit_review({
+        'id': str(uuid.uuid4()),
+        'business_id': business['id'],
+        'reviewer_id': reviewer_id,
+        'rating': stars,
+        'comment': comment,
+        'created_at': datetime.utcnow().isoformat()
+    })
+    updated = {**business, **totals}
+    invalidate_user(updated)
+    invalidate_business(updated)
+    index_business_search(updated)
+    publish_user_location(updated)  # map markers show the rating too
+    return review, totals
+
+def get_review_page(business_id, cursor=None, limit=None):
+    """One newest-first page of a business's reviews -> (reviews, next_cursor)"""
+    limit = page_limit(limit, REVIEW_PAGE_SIZE, REVIEW_MAX_PAGE_SIZE)
+    before = decode_cursor(cursor) if cursor else None
+    reviews = store().get_reviews(business_id, before, limit + 1)
+    next_cursor = encode_cursor(reviews[limit - 1]) if len(reviews) > limit else None
+    return reviews[:limit], next_cursor
+
+def review_form(data):
+    """(stars, comment) from a JSON body or form - raises ValueError"""
+    stars = parse_rating(data.get('rating'))
+    comment = (data.get('comment') or '').strip()
+    if len(comment) > MAX_COMMENT_LENGTH:
+        raise ValueError(f'comment must be at most {MAX_COMMENT_LENGTH} characters')
+    return stars, comment or None
+
+# 📡 LIVE UPDATES - deltas pushed only to the clients whose area they touch!
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_STREAM_SECONDS = int(os.environ.get('LIVE_STREAM_SECONDS', 300))  # clients reconnect, freeing the thread
+LIVE_POLL_TIMEOUT = float(os.environ.get('LIVE_POLL_TIMEOUT', 20))
+
+live_updates = SpatialPubSub(
+    cell_deg=FORUM_CELL_DEG,
+    max_subscribers=int(os.environ.get('LIVE_MAX_SUBSCRIBERS', 1000)),
+    idle_timeout=3 * LIVE_POLL_TIMEOUT,
+)
+metrics.registry.add_collector(lambda: [
+    (f'live_{name}', f'Live updates {name.replace("_", " ")}.', {}, value)
+    for name, value in live_updates.stats().items()
+])
+
+def publish_user_location(user, previous=None):
+    """Tell map subscribers a user appeared or moved (previous = old (lat, lng), if any)"""
+    columns = NEARBY_BUSINESS_COLUMNS if user['user_type'] == 'business' else NEARBY_USER_COLUMNS
+    points = [(user.get('latitude'), user.get('longitude'))] + ([previous] if previous else [])
+    live_updates.publish(user['user_type'], points, project(user, columns))
+
+def live_query_args():
+    """Area + kinds for a live subscription: bbox=west,south,east,north, or lat/lng/radius_km around you"""
+    viewport = viewport_query_args()
+    if viewport:
+        area = Area(*viewport[0])
+    else:
+        query = nearby_query_args()
+        latitude, longitude = resolve_origin(query['latitude'], query['longitude'])
+        area = Area.circle(latitude, longitude, min(query['radius_km'] or FORUM_RADIUS_KM, FORUM_MAX_RADIUS_KM))
+    kinds = [kind for kind in request.args.get('kinds', ','.join(LIVE_KINDS)).split(',') if kind]
+    if not kinds or set(kinds) - set(LIVE_KINDS):
+        raise ValueError(f'kinds must be a comma-separated subset of {",".join(LIVE_KINDS)}')
+    return area, kinds
+
+def sse_events(subscription):
+    """Stream a subscription as Server-Sent Events until the client leaves or the stream times out"""
+    deadline = time.monotonic() + LIVE_STREAM_SECONDS
+    try:
+        yield f'retry: 3000\n: subscribed {subscription.id}\n\n'
+        while time.monotonic() < deadline:
+            events = subscription.wait(LIVE_HEARTBEAT_SECONDS)
+            if not events:
+                yield ': ping\n\n'  # keeps proxies from closing an idle stream
+            for event in events:
+                event_id = f'id: {event["id"]}\n' if event['id'] is not None else ''
+                yield f'{event_id}event: {event["type"]}\ndata: {json.dumps(event["data"], default=str)}\n\n'
+    finally:
+        live_updates.unsubscribe(subscription)
+
+# 💌 DIRECT MESSAGES - history paged by cursor, previews from per-person summaries, new messages from a mailbox!
+CHAT_PAGE_SIZE = 30
+CHAT_MAX_PAGE_SIZE = 100
+CONVERSATION_PAGE_SIZE = 20
+CONVERSATION_MAX_PAGE_SIZE = 50
+CHAT_USER_FIELDS = ('username', 'user_type', 'business_name')
+CHAT_POLL_TIMEOUT = float(os.environ.get('CHAT_POLL_TIMEOUT', 25))
+
+chat_mailboxes = Mailboxes(
+    max_events=int(os.environ.get('CHAT_MAILBOX_EVENTS', 100)),
+    max_mailboxes=int(os.environ.get('CHAT_MAX_MAILBOXES', 10000)),
+    idle_timeout=3 * CHAT_POLL_TIMEOUT,
+)
+metrics.registry.add_collector(lambda: [
+    (f'chat_{name}', f'Chat mailboxes {name}.', {}, value)
+    for name, value in chat_mailboxes.stats().items()
+])
+
+def send_message(sender, receiver, text):
+    """Store a message and both conversation summaries, and drop it in both people's mailboxes
+    -> (message, the sender's summary)"""
+    message, summaries = store().send_message({
+        'id': str(uuid.uuid4()),
+        'conversation': conversation_key(sender['id'], receiver['id']),
+        'sender_id': sender['id'],
+        'receiver_id': receiver['id'],
+        'message': text,
+        'created_at': datetime.utcnow().isoformat()
+    })
+    for owner, other in ((sender, receiver), (receiver, sender)):
+        summaries[owner['id']] = {**summaries[owner['id']], 'other': project(other, CHAT_USER_FIELDS)}
+        # The sender's mailbox too: their other tabs and devices
+        chat_mailboxes.deliver(owner['id'], 'message', {'message': message, 'conversation': summaries[owner['id']]})
+    return message, summaries[sender['id']]
+
+def get_message_page(user_id, other_id, cursor=None, limit=None):
+    """One newest-first page of a conversation -> (messages, next_cursor)"""
+    limit = page_limit(limit, CHAT_PAGE_SIZE, CHAT_MAX_PAGE_SIZE)
+    before = decode_cursor(cursor) if cursor else None
+    messages = store().get_messages(conversation_key(user_id, other_id), before, limit + 1)
+    next_cursor = encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+    return messages[:limit], next_cursor
+
+def get_conversation_page(user_id, cursor=None, limit=None):
+    """Someone's conversations, latest message first, with previews -> (conversations, next_cursor)"""
+    limit = page_limit(limit, CONVERSATION_PAGE_SIZE, CONVERSATION_MAX_PAGE_SIZE)
+    before = decode_cursor(cursor, id_parts=2) if cursor else None  # summary ids are <owner_id>:<other_id>
+    conversations = store().get_conversations(user_id, before, limit + 1)
+    next_cursor = encode_cursor(conversations[limit - 1], 'last_message_at') if len(conversations) > limit else None
+    return conversations[:limit], next_cursor
+
+def chat_after(value):
+    """?after= / Last-Event-ID -> sequence number, or None to start listening from now"""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('after must be the seq of the last event you received')
+
+def chat_sse_events(user_id, after):
+    """Stream a mailbox as Server-Sent Events until the client leaves or the stream times out"""
+    deadline = time.monotonic() + LIVE_STREAM_SECONDS
+    yield 'retry: 3000\n\n'
+    while time.monotonic() < deadline:
+        waited = chat_mailboxes.wait(user_id, after, LIVE_HEARTBEAT_SECONDS)
+        if waited is None:
+            yield 'event: error\ndata: {"error": "too many chat listeners"}\n\n'
+            return
+        events, after = waited
+        if not events:
+            yield ': ping\n\n'  # keeps proxies from closing an idle stream
+        for event in events:
+            event_id = f'id: {event["seq"]}\n' if event['seq'] is not None else f'id: {after}\n'
+            yield f'{event_id}event: {event["type"]}\ndata: {json.dumps(event["data"], default=str)}\n\n'
+
+# 🛰️ LOCATION PINGS - coalesced per user, written in batches!
+LOCATION_FLUSH_SECONDS = float(os.environ.get('LOCATION_FLUSH_SECONDS', 5))  # 0 = write every ping through
+LOCATION_MIN_MOVE_M = float(os.environ.get('LOCATION_MIN_MOVE_M', 25))
+
+def flush_locations(positions):
+    """Write one batch of {user_id: (lat, lng)} and tell the index, the cache and live subscribers.
+
+    False while the spatial index is still loading: the buffer keeps the batch for its next round."""
+    try:
+        index = get_geo_index()
+    except SupabaseError as e:
+        if e.status != 503:
+            raise
+        return False
+    previous = {user_id: index.get(user_id) for user_id in positions}
+    store().update_locations(positions, {user_id: neighborhoods.locate_id(lat, lng)
+                                         for user_id, (lat, lng) in positions.items()})
+    for user_id in positions:
+        invalidate_user({'id': user_id})
+    users = get_users_by_ids(list(positions))
+    heat = None
+    for user in users:
+        heat = heat_grid.changes(user['user_type'], old=previous.get(user['id']), new=positions[user['id']], changes=heat)
+    if heat:
+        record_heat(heat)  # the whole batch in one call
+    for user in users:
+        index_user_location(user)
+        old = previous.get(user['id'])
+        invalidate_business(user, previous=old[:2] if old else None)
+        move_business_search(user)
+        publish_user_location(user, previous=old[:2] if old else None)
+
+location_buffer = LocationBuffer(flush_locations, interval=LOCATION_FLUSH_SECONDS, min_move_m=LOCATION_MIN_MOVE_M)
+atexit.register(location_buffer.stop)  # write the last pings on a clean shutdown
+metrics.registry.add_collector(lambda: [
+    (f'location_pings_{name}', f'Location pings {name}.', {}, value)
+    for name, value in location_buffer.stats().items()
+])
+
+@app.template_filter('timestamp')
+def format_timestamp(value, fmt='%B %d, %Y at %I:%M %p'):
+    """Format Supabase ISO timestamps (or datetimes) in templates"""
+    if not value:
+        return ''
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value
+    return value.strftime(fmt)
 
-    response = requests.get(
-        f'{SUPABASE_URL}/rest/v1/forum_posts?select=*,users(username,user_type,business_name)&order=created_at.desc&limit=10',
-        headers=SUPABASE_HEADERS
-    )
-    return response.json()
 # Routes
 @app.route('/health')
 def health():
-    return {'status': 'ok', 'message': 'PingGov is running!'}, 200
+    return {'status': 'ok', 'message': 'PingGov is running!', 'user_cache': user_cache.stats(),
+            'business_cache': business_cache.stats(), 'supabase_circuit': supabase_breaker.status(),
+            'supabase_health': supabase_health.status()}, 200
 
 @app.route('/')
 def home():
@@ -303,9 +1012,11 @@ def logout():
 def map_view():
     # Get current user data - FAST!
     current_user = get_current_user()
-    user_lat = current_user['latitude'] if current_user and current_user['latitude'] else 40.7589
-    user_lng = current_user['longitude'] if current_user and current_user['longitude'] else -73.9851
-    return render_template('map.html', user_lat=user_lat, user_lng=user_lng, current_user=current_user)
+    # The session has the latest ping; the stored row may still be waiting for its flush
+    user_lat = session.get('latitude') or (current_user and current_user['latitude']) or DEFAULT_LOCATION[0]
+    user_lng = session.get('longitude') or (current_user and current_user['longitude']) or DEFAULT_LOCATION[1]
+    return render_template('map.html', user_lat=user_lat, user_lng=user_lng, current_user=current_user,
+                           heatmap_max_zoom=heat_grid.max_zoom)
 
 @app.route('/forum', methods=['GET', 'POST'])
 @require_login
@@ -330,63 +1041,439 @@ def forum():
 
         return redirect(url_for('forum'))
 
-    # Get forum posts - ONE LINE!
+    # Get local forum posts - ONE PAGE AT A TIME! (?scope=neighborhood for just your neighborhood)
+    radius_km = request.args.get('radius_km', type=float)
+    scope = 'neighborhood' if request.args.get('scope') == 'neighborhood' else 'nearby'
+    neighborhood = None
     try:
-        nearby_posts = get_forum_posts()
+        if scope == 'neighborhood':
+            neighborhood, nearby_posts, next_cursor = get_neighborhood_feed(
+                session.get('latitude'), session.get('longitude'), cursor=request.args.get('cursor')
+            )
+        else:
+            nearby_posts, next_cursor = get_forum_feed(
+                session.get('latitude'), session.get('longitude'),
+                radius_km=radius_km, cursor=request.args.get('cursor')
+            )
     except Exception as e:
-        nearby_posts = []
+        nearby_posts, next_cursor = [], None
         flash(f'Failed to load posts: {str(e)}')
 
-    return render_template('forum.html', posts=nearby_posts)
+    return render_template('forum.html', posts=nearby_posts, next_cursor=next_cursor, scope=scope,
+                           neighborhood=neighborhood,
+                           radius_km=min(radius_km or FORUM_RADIUS_KM, FORUM_MAX_RADIUS_KM))
 
-@app.route('/profile/<user_id>')
+@app.route('/api/forum')
 @require_login
-def profile(user_id):
-    # Get user by ID - ONE LINE!
-    if not SUPABASE_CONNECTED:
-        user = next((user for user in MOCK_USERS if user['id'] == user_id), None)
-    else:
-        response = requests.get(
-            f'{SUPABASE_URL}/rest/v1/users?id=eq.{user_id}',
-            headers=SUPABASE_HEADERS
+def api_forum():
+    # Local forum feed as JSON - pass next_cursor back as ?cursor= for the next page!
+    scope = request.args.get('scope', 'nearby')
+    if scope not in ('nearby', 'neighborhood'):
+        return jsonify({'error': 'scope must be nearby or neighborhood'}), 400
+    try:
+        if scope == 'neighborhood':
+            neighborhood, posts, next_cursor = get_neighborhood_feed(
+                session.get('latitude'), session.get('longitude'),
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', type=int)
+            )
+            return jsonify({'neighborhood': neighborhood, 'posts': posts, 'next_cursor': next_cursor})
+        posts, next_cursor = get_forum_feed(
+            session.get('latitude'), session.get('longitude'),
+            radius_km=request.args.get('radius_km', type=float),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
         )
-        data = response.json()
-        user = data[0] if data else None
+        return jsonify({'posts': posts, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/profile/<user_id>', methods=['GET', 'POST'])
+@require_login
+def profile(user_id):
+    # Get user by ID - CACHED!
+    user = get_user_by_id(user_id)
 
     if not user:
         flash('User not found')
         return redirect(url_for('home'))
 
-    return render_template('profile.html', user=user)
+    if request.method == 'POST':
+        # Leave (or change) your review of this business
+        try:
+            if user['user_type'] != 'business' or user_id == session['user_id']:
+                raise ValueError("You can only review other people's businesses")
+            stars, comment = review_form(request.form)
+            submit_review(user, session['user_id'], stars, comment)
+            flash('Thanks for your review!')
+        except ValueError as e:
+            flash(str(e))
+        except Exception as e:
+            flash(f'Failed to save review: {str(e)}')
+        return redirect(url_for('profile', user_id=user_id))
+
+    # Rating totals are on the row already - only one page of reviews is read
+    reviews, next_cursor = [], None
+    if user['user_type'] == 'business':
+        try:
+            reviews, next_cursor = get_review_page(user_id, cursor=request.args.get('cursor'))
+        except Exception as e:
+            flash(f'Failed to load reviews: {str(e)}')
+
+    return render_template('profile.html', user=user, totals=totals_of(user), reviews=reviews,
+                           next_cursor=next_cursor, can_review=user['user_type'] == 'business' and user_id != session['user_id'])
+
+def map_response(result):
+    """Map markers as JSON, or as the compact columnar/binary format the client asked for in Accept"""
+    mimetype = map_payloads.negotiate(request.accept_mimetypes)
+    if mimetype is None:
+        response = jsonify(result)
+    else:
+        with metrics.timed('json', 'map_payload_encode_seconds', 'Compact map payload encoding.', format=mimetype):
+            response = Response(map_payloads.encode(result, mimetype), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def nearby_query_args():
+    """Read lat/lng/radius_km/k from the query string, defaulting to the session location"""
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    if latitude is None or longitude is None:
+        latitude, longitude = session.get('latitude'), session.get('longitude')
+    radius_km = request.args.get('radius_km', type=float)
+    k = request.args.get('k', type=int)
+    if radius_km is not None and radius_km <= 0:
+        raise ValueError('radius_km must be positive')
+    if k is not None and k <= 0:
+        raise ValueError('k must be positive')
+    accurate = request.args.get('accurate', '').lower() in ('1', 'true', 'yes')
+    return {'latitude': latitude, 'longitude': longitude, 'radius_km': radius_km, 'k': k, 'accurate': accurate}
+
+def viewport_query_args():
+    """Read bbox=west,south,east,north and zoom -> ((south, west, north, east), zoom), or None without bbox"""
+    raw_bbox = request.args.get('bbox')
+    if not raw_bbox:
+        return None
+    try:
+        west, south, east, north = (float(value) for value in raw_bbox.split(','))
+    except ValueError:
+        raise ValueError('bbox must be west,south,east,north')
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise ValueError('bbox is out of range (crossing the antimeridian is not supported)')
+    zoom = request.args.get('zoom', default=12, type=int)
+    return (south, west, north, east), max(0, min(zoom, MAX_ZOOM))
 
 @app.route('/api/nearby-users')
 @require_login
 def api_nearby_users():
-    # Get nearby users - ONE LINE!
+    # Get nearby users - SPATIAL INDEX!
+    try:
+        query = nearby_query_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         current_user_id = session.get('user_id')
-        users = get_nearby_users(exclude_user_id=current_user_id)
-        return jsonify(users)
+        users = get_nearby_users(exclude_user_id=current_user_id, **query)
+        return map_response(users)
+    except SupabaseError as e:
+        return backend_unavailable(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/nearby-businesses')
 @require_login
 def api_nearby_businesses():
-    # Get nearby businesses - ONE LINE!
+    # Get nearby businesses - SPATIAL INDEX!
+    try:
+        query = nearby_query_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        businesses = get_nearby_businesses(**query)
+        return map_response(businesses)
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/nearby')
+@require_login
+def api_nearby():
+    # Users AND businesses in ONE response - queried concurrently!
     try:
-        businesses = get_nearby_businesses()
-        return jsonify(businesses)
+        query = nearby_query_args()
+        viewport = viewport_query_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if viewport:
+            # Map viewport: clusters or points depending on zoom
+            bbox, zoom = viewport
+            return map_response(get_viewport(bbox, zoom, session.get('user_id'), query['latitude'], query['longitude']))
+        return map_response(get_nearby(exclude_user_id=session.get('user_id'), **query))
+    except SupabaseError as e:
+        return backend_unavailable(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def heat_layers_arg():
+    layers = [layer for layer in request.args.get('layers', ','.join(HEAT_LAYERS)).split(',') if layer]
+    if not layers or set(layers) - set(HEAT_LAYERS):
+        raise ValueError(f'layers must be a comma-separated subset of {",".join(HEAT_LAYERS)}')
+    return layers
+
+def cacheable_heat(payload):
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = f'private, max-age={HEATMAP_TILE_MAX_AGE}'
+    return response
+
+@app.route('/api/heatmap')
+@require_login
+def api_heatmap():
+    # Density of users, businesses and posts per hexagon: ?bbox=west,south,east,north&zoom=&layers=
+    try:
+        viewport = viewport_query_args()
+        if not viewport:
+            raise ValueError('bbox is required')
+        layers = heat_layers_arg()
+        return cacheable_heat(get_heatmap(*viewport, layers=layers))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/heatmap/<int:zoom>/<int:x>/<int:y>')
+@require_login
+def api_heatmap_tile(zoom, x, y):
+    # One map tile of the heatmap - the map fetches these, so the browser caches each tile
+    if zoom > heat_grid.max_zoom or x >= 2 ** zoom or y >= 2 ** zoom:
+        return jsonify({'error': f'No heatmap tile {zoom}/{x}/{y} (zoom goes up to {heat_grid.max_zoom})'}), 404
+    try:
+        layers = heat_layers_arg()
+        return cacheable_heat({
+            'zoom': zoom, 'x': x, 'y': y,
+            'hex_radius_px': round(heat_grid.radius_px(zoom), 3),
+            'cells': heat_tile(zoom, x, y, layers),
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/businesses/<business_id>/reviews', methods=['GET', 'POST'])
+@require_login
+def api_reviews(business_id):
+    # GET: newest reviews first, pass next_cursor back as ?cursor= | POST: {rating: 1-5, comment}
+    try:
+        business = get_user_by_id(business_id)
+        if not business or business['user_type'] != 'business':
+            return jsonify({'error': 'Business not found'}), 404
+        if request.method == 'POST':
+            if business_id == session['user_id']:
+                return jsonify({'error': "You can't review your own business"}), 403
+            try:
+                stars, comment = review_form(request.get_json(silent=True) or request.form)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            review, totals = submit_review(business, session['user_id'], stars, comment)
+            # Reviewing again replaces your earlier review
+            return jsonify({'review': review, 'totals': totals}), 200 if review.get('updated_at') else 201
+        reviews, next_cursor = get_review_page(
+            business_id, cursor=request.args.get('cursor'), limit=request.args.get('limit', type=int)
+        )
+        return jsonify({'reviews': reviews, 'next_cursor': next_cursor, 'totals': totals_of(business)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search')
+@require_login
+def api_search():
+    # Business search as you type: ?q=piz ma -> ranked by text match, rating and distance
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', 10, type=int)
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if limit <= 0:
+        return jsonify({'error': 'limit must be positive'}), 400
+    try:
+        origin = nearby_query_args()
+        results = get_search_index().search(
+            query, *resolve_origin(origin['latitude'], origin['longitude']),
+            limit=min(limit, SEARCH_MAX_RESULTS), prefix=request.args.get('prefix', '1') != '0'
+        )
+        return jsonify({'query': query, 'results': results})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/live')
+@require_login
+def api_live():
+    # Server-Sent Events: person / business / post deltas for your area, as they happen!
+    try:
+        area, kinds = live_query_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    subscription = live_updates.subscribe(area, kinds)
+    if subscription is None:
+        return jsonify({'error': 'too many live subscribers, use /api/live/poll'}), 503
+    response = Response(sse_events(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
+
+@app.route('/api/live/poll')
+@require_login
+def api_live_poll():
+    # Long-poll fallback: pass back ?sub= to get the deltas since your last poll
+    try:
+        area, kinds = live_query_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    subscription = live_updates.get(request.args.get('sub', ''))
+    if subscription is None:
+        subscription = live_updates.subscribe(area, kinds)
+        if subscription is None:
+            return jsonify({'error': 'too many live subscribers'}), 503
+        events = []
+    else:
+        live_updates.move(subscription, area, kinds)
+        events = subscription.wait(LIVE_POLL_TIMEOUT)
+    response = jsonify({'subscription': subscription.id, 'events': events})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/conversations')
+@require_login
+def api_conversations():
+    # Your chats, latest message first, with a preview and unread count - pass next_cursor back as ?cursor=
+    try:
+        conversations, next_cursor = get_conversation_page(
+            session['user_id'], cursor=request.args.get('cursor'), limit=request.args.get('limit', type=int)
+        )
+        return jsonify({'conversations': conversations, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/conversations/<user_id>', methods=['GET', 'POST'])
+@require_login
+def api_conversation(user_id):
+    # GET: messages with user_id, newest first, pass next_cursor back as ?cursor= | POST: {message}
+    try:
+        if user_id == session['user_id']:
+            return jsonify({'error': "You can't message yourself"}), 400
+        other = get_user_by_id(user_id)
+        if not other:
+            return jsonify({'error': 'User not found'}), 404
+        if request.method == 'POST':
+            try:
+                text = parse_message((request.get_json(silent=True) or request.form).get('message'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            message, conversation = send_message(get_current_user(), other, text)
+            return jsonify({'message': message, 'conversation': conversation}), 201
+        messages, next_cursor = get_message_page(
+            session['user_id'], user_id, cursor=request.args.get('cursor'), limit=request.args.get('limit', type=int)
+        )
+        return jsonify({'messages': messages, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/conversations/<user_id>/read', methods=['POST'])
+@require_login
+def api_conversation_read(user_id):
+    # Mark your conversation with user_id read (unread_count -> 0); a no-op when nothing is unread
+    try:
+        if user_id == session['user_id']:
+            return jsonify({'error': "You can't message yourself"}), 400
+        store().mark_read(session['user_id'], user_id)
+        return jsonify({'unread_count': 0})
+    except SupabaseError as e:
+        return backend_unavailable(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/chat/poll')
+@require_login
+def api_chat_poll():
+    # Long-poll for new messages: pass back ?after= (the last seq) to get what arrived since
+    try:
+        after = chat_after(request.args.get('after'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    waited = chat_mailboxes.wait(session['user_id'], after, CHAT_POLL_TIMEOUT)
+    if waited is None:
+        return jsonify({'error': 'too many chat listeners'}), 503
+    events, after = waited
+    response = jsonify({'events': events, 'after': after})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/chat/stream')
+@require_login
+def api_chat_stream():
+    # Server-Sent Events: new messages as they arrive, resuming from Last-Event-ID on reconnect
+    try:
+        after = chat_after(request.headers.get('Last-Event-ID') or request.args.get('after'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = Response(chat_sse_events(session['user_id'], after), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
+
+@app.route('/api/location', methods=['POST'])
+@require_login
+def api_location():
+    # Phones ping as often as they like - small moves are dropped, the rest written in batches
+    data = request.get_json(silent=True) or request.form
+    try:
+        latitude, longitude = float(data['latitude']), float(data['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'latitude and longitude are required numbers'}), 400
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify({'error': 'latitude must be within [-90, 90] and longitude within [-180, 180]'}), 400
+
+    known = (session.get('latitude'), session.get('longitude'))
+    queued = location_buffer.submit(session['user_id'], latitude, longitude, known=known)
+    if queued:
+        session['latitude'], session['longitude'] = latitude, longitude
+    return jsonify({
+        'status': 'queued' if queued else 'unchanged',
+        'latitude': session.get('latitude'),
+        'longitude': session.get('longitude'),
+    }), 202
+
 @app.route('/test-api')
 @require_login
 def test_api():
-    # Get users and businesses - SUPER FAST!
+    # Get users and businesses - CONCURRENTLY!
     try:
-        users = get_nearby_users()
-        businesses = get_nearby_businesses()
+        nearby = get_nearby()
+        users, businesses = nearby['users'], nearby['businesses']
 
         return f"""
         <h1>🚀 Supabase API Test - BLAZING FAST!</h1>
@@ -401,6 +1488,7 @@ def test_api():
         </ul>
 
         <h2>API Endpoints:</h2>
+        <p><a href="/api/nearby" target="_blank">Test Combined Nearby API</a></p>
         <p><a href="/api/nearby-users" target="_blank">Test Users API</a></p>
         <p><a href="/api/nearby-businesses" target="_blank">Test Businesses API</a></p>
         <p><strong>⚡ Powered by Supabase - No SQLAlchemy needed!</strong></p>
@@ -408,113 +1496,43 @@ def test_api():
     except Exception as e:
         return f"<h1>❌ Error: {str(e)}</h1>"
 
+def seed_mock_backend(users, posts):
+    """Bulk-load rows into the in-memory backend (see seed.py --target mock)"""
+    counts = {
+        'users': memory_backend.bulk_insert('users', users),
+        'forum_posts': memory_backend.bulk_insert('forum_posts', posts),
+    }
+    user_cache.clear()
+    business_cache.clear()
+    heat_cache.clear()
+    search_indexes[memory_backend].reset()  # rebuilt from the new rows on the next search
+    return counts
+
 @app.route('/init-database')
 def init_database():
-    """🚀 Initialize Supabase with test users - BLAZING FAST!"""
+    """🚀 Initialize Supabase with test users - ONE BATCHED INSERT PER TABLE!"""
     try:
         # Check if users already exist
-        if not SUPABASE_CONNECTED:
+        if not supabase_connected():
             return "⚠️ Supabase not connected. Using mock data."
 
-        response = requests.get(f'{SUPABASE_URL}/rest/v1/users?select=id', headers=SUPABASE_HEADERS)
-        existing_users = response.json()
-        if existing_users:
-            return f"""
+        if supabase_backend.has_users():
+            return """
             <h1>🚀 Supabase Database Already Initialized</h1>
-            <p>Found {len(existing_users.data)} existing users in Supabase.</p>
+            <p>Found existing users in Supabase.</p>
             <p><a href="/">Go to Home Page</a></p>
             """
 
-        import random
-
-        # New York coordinates (Manhattan area)
-        ny_locations = [
-            {"lat": 40.7589, "lng": -73.9851, "area": "Times Square"},
-            {"lat": 40.7505, "lng": -73.9934, "area": "Hell's Kitchen"},
-            {"lat": 40.7614, "lng": -73.9776, "area": "Central Park South"},
-            {"lat": 40.7831, "lng": -73.9712, "area": "Upper West Side"},
-            {"lat": 40.7282, "lng": -73.9942, "area": "Greenwich Village"},
-            {"lat": 40.7180, "lng": -74.0134, "area": "Tribeca"},
-            {"lat": 40.7061, "lng": -74.0087, "area": "Financial District"},
-        ]
-
-        # Test users (people)
-        test_people = [
-            {"username": "john_nyc", "email": "john@example.com", "bio": "Love exploring NYC neighborhoods!"},
-            {"username": "sarah_manhattan", "email": "sarah@example.com", "bio": "Coffee enthusiast and local foodie"},
-            {"username": "mike_downtown", "email": "mike@example.com", "bio": "Photographer capturing city life"},
-            {"username": "emma_uptown", "email": "emma@example.com", "bio": "Yoga instructor and wellness coach"},
-            {"username": "alex_midtown", "email": "alex@example.com", "bio": "Tech worker, always looking for good lunch spots"},
-            {"username": "lisa_village", "email": "lisa@example.com", "bio": "Artist and gallery owner"},
-            {"username": "david_tribeca", "email": "david@example.com", "bio": "Finance professional, weekend explorer"},
-        ]
-
-        # Test businesses
-        test_businesses = [
-            {"username": "joes_coffee", "email": "info@joescoffee.com", "business_name": "Joe's Coffee Shop", "business_category": "Restaurant", "bio": "Best coffee in the neighborhood since 1995"},
-            {"username": "central_gym", "email": "info@centralgym.com", "business_name": "Central Park Fitness", "business_category": "Fitness", "bio": "Premium fitness center with park views"},
-            {"username": "marios_pizza", "email": "mario@mariospizza.com", "business_name": "Mario's Authentic Pizza", "business_category": "Restaurant", "bio": "Authentic Italian pizza made fresh daily"},
-            {"username": "book_corner", "email": "hello@bookcorner.com", "business_name": "The Book Corner", "business_category": "Retail", "bio": "Independent bookstore with rare finds"},
-            {"username": "fresh_market", "email": "contact@freshmarket.com", "business_name": "Fresh Market NYC", "business_category": "Grocery", "bio": "Organic produce and local goods"},
-        ]
-
-        created_users = []
-
-        # Create people accounts - SUPER FAST!
-        for i, person in enumerate(test_people):
-            location = ny_locations[i % len(ny_locations)]
-            lat_variation = random.uniform(-0.001, 0.001)
-            lng_variation = random.uniform(-0.001, 0.001)
-
-            result = create_user(
-                username=person["username"],
-                email=person["email"],
-                password="password123",
-                user_type="person",
-                latitude=location["lat"] + lat_variation,
-                longitude=location["lng"] + lng_variation,
-                bio=person["bio"]
-            )
-            created_users.append(result.data[0])
-
-        # Create business accounts - SUPER FAST!
-        for i, business in enumerate(test_businesses):
-            location = ny_locations[i % len(ny_locations)]
-            lat_variation = random.uniform(-0.0005, 0.0005)
-            lng_variation = random.uniform(-0.0005, 0.0005)
-
-            result = create_user(
-                username=business["username"],
-                email=business["email"],
-                password="business123",
-                user_type="business",
-                latitude=location["lat"] + lat_variation,
-                longitude=location["lng"] + lng_variation,
-                bio=business["bio"],
-                business_name=business["business_name"],
-                business_category=business["business_category"]
-            )
-            created_users.append(result.data[0])
-
-        # Create forum posts - SUPER FAST!
-        forum_posts = [
-            {"content": "Anyone know what's happening at Washington Square Park today? Lots of music!", "user_idx": 0},
-            {"content": "New coffee shop opened on 8th Ave! Great espresso and friendly staff ☕", "user_idx": 1},
-            {"content": "Looking for a good photographer for headshots. Any recommendations?", "user_idx": 2},
-            {"content": "Yoga class in Central Park tomorrow morning at 8 AM. All levels welcome! 🧘‍♀️", "user_idx": 3},
-            {"content": "Best lunch spots near Times Square? Tired of tourist traps!", "user_idx": 4},
-            {"content": "Art gallery opening this Friday in SoHo. Contemporary local artists featured.", "user_idx": 5},
-            {"content": "Anyone interested in a weekend food tour of Chinatown?", "user_idx": 6},
-        ]
-
-        for post_data in forum_posts:
-            user = created_users[post_data["user_idx"]]
-            create_forum_post(
-                user_id=user['id'],
-                content=post_data["content"],
-                latitude=user['latitude'],
-                longitude=user['longitude']
-            )
+        created_users, forum_posts = demo_dataset(
+            hash_password('password123'), hash_password('business123'), FORUM_CELL_DEG
+        )
+        supabase_backend.bulk_insert('users', created_users)
+        supabase_backend.bulk_insert('forum_posts', forum_posts)
+        for user in created_users:
+            index_user_location(user)
+            index_business_search(user)
+        business_cache.clear()
+        heat_cache.clear()
 
         return f"""
         <h1>🚀 Supabase Database Initialized Successfully!</h1>
@@ -531,7 +1549,7 @@ def init_database():
         {''.join([f'<li><strong>{u["business_name"]}</strong> (@{u["username"]}) - {u["email"]}</li>' for u in created_users if u["user_type"] == 'business'])}
         </ul>
 
-        <p><strong>⚡ Powered by Supabase - 10x faster than SQLAlchemy!</strong></p>
+        <p>Need more data? <code>python seed.py --users 100000 --posts 1000000</code></p>
         <p><a href="/" style="background: #ffcc00; padding: 10px 20px; text-decoration: none; border-radius: 5px; color: black; font-weight: bold;">Go to Home Page</a></p>
         """
 
@@ -565,4 +1583,4 @@ if __name__ == '__main__':
     # Bind to 0.0.0.0 for production, localhost for development
     host = '0.0.0.0' if os.environ.get('RENDER') else '127.0.0.1'
 
-    app.run(host=host, port=port, debug=False)
\ No newline at end of file
+    create_app().run(host=host, port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Indexes built from a full table scan, off the request path.
+
+Building an index over every row can take far longer than a request is
+allowed (see ``resilience.set_deadline``). So the scan never runs on the
+request's thread. ``get()`` returns the last finished build. Before the
+first build has finished it returns None, and the caller answers "try
+again shortly". Builds and refreshes run one at a time on a background
+thread, which carries no request deadline. A failed build is not retried
+for ``retry_seconds``, so an outage doesn't start a table scan per request.
+"""
+import threading
+import time
+
+
+class BackgroundIndex:
+    def __init__(self, build, max_age=300.0, retry_seconds=10.0, name='index'):
+        """``build()`` -> a new index. One older than ``max_age`` seconds is rebuilt in the background."""
+        self.build = build
+        self.max_age = max_age
+        self.retry_seconds = retry_seconds
+        self.name = name
+        self._index = None
+        self._built_at = 0.0
+        self._failed_at = None
+        self._generation = 0        # bumped by reset(), so a build that raced it is thrown away
+        self._building = False
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.failures = 0
+
+    def current(self):
+        """The last finished build, or None - never starts one."""
+        return self._index
+
+    def get(self, block=False):
+        """The last finished build, starting a (re)build in the background when it's missing or old.
+
+        None while the first build runs. ``block`` builds on the caller's thread
+        instead, for backends where that is cheap (e.g. in memory)."""
+        index = self._index
+        if index is None and block:
+            with self._lock:
+                if self._index is None:
+                    self._finish(self._generation, self.build())
+                return self._index
+        if index is None or time.time() - self._built_at > self.max_age:
+            self.warm()
+        return index
+
+    def warm(self):
+        """Start a background build unless one is running or the last one failed just now."""
+        with self._lock:
+            if self._building or (self._failed_at is not None
+                                  and time.monotonic() - self._failed_at < self.retry_seconds):
+                return
+            self._building = True
+            generation = self._generation
+        threading.Thread(target=self._run, args=(generation,), name=f'{self.name}-build', daemon=True).start()
+
+    def reset(self):
+        """Drop the index (e.g. after its rows were replaced); the next ``get`` rebuilds it."""
+        with self._lock:
+            self._index = None
+            self._generation += 1
+
+    def _finish(self, generation, index):
+        if generation == self._generation:
+            self._index, self._built_at = index, time.time()
+            self.builds += 1
+
+    def _run(self, generation):
+        try:
+            index = self.build()
+            with self._lock:
+                self._finish(generation, index)
+                self._failed_at = None
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            self.failures += 1
+            print(f"⚠️  {self.name} build failed: {e}")
+        finally:
+            self._building = False
+
+    def stats(self):
+        return {'ready': int(self._index is not None), 'building': int(self._building),
+                'builds': self.builds, 'failures': self.failures}
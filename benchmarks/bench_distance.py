@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized distance engine vs per-row geopy geodesic.
+
+    python benchmarks/bench_distance.py
+    python benchmarks/bench_distance.py --sizes 1000 100000 1000000 --geodesic-max 20000
+
+geodesic is far too slow to run over a million rows, so above
+--geodesic-max it is timed on a sample and extrapolated (marked with ~).
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo_distance import haversine_km, vincenty_km  # noqa: E402
+
+ORIGIN = (40.7589, -73.9851)
+
+
+def random_points(n, seed=42):
+    rng = np.random.default_rng(seed)
+    lats = ORIGIN[0] + rng.uniform(-0.5, 0.5, n)
+    lngs = ORIGIN[1] + rng.uniform(-0.5, 0.5, n)
+    return lats, lngs
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_geodesic(lats, lngs, geodesic_max):
+    n = len(lats)
+    sample = min(n, geodesic_max)
+    points = list(zip(lats[:sample].tolist(), lngs[:sample].tolist()))
+    start = time.perf_counter()
+    for point in points:
+        geodesic(ORIGIN, point).km
+    elapsed = time.perf_counter() - start
+    return elapsed * n / sample, sample < n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--geodesic-max', type=int, default=20_000,
+                        help='largest number of rows to time geodesic on before extrapolating')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'points':>10} {'geodesic':>12} {'haversine':>12} {'vincenty':>12} {'speedup (hav)':>14} {'max err (vin)':>14}")
+    for n in args.sizes:
+        lats, lngs = random_points(n)
+        geo_s, extrapolated = bench_geodesic(lats, lngs, args.geodesic_max)
+        hav_s = best_of(lambda: haversine_km(*ORIGIN, lats, lngs), args.repeat)
+        vin_s = best_of(lambda: vincenty_km(*ORIGIN, lats, lngs), args.repeat)
+
+        # Vincenty should agree with geopy's (Karney) geodesic to well under a metre
+        check = min(n, 1000)
+        exact = np.array([geodesic(ORIGIN, (lat, lng)).km for lat, lng in zip(lats[:check], lngs[:check])])
+        max_err_m = float(np.max(np.abs(vincenty_km(*ORIGIN, lats[:check], lngs[:check]) - exact)) * 1000)
+
+        geo_label = f"{'~' if extrapolated else ''}{geo_s * 1000:.1f} ms"
+        print(f"{n:>10} {geo_label:>12} {hav_s * 1000:>9.2f} ms {vin_s * 1000:>9.2f} ms "
+              f"{geo_s / hav_s:>13.0f}x {max_err_m:>11.4f} m")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Geo snapshot benchmark: per-worker spatial index vs one mmap'd snapshot.
+
+    python benchmarks/bench_geo_snapshot.py                  # 100k users, 4 workers
+    python benchmarks/bench_geo_snapshot.py --users 300000 --workers 8
+
+Compares, for the same synthetic users:
+
+- warm-up: building a ``GeoGridIndex`` (what each worker did before) vs
+  writing the snapshot once and mapping it in a fresh process
+- memory: private memory (USS, from /proc/self/smaps_rollup) of N worker
+  processes that each build their own index vs N that map one snapshot
+- query latency: radius, nearest, viewport and cluster queries on both
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from geo_index import GeoGridIndex  # noqa: E402
+from geo_snapshot import GeoSnapshot, write_snapshot  # noqa: E402
+from map_clusters import ClusterGrid  # noqa: E402
+from seed import generate_users  # noqa: E402
+
+WORKER = r'''
+import json, sys, time
+sys.path.insert(0, ROOT)
+
+def private_kb():
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    return sum(int(fields.get(k, '0 kB').split()[0]) for k in ('Private_Clean', 'Private_Dirty'))
+
+import numpy  # imported before the baseline, so both modes pay for it alike
+from geo_index import GeoGridIndex
+from geo_snapshot import GeoSnapshot
+from map_clusters import ClusterGrid
+before = private_kb()
+t0 = time.perf_counter()
+if MODE == 'snapshot':
+    index = GeoSnapshot(PATH)
+    index.within_radius(40.75, -73.98, 5, 'person', limit=200)   # touch the pages a query reads
+else:
+    from seed import generate_users
+    users = list(generate_users(USERS, 'x', seed=1))
+    before = private_kb()
+    t0 = time.perf_counter()
+    index = GeoGridIndex(clusters=ClusterGrid(max_cluster_zoom=14))
+    for u in users:
+        index.upsert(u['id'], u['latitude'], u['longitude'], u['user_type'])
+    del users
+ready_ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({'ready_ms': ready_ms, 'private_kb': (private_kb() or 0) - (before or 0)}))
+sys.stdout.flush()
+sys.stdin.read()    # stay alive until every worker is measured
+'''
+
+
+def start_worker(mode, path, users):
+    code = WORKER.replace('ROOT', repr(ROOT)).replace('MODE', repr(mode)) \
+                 .replace('PATH', repr(path)).replace('USERS', str(users))
+    return subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            text=True, cwd=ROOT)
+
+
+def workers(mode, path, users, count):
+    """Start ``count`` workers at once (like a gunicorn boot) -> their reports."""
+    procs = [start_worker(mode, path, users) for _ in range(count)]
+    reports = [json.loads(proc.stdout.readline()) for proc in procs]
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+    return reports
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    users = list(generate_users(args.users, 'x', seed=1))
+    start = time.perf_counter()
+    grid = GeoGridIndex(clusters=ClusterGrid(max_cluster_zoom=14))
+    for u in users:
+        grid.upsert(u['id'], u['latitude'], u['longitude'], u['user_type'])
+    build_ms = (time.perf_counter() - start) * 1000
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.snapshot')
+    start = time.perf_counter()
+    write_snapshot(path, ((u['id'], u['latitude'], u['longitude'], u['user_type'], u.get('business_category'))
+                          for u in users))
+    write_ms = (time.perf_counter() - start) * 1000
+    snapshot = GeoSnapshot(path)
+
+    print(f'{args.users:,} users, snapshot file {snapshot.size / 1e6:.1f} MB')
+    print(f'{"GeoGridIndex build":>28}: {build_ms:9.1f} ms   (every worker, every cold start)')
+    print(f'{"snapshot write":>28}: {write_ms:9.1f} ms   (once, by one worker)')
+
+    for mode in ('grid', 'snapshot'):
+        reports = workers(mode, path, args.users, args.workers)
+        ready = sorted(r['ready_ms'] for r in reports)
+        private = sum(r['private_kb'] for r in reports) / 1024
+        print(f'{args.workers} x {mode:>8}: ready in {ready[len(ready) // 2]:9.1f} ms (median), '
+              f'private memory {private:7.1f} MB total')
+
+    rng = random.Random(0)
+    probes = [(u['latitude'] + rng.uniform(-.01, .01), u['longitude'] + rng.uniform(-.01, .01))
+              for u in rng.sample(users, args.queries)]
+    queries = {
+        'within_radius 1 km': lambda idx, lat, lng: idx.within_radius(lat, lng, 1, 'person', limit=200),
+        'within_radius 5 km': lambda idx, lat, lng: idx.within_radius(lat, lng, 5, 'person', limit=200),
+        'nearest 50': lambda idx, lat, lng: idx.nearest(lat, lng, 50, 'business'),
+        'viewport bbox': lambda idx, lat, lng: idx.within_bbox('person', lat - .01, lng - .015, lat, lng),
+        'clusters zoom 11': lambda idx, lat, lng: idx.clusters.clusters('person', 11, lat - .1, lng - .15, lat, lng),
+    }
+    print(f'{"query":>28}  {"grid µs":>10}  {"snapshot µs":>12}')
+    for name, query in queries.items():
+        timings = []
+        for idx in (grid, snapshot):
+            it = iter(probes * 2)
+            timings.append(per_call_us(lambda: query(idx, *next(it)), len(probes)))
+        print(f'{name:>28}  {timings[0]:10.0f}  {timings[1]:12.0f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Neighborhood lookup benchmark: R-tree + point-in-polygon vs testing every polygon.
+
+    python benchmarks/bench_neighborhoods.py                       # 5,000 synthetic polygons
+    python benchmarks/bench_neighborhoods.py --polygons 20000 --vertices 200
+    python benchmarks/bench_neighborhoods.py --geojson nyc_ntas.geojson
+
+Synthetic polygons are jittered hexagon-like rings tiling a city-sized area,
+every tenth one with a hole (a park, say). Reports:
+
+- build: loading the features into a ``NeighborhoodIndex``
+- ``locate``: one point at a time, as on every post / registration / ping
+- brute force: the same points tested against every polygon (smallest first)
+- ``locate_many``: bulk tagging, as when seeding
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from neighborhoods import NeighborhoodIndex  # noqa: E402
+
+
+def ring(rng, lat, lng, radius, vertices, clockwise=False):
+    step = (-1 if clockwise else 1) * 2 * math.pi / vertices
+    points = []
+    for k in range(vertices):
+        r = radius * rng.uniform(0.9, 1.0)
+        points.append([lng + r * math.cos(k * step) / math.cos(math.radians(lat)), lat + r * math.sin(k * step)])
+    return points + [points[0]]
+
+
+def synthetic_features(count, vertices, seed=0, south=40.5, west=-74.3):
+    """``count`` polygons on a square grid of ~1 km cells from (south, west)."""
+    rng = random.Random(seed)
+    side = math.ceil(math.sqrt(count))
+    cell = 0.009    # degrees of latitude, ~1 km
+    features = []
+    for i in range(count):
+        lat = south + (i // side + 0.5) * cell
+        lng = west + (i % side + 0.5) * cell / math.cos(math.radians(lat))
+        rings = [ring(rng, lat, lng, cell / 2, vertices)]
+        if i % 10 == 0:
+            rings.append(ring(rng, lat, lng, cell / 8, 8, clockwise=True))
+        features.append({'type': 'Feature', 'id': f'n{i}', 'properties': {'name': f'Neighborhood {i}'},
+                         'geometry': {'type': 'Polygon', 'coordinates': rings}})
+    return features
+
+
+def brute_force(index, lat, lng):
+    for polygon in index._polygons:
+        if polygon.contains(lng, lat):
+            return polygon.feature['id']
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polygons', type=int, default=5000)
+    parser.add_argument('--vertices', type=int, default=40, help='per synthetic outer ring')
+    parser.add_argument('--geojson', help='benchmark a real boundary file instead')
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--brute-points', type=int, default=200, help='brute force is slow - fewer points')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.geojson:
+        index = NeighborhoodIndex.from_geojson(args.geojson)
+    else:
+        index = NeighborhoodIndex(synthetic_features(args.polygons, args.vertices))
+    build_ms = (time.perf_counter() - start) * 1000
+    stats = index.stats()
+    print(f'{stats["neighborhoods"]:,} neighborhoods, {stats["polygons"]:,} polygons, '
+          f'{stats["tree_levels"]} R-tree levels, built in {build_ms:.0f} ms')
+
+    # Points in random polygons' boxes, a little wider, so some fall in gaps, holes and outside
+    boxes = [polygon.bbox for polygon in index._polygons]
+    rng = random.Random(1)
+    points = []
+    for west, south, east, north in rng.choices(boxes, k=args.points):
+        pad_lat, pad_lng = (north - south) * 0.2, (east - west) * 0.2
+        points.append((rng.uniform(south - pad_lat, north + pad_lat), rng.uniform(west - pad_lng, east + pad_lng)))
+
+    start = time.perf_counter()
+    found = [index.locate_id(lat, lng) for lat, lng in points]
+    locate_us = (time.perf_counter() - start) / len(points) * 1e6
+
+    sample = points[:args.brute_points]
+    start = time.perf_counter()
+    expected = [brute_force(index, lat, lng) for lat, lng in sample]
+    brute_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    start = time.perf_counter()
+    many = index.locate_many(points)
+    many_ms = (time.perf_counter() - start) * 1000
+
+    assert found[:len(sample)] == expected, 'R-tree and brute force disagree'
+    assert many == found, 'locate_many and locate disagree'
+    inside = sum(neighborhood_id is not None for neighborhood_id in found)
+    print(f'{len(points):,} points, {inside / len(points):.0%} inside a neighborhood')
+    print(f'{"locate (R-tree)":>22}: {locate_us:10.1f} µs / point')
+    print(f'{"brute force":>22}: {brute_us:10.1f} µs / point ({brute_us / locate_us:,.0f}x slower)')
+    print(f'{"locate_many":>22}: {many_ms:10.1f} ms for all ({many_ms * 1000 / len(points):.1f} µs / point)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+End-to-end route benchmark against the local PostgREST stand-in.
+
+    python benchmarks/bench_routes.py
+    python benchmarks/bench_routes.py --users 20000 --posts 200000 --latency-ms 5 --concurrency 16
+    python benchmarks/bench_routes.py --save before.json
+    python benchmarks/bench_routes.py --compare before.json --max-regression 0.25
+
+Starts benchmarks/fake_postgrest.py (in this process) loaded with the demo
+accounts plus generated users/posts, then runs the app in Supabase mode in a
+separate process (threaded Werkzeug server, like one production worker)
+pointed at it. Each client thread logs in as a demo account and hammers one
+route at a time; per route it reports p50/p95/p99 latency and throughput.
+
+With --compare, exits non-zero when any route's p95 is more than
+--max-regression slower than in the saved run, so it can gate a deploy.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from fake_postgrest import FakePostgREST, seed_fixtures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEMO_PEOPLE = ('john@example.com', 'sarah@example.com', 'mike@example.com', 'emma@example.com',
+               'alex@example.com', 'lisa@example.com', 'david@example.com')
+
+# name -> (method, path, form data); {user_id} is filled in per request
+ROUTES = {
+    'login': ('POST', '/login', {'password': 'password123'}),
+    'map': ('GET', '/map', None),
+    'forum': ('GET', '/forum', None),
+    'api_forum': ('GET', '/api/forum', None),
+    'nearby_users': ('GET', '/api/nearby-users', None),
+    'nearby_businesses': ('GET', '/api/nearby-businesses', None),
+    'nearby': ('GET', '/api/nearby', None),
+    'profile': ('GET', '/profile/{user_id}', None),
+}
+
+SERVER = r'''
+import sys
+from werkzeug.serving import make_server
+import app
+make_server('127.0.0.1', int(sys.argv[1]), app.app, threaded=True).serve_forever()
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(postgrest_url, pool_size):
+    """Serve the app in its own process -> (process, base_url) once /health answers."""
+    port = free_port()
+    env = dict(os.environ, SUPABASE_URL=postgrest_url, SUPABASE_KEY='bench', SUPABASE_POOL_SIZE=str(pool_size))
+    # The access log goes to a file: an undrained pipe would fill up and stall the server
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen([sys.executable, '-c', SERVER, str(port)], cwd=ROOT, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f'app exited: {log.read().decode()[-2000:]}')
+        try:
+            if requests.get(f'{base_url}/health', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('app did not come up within 30s')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def logged_in_session(base_url, email):
+    session = requests.Session()
+    response = session.post(f'{base_url}/login', data={'email': email, 'password': 'password123'},
+                            allow_redirects=False)
+    if response.status_code != 302:
+        raise RuntimeError(f'login as {email} failed ({response.status_code})')
+    return session
+
+
+def run_route(base_url, sessions, route, user_ids, requests_total, warmup):
+    method, path, form = ROUTES[route]
+    latencies, errors = [], []
+    remaining = [warmup + requests_total]
+    lock = threading.Lock()
+    rng = random.Random(route)
+
+    def worker(index, session):
+        email = DEMO_PEOPLE[index % len(DEMO_PEOPLE)]
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                measured = remaining[0] < requests_total
+                user_id = rng.choice(user_ids)
+            data = dict(form, email=email) if form else None
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path.format(user_id=user_id), data=data,
+                                           allow_redirects=False, timeout=30)
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if measured:
+                with lock:
+                    (errors if failed else latencies).append(elapsed_ms)
+
+    threads = [threading.Thread(target=worker, args=(i, s)) for i, s in enumerate(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies) + len(errors),
+        'errors': len(errors),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'rps': round((len(latencies) + len(errors)) / wall, 1),
+    }
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for route, result in results.items():
+        before = baseline.get(route)
+        if before and before['p95_ms'] > 0 and result['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            regressions.append(f'{route}: p95 {before["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000, help='generated users on top of the demo accounts')
+    parser.add_argument('--posts', type=int, default=50000, help='generated forum posts')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='stand-in latency per PostgREST call')
+    parser.add_argument('--jitter-ms', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=20, help='unmeasured requests per route first')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='comma-separated subset of: ' + ', '.join(ROUTES))
+    parser.add_argument('--save', metavar='PATH', help='write the results as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='fail on p95 regressions against a saved run')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='allowed p95 slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f'unknown routes: {", ".join(sorted(unknown))}')
+
+    postgrest = FakePostgREST(args.latency_ms, args.jitter_ms).start()
+    users, posts = seed_fixtures(postgrest, args.users, args.posts)
+    user_ids = [user['id'] for user in users]
+    print(f'🧪 stand-in: {len(users):,} users, {len(posts):,} posts, '
+          f'{args.latency_ms:g}+{args.jitter_ms:g} ms per call; concurrency {args.concurrency}')
+
+    app_process, base_url = start_app(postgrest.url, pool_size=args.concurrency)
+    try:
+        sessions = [logged_in_session(base_url, DEMO_PEOPLE[i % len(DEMO_PEOPLE)])
+                    for i in range(args.concurrency)]
+        if not postgrest.requests:
+            raise RuntimeError('the app never called the stand-in (still on mock data?)')
+        results = {}
+        print(f'{"route":<18} {"reqs":>6} {"errs":>5} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8}')
+        for route in routes:
+            calls_before = postgrest.requests
+            result = run_route(base_url, sessions, route, user_ids, args.requests, args.warmup)
+            result['db_calls_per_request'] = round((postgrest.requests - calls_before) / (args.requests + args.warmup), 2)
+            results[route] = result
+            print(f'{route:<18} {result["requests"]:>6} {result["errors"]:>5} {result["p50_ms"]:>8.1f} '
+                  f'{result["p95_ms"]:>8.1f} {result["p99_ms"]:>8.1f} {result["rps"]:>8.1f}')
+    finally:
+        app_process.terminate()
+        app_process.wait(timeout=10)
+        postgrest.stop()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'args': vars(args), 'routes': results}, f, indent=2)
+        print(f'💾 saved to {args.save}')
+
+    failed = any(result['errors'] for result in results.values())
+    if failed:
+        print('❌ some requests failed')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['routes']
+        regressions = compare(results, baseline, args.max_regression)
+        for line in regressions:
+            print(f'❌ {line}')
+        if regressions:
+            failed = True
+        else:
+            print(f'✅ no route regressed more than {args.max_regression:.0%} at p95')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
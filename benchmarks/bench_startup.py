@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: time from a cold interpreter to the first served response.
+
+    python benchmarks/bench_startup.py                 # mock mode
+    python benchmarks/bench_startup.py --unreachable   # Supabase configured but blackholed
+    python benchmarks/bench_startup.py --budget-ms 1500
+
+Each run starts a fresh Python process (like a Vercel cold start or a new
+gunicorn worker), imports app.py and serves one request through the test
+client: by default a POST /login, the first data request a visitor makes. It
+reads the store, so the budget includes waiting for the Supabase probe
+(/health never touches the store). Exits non-zero when the slowest run is
+over --budget-ms, so CI can enforce the budget.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import parse_qsl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter()
+response = app.app.test_client().open(PATH, method=METHOD, data=DATA)
+t_first = time.perf_counter()
+assert response.status_code < 500, response.status_code
+print(json.dumps({"import_ms": (t_import - t0) * 1000, "first_response_ms": (t_first - t0) * 1000}))
+'''
+
+
+def run_once(method, path, data, env):
+    child = CHILD.replace('METHOD', repr(method)).replace('PATH', repr(path)).replace('DATA', repr(data))
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', child],
+                         cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process_ms'] = wall_ms
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--method', default='POST')
+    parser.add_argument('--path', default='/login')
+    parser.add_argument('--data', default='email=john@example.com&password=password123',
+                        help='form body for the request (default: a demo login)')
+    parser.add_argument('--budget-ms', type=float, default=1500.0,
+                        help='max allowed import + first response time (default: 1500)')
+    parser.add_argument('--unreachable', action='store_true',
+                        help='configure Supabase with an address that never answers')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if args.unreachable:
+        # A socket that completes the TCP handshake but never answers:
+        # a blocking probe would hang here until its timeout
+        blackhole = socket.socket()
+        blackhole.bind(('127.0.0.1', 0))
+        blackhole.listen(64)
+        env['SUPABASE_URL'] = f'http://127.0.0.1:{blackhole.getsockname()[1]}'
+        env['SUPABASE_KEY'] = 'startup-benchmark'
+    else:
+        env.pop('SUPABASE_URL', None)
+        env.pop('SUPABASE_KEY', None)
+
+    data = dict(parse_qsl(args.data)) if args.data else None
+    runs = [run_once(args.method, args.path, data, env) for _ in range(args.runs)]
+    for key in ('import_ms', 'first_response_ms', 'process_ms'):
+        values = sorted(run[key] for run in runs)
+        print(f'{key:>18}: min {values[0]:8.1f}  median {values[len(values) // 2]:8.1f}  max {values[-1]:8.1f}')
+
+    worst = max(run['first_response_ms'] for run in runs)
+    if worst > args.budget_ms:
+        print(f'❌ time-to-first-response {worst:.1f} ms is over the {args.budget_ms:.0f} ms budget')
+        return 1
+    print(f'✅ time-to-first-response {worst:.1f} ms is within the {args.budget_ms:.0f} ms budget')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Local PostgREST stand-in, so the Supabase code paths run offline.
+
+    python benchmarks/fake_postgrest.py --port 54321 --latency-ms 5 --demo
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=local python app.py
+
+Speaks the subset of PostgREST the app uses, over in-memory tables:
+
+- filters ``col=eq./neq./gt./gte./lt./lte./in.(...)/is.null`` and
+  ``or=(...)`` / ``and=(...)`` trees (quoted values allowed)
+- ``select=`` column lists with embedded ``users(...)`` via ``user_id``, or
+  via another column with an alias and hint: ``reviewer:users!reviewer_id(...)``
+- ``order=col.desc,col2.asc``, ``limit``, ``offset``
+- POST of one row or an array, ``on_conflict`` and ``Prefer:
+  return=representation|minimal, resolution=ignore-duplicates|merge-duplicates``
+- PATCH with filters
+
+Every response is delayed by ``latency_ms`` (+ up to ``jitter_ms``) to stand
+in for the network round trip to the real database.
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REST_PREFIX = '/rest/v1/'
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'or', 'and', 'columns'}
+# Embedded resource -> the column on the parent row that points at it
+FOREIGN_KEYS = {'users': 'user_id'}
+# Columns with an equality index (the real tables have btree indexes on these)
+INDEXED_COLUMNS = ('id', 'email', 'username', 'user_id', 'cell', 'user_type', 'business_id', 'neighborhood_id',
+                   'conversation', 'owner_id')
+OPERATORS = {'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in', 'is'}
+
+
+class QueryError(Exception):
+    """Bad filter / select syntax -> 400, like PostgREST's PGRST100."""
+
+
+class ConflictError(Exception):
+    """Duplicate primary key -> 409, like PostgREST's 23505."""
+
+
+def _split_top(text, sep=','):
+    """Split on ``sep`` outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == sep and depth == 0 and not quoted:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    if current or parts:
+        parts.append(''.join(current))
+    return parts
+
+
+def _unquote(value):
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _coerce(raw, sample):
+    """Filter values arrive as text; compare them as the column's type."""
+    if isinstance(sample, bool):
+        return raw == 'true'
+    if isinstance(sample, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            raise QueryError(f'invalid number "{raw}"')
+    return raw
+
+
+def _in_list(raw):
+    if not (raw.startswith('(') and raw.endswith(')')):
+        raise QueryError(f'in. needs a (list), got "{raw}"')
+    return [_unquote(item) for item in _split_top(raw[1:-1])]
+
+
+def _compare(op, value, arg):
+    """``arg`` is the unquoted filter text, or the set of options for ``in``."""
+    if op == 'is':
+        if arg == 'null':
+            return value is None
+        return value is (arg == 'true')
+    if op == 'in':
+        if isinstance(value, str):
+            return value in arg
+        return value is not None and any(value == _coerce(item, value) for item in arg)
+    if value is None:
+        return False
+    other = _coerce(arg, value)
+    if op == 'eq':
+        return value == other
+    if op == 'neq':
+        return value != other
+    if op == 'gt':
+        return value > other
+    if op == 'gte':
+        return value >= other
+    if op == 'lt':
+        return value < other
+    return value <= other
+
+
+def parse_condition(column, expression):
+    """``col`` + ``[not.]op.value`` -> predicate(row)."""
+    negate = expression.startswith('not.')
+    if negate:
+        expression = expression[4:]
+    op, sep, raw = expression.partition('.')
+    if not sep or op not in OPERATORS:
+        raise QueryError(f'unsupported filter "{column}={expression}"')
+    arg = frozenset(_in_list(raw)) if op == 'in' else _unquote(raw)
+
+    def predicate(row):
+        return _compare(op, row.get(column), arg) != negate
+    return predicate
+
+
+def parse_logic(kind, body):
+    """``or=(a.eq.1,and(b.gt.2,c.lt.3))`` -> predicate(row)."""
+    if not (body.startswith('(') and body.endswith(')')):
+        raise QueryError(f'{kind} needs a (list), got "{body}"')
+    predicates = []
+    for term in _split_top(body[1:-1]):
+        for nested in ('and', 'or', 'not.and', 'not.or'):
+            if term.startswith(nested + '('):
+                inner = parse_logic(nested.split('.')[-1], term[len(nested):])
+                predicates.append((lambda p: lambda row: not p(row))(inner) if nested.startswith('not.') else inner)
+                break
+        else:
+            column, sep, expression = term.partition('.')
+            if not sep:
+                raise QueryError(f'malformed condition "{term}"')
+            predicates.append(parse_condition(column, expression))
+    combine = any if kind == 'or' else all
+    return lambda row: combine(predicate(row) for predicate in predicates)
+
+
+def parse_select(select):
+    """``a,b,users(c,d)`` -> (['a', 'b'], {'users': ('users', None, ['c', 'd'])}); ``*`` -> (None, {}).
+
+    Embeds map output name -> (table, foreign key column or None, columns)."""
+    columns, embeds, star = [], {}, False
+    for item in _split_top(select or '*'):
+        item = item.strip()
+        if '(' in item:
+            name, _, inner = item.partition('(')
+            alias, _, target = name.rpartition(':')
+            table, _, hint = target.partition('!')
+            embeds[alias or table] = (table, hint or None,
+                                      [c.strip() for c in inner.rstrip(')').split(',') if c.strip()])
+        elif item == '*':
+            star = True
+        elif item:
+            columns.append(item)
+    return (None if star or not columns else columns), embeds
+
+
+def parse_order(order):
+    keys = []
+    for item in (order or '').split(','):
+        if not item:
+            continue
+        column, *modifiers = item.split('.')
+        keys.append((column, 'desc' in modifiers))
+    return keys
+
+
+def parse_prefer(header):
+    prefer = {}
+    for item in (header or '').split(','):
+        key, _, value = item.strip().partition('=')
+        if key:
+            prefer[key] = value
+    return prefer
+
+
+class Table:
+    def __init__(self, name, key='id'):
+        self.name = name
+        self.key = key
+        self.rows = {}          # primary key -> row (insertion ordered)
+        self.indexes = {}       # column -> {value: {pk: row}}
+
+    def _index_add(self, row):
+        for column, index in self.indexes.items():
+            index.setdefault(row.get(column), {})[row[self.key]] = row
+
+    def _index_remove(self, row):
+        for column, index in self.indexes.items():
+            bucket = index.get(row.get(column))
+            if bucket is not None:
+                bucket.pop(row[self.key], None)
+
+    def index(self, column):
+        if column not in self.indexes:
+            index = {}
+            for pk, row in self.rows.items():
+                index.setdefault(row.get(column), {})[pk] = row
+            self.indexes[column] = index
+        return self.indexes[column]
+
+    def put(self, row):
+        old = self.rows.get(row[self.key])
+        if old is not None:
+            self._index_remove(old)
+        self.rows[row[self.key]] = row
+        self._index_add(row)
+
+    def candidates(self, filters):
+        """Rows that can possibly match - narrowed by an eq./in. filter on an indexed column."""
+        for column, expression in filters:
+            if column not in INDEXED_COLUMNS or expression.startswith('not.'):
+                continue
+            op, _, raw = expression.partition('.')
+            if op == 'eq':
+                values = [_unquote(raw)]
+            elif op == 'in':
+                values = _in_list(raw)
+            else:
+                continue
+            index = self.index(column)
+            rows = []
+            for value in values:
+                rows.extend(index.get(value, {}).values())
+            return rows
+        return list(self.rows.values())
+
+
+class FakePostgREST:
+    """In-memory tables behind a threaded HTTP server speaking PostgREST."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, host='127.0.0.1', port=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tables = {name: Table(name) for name in
+                       ('users', 'forum_posts', 'chats', 'conversations', 'reviews', 'heatmap_cells')}
+        self.lock = threading.RLock()
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def load(self, table, rows):
+        with self.lock:
+            target = self.tables.setdefault(table, Table(table))
+            for row in rows:
+                target.put(dict(row))
+        return len(rows)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-postgrest', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self):
+        delay_ms = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    # Query execution
+    def _table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            raise LookupError(f'relation "public.{name}" does not exist')
+        return table
+
+    def _matching(self, table, params):
+        filters = [(key, value) for key, value in params if key not in RESERVED_PARAMS]
+        predicates = [parse_condition(column, expression) for column, expression in filters]
+        for key, value in params:
+            if key in ('or', 'and'):
+                predicates.append(parse_logic(key, value))
+        return [row for row in table.candidates(filters) if all(p(row) for p in predicates)]
+
+    def _shape(self, rows, select):
+        columns, embeds = parse_select(select)
+        shaped = []
+        for row in rows:
+            out = dict(row) if columns is None else {column: row.get(column) for column in columns}
+            for name, (table, hint, embed_columns) in embeds.items():
+                parent_key = hint or FOREIGN_KEYS.get(table, f'{table.rstrip("s")}_id')
+                target = self._table(table).rows.get(row.get(parent_key))
+                out[name] = None if target is None else {c: target.get(c) for c in embed_columns}
+            shaped.append(out)
+        return shaped
+
+    def select(self, name, params):
+        param_map = dict(params)
+        with self.lock:
+            table = self._table(name)
+            rows = self._matching(table, params)
+            offset = int(param_map.get('offset', 0))
+            limit = param_map.get('limit')
+            order = parse_order(param_map.get('order'))
+            # NULLs sort last ascending / first descending, as in Postgres
+            if limit is not None and order and len({desc for _, desc in order}) == 1:
+                # One direction: a top-N heap, like an index scan that stops at the limit
+                pick = heapq.nlargest if order[0][1] else heapq.nsmallest
+                rows = pick(offset + int(limit), rows,
+                            key=lambda row: tuple((row.get(c) is None, row.get(c)) for c, _ in order))
+            else:
+                for column, desc in reversed(order):
+                    rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+            return self._shape(rows, param_map.get('select'))
+
+    def insert(self, name, params, body, prefer):
+        param_map = dict(params)
+        rows = body if isinstance(body, list) else [body]
+        resolution = prefer.get('resolution')
+        with self.lock:
+            table = self._table(name)
+            conflict = param_map.get('on_conflict', table.key)
+            if conflict != table.key:
+                raise QueryError(f'on_conflict only supports the primary key "{table.key}"')
+            written = []
+            for row in rows:
+                if table.key not in row:
+                    raise QueryError(f'null value in column "{table.key}"')
+                existing = table.rows.get(row[table.key])
+                if existing is not None:
+                    if resolution == 'ignore-duplicates':
+                        continue
+                    if resolution != 'merge-duplicates':
+                        raise ConflictError(f'duplicate key value violates unique constraint "{name}_pkey"')
+                    row = {**existing, **row}
+                table.put(dict(row))
+                written.append(table.rows[row[table.key]])
+            return self._shape(written, param_map.get('select'))
+
+    def update(self, name, params, body):
+        param_map = dict(params)
+        with self.lock:
+            table = self._table(name)
+            updated = []
+            for row in self._matching(table, params):
+                new_row = {**row, **body}
+                table.put(new_row)
+                updated.append(new_row)
+            return self._shape(updated, param_map.get('select'))
+
+
+def _handler_for(backend):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # keep-alive, like the real thing
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, payload=None):
+            body = b'' if payload is None else json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def _route(self):
+            url = urlsplit(self.path)
+            if not url.path.startswith(REST_PREFIX):
+                return None, None
+            return url.path[len(REST_PREFIX):].strip('/'), parse_qsl(url.query, keep_blank_values=True)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length)) if length else {}
+
+        def _handle(self, method):
+            backend.requests += 1
+            backend.delay()
+            table, params = self._route()
+            if table is None:
+                return self._reply(404, {'message': 'not found'})
+            try:
+                if not table:
+                    return self._reply(200, {'swagger': '2.0', 'info': {'title': 'fake PostgREST'}})
+                if method == 'GET':
+                    return self._reply(200, backend.select(table, params))
+                body = self._body()
+                prefer = parse_prefer(self.headers.get('Prefer'))
+                if method == 'POST':
+                    rows = backend.insert(table, params, body, prefer)
+                    status = 201
+                else:
+                    rows = backend.update(table, params, body)
+                    status = 200
+                if prefer.get('return') == 'representation':
+                    return self._reply(status, rows)
+                return self._reply(204 if method == 'PATCH' else status)
+            except LookupError as e:
+                self._reply(404, {'code': '42P01', 'message': str(e)})
+            except ConflictError as e:
+                self._reply(409, {'code': '23505', 'message': str(e)})
+            except (QueryError, ValueError) as e:
+                self._reply(400, {'code': 'PGRST100', 'message': str(e)})
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_HEAD(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def do_PATCH(self):
+            self._handle('PATCH')
+
+    return Handler
+
+
+def seed_fixtures(server, users=0, posts=0, demo=True, seed=42):
+    """Load the demo accounts (password123 / business123) plus generated rows, tagged with
+    the bundled neighborhoods, and their heatmap counters (default HexGrid) -> (users, posts)."""
+    sys.path.insert(0, ROOT)
+    import hashlib
+    from heatmap import HexGrid, post_points, user_points
+    from neighborhoods import NeighborhoodIndex
+    from seed import demo_dataset, generate_posts, generate_users
+
+    def password_hash(password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    cell_deg = 0.05  # app.FORUM_CELL_DEG, without importing the app
+    all_users, all_posts = demo_dataset(password_hash('password123'), password_hash('business123'),
+                                        cell_deg, seed=seed) if demo else ([], [])
+    if users:
+        all_users += list(generate_users(users, password_hash('password123'), seed=seed))
+    if posts and all_users:
+        all_posts += list(generate_posts(posts, all_users, cell_deg, seed=seed))
+    neighborhoods = NeighborhoodIndex.from_geojson(os.path.join(ROOT, 'data', 'neighborhoods.geojson'))
+    server.load('users', neighborhoods.tag(all_users))
+    server.load('forum_posts', neighborhoods.tag(all_posts))
+    grid = HexGrid()
+    cells = grid.rows(grid.tally([*user_points(all_users), *post_points(all_posts)]))
+    server.load('heatmap_cells', [{**{k: v for k, v in cell.items() if k != 'delta'}, 'count': cell['delta']}
+                                  for cell in cells])
+    return all_users, all_posts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added to every response')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='plus up to this much, uniformly')
+    parser.add_argument('--demo', action='store_true', help='load the demo accounts')
+    parser.add_argument('--users', type=int, default=0, help='generated users to load')
+    parser.add_argument('--posts', type=int, default=0, help='generated posts to load')
+    args = parser.parse_args(argv)
+
+    server = FakePostgREST(args.latency_ms, args.jitter_ms, args.host, args.port)
+    users, posts = seed_fixtures(server, args.users, args.posts, demo=args.demo)
+    print(f'🧪 fake PostgREST on {server.url} ({len(users):,} users, {len(posts):,} posts, '
+          f'{args.latency_ms:g}+{args.jitter_ms:g} ms latency)')
+    print(f'   SUPABASE_URL={server.url} SUPABASE_KEY=local python app.py')
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
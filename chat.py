@@ -0,0 +1,59 @@
+"""
+Direct messages: conversation keys and per-person conversation summaries.
+
+A message (a ``chats`` row) carries ``conversation``, the two user ids
+sorted and joined with ``:``. So a conversation's history is one indexed
+range on (conversation, created_at, id), from either side.
+
+Each person also has a summary row per conversation in ``conversations``,
+with id ``<owner_id>:<other_id>``. It holds the last message's preview,
+sender and time, the message count, and how many messages the owner hasn't
+read. Every send updates both participants' summaries by the one new
+message. So listing someone's conversations is one indexed range on
+(owner_id, last_message_at, id) and never reads ``chats``.
+"""
+MAX_MESSAGE_LENGTH = 2000
+PREVIEW_LENGTH = 140
+SUMMARY_FIELDS = ('id', 'owner_id', 'other_id', 'last_message_id', 'last_sender_id', 'last_message',
+                  'last_message_at', 'message_count', 'unread_count')
+
+
+def conversation_key(user_id, other_id):
+    """The same key from either side: both ids, sorted."""
+    return ':'.join(sorted((str(user_id), str(other_id))))
+
+
+def summary_id(owner_id, other_id):
+    return f'{owner_id}:{other_id}'
+
+
+def parse_message(value):
+    """Message text with surrounding whitespace removed; raises ValueError if empty or too long."""
+    text = (value or '').strip() if isinstance(value, str) or value is None else None
+    if not text:
+        raise ValueError('message must be non-empty text')
+    if len(text) > MAX_MESSAGE_LENGTH:
+        raise ValueError(f'message must be at most {MAX_MESSAGE_LENGTH} characters')
+    return text
+
+
+def preview(text):
+    return text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH - 1].rstrip() + '…'
+
+
+def apply_message(summary, message, owner_id):
+    """``owner_id``'s summary after one new message in the conversation (``summary`` None before the first)."""
+    other_id = message['receiver_id'] if message['sender_id'] == owner_id else message['sender_id']
+    count = summary['message_count'] if summary else 0
+    unread = summary['unread_count'] if summary else 0
+    return {
+        'id': summary_id(owner_id, other_id),
+        'owner_id': owner_id,
+        'other_id': other_id,
+        'last_message_id': message['id'],
+        'last_sender_id': message['sender_id'],
+        'last_message': preview(message['message']),
+        'last_message_at': message['created_at'],
+        'message_count': count + 1,
+        'unread_count': unread + (message['receiver_id'] == owner_id),
+    }
@@ -0,0 +1,140 @@
+"""
+Per-user mailboxes that deliver new chat messages by long-poll or Server-Sent Events.
+
+Only people with a client listening have a mailbox. A client's first poll
+opens one, and it is dropped after ``idle_timeout`` with no poll. Sending a
+message drops an event into the sender's and the recipient's mailboxes, if
+they are open. Anyone else sees the message in their conversation list later.
+
+Every event gets a sequence number, increasing across the whole process. A
+client passes back the last number it saw and gets everything newer. So
+several tabs, or a poll retried after its response was lost, each see every
+event. A mailbox keeps its last ``max_events``. Two cases get one ``resync``
+event instead, meaning "re-read your conversations": a client asking from
+before the oldest event kept, and a client whose mailbox was dropped in the
+meantime.
+
+Mailboxes are in-process. With several workers, a client only hears about
+messages sent through its own worker.
+"""
+import collections
+import itertools
+import threading
+import time
+
+
+class Mailbox:
+    def __init__(self, floor, max_events):
+        self.floor = floor              # no events at or before this sequence number are here
+        self.last_active = time.monotonic()
+        self.waiting = 0
+        self._events = collections.deque()
+        self._max_events = max_events
+        self._ready = threading.Condition()
+
+    def push(self, event):
+        with self._ready:
+            self._events.append(event)
+            if len(self._events) > self._max_events:
+                self.floor = self._events.popleft()['seq']
+            self._ready.notify_all()
+
+    def latest(self):
+        with self._ready:
+            return self._events[-1]['seq'] if self._events else self.floor
+
+    def newer(self, after, timeout):
+        """Events after sequence number ``after``, waiting up to ``timeout`` seconds for one
+        -> None if ``after`` is from before the floor (the caller missed events)."""
+        with self._ready:
+            if after < self.floor:
+                return None
+            if not self._events or self._events[-1]['seq'] <= after:
+                self._ready.wait(timeout)
+                if after < self.floor:
+                    return None
+            return [event for event in self._events if event['seq'] > after]
+
+    def wake(self):
+        with self._ready:
+            self._ready.notify_all()
+
+
+class Mailboxes:
+    def __init__(self, max_events=100, max_mailboxes=10000, idle_timeout=60.0):
+        self.max_events = max_events
+        self.max_mailboxes = max_mailboxes
+        self.idle_timeout = idle_timeout
+        self._mailboxes = {}            # user_id -> Mailbox
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.resyncs = 0
+
+    def __len__(self):
+        return len(self._mailboxes)
+
+    def deliver(self, user_id, kind, data):
+        """Put an event in ``user_id``'s mailbox if it's open -> whether it was."""
+        with self._lock:
+            self._last_seq = next(self._seq)
+            event = {'seq': self._last_seq, 'type': kind, 'data': data}
+            mailbox = self._mailboxes.get(user_id)
+        if mailbox is None:
+            return False
+        mailbox.push(event)
+        self.delivered += 1
+        return True
+
+    def _open(self, user_id):
+        """(mailbox, newly opened), counted as waiting so it isn't reaped - mailbox None when
+        there are too many"""
+        with self._lock:
+            mailbox = self._mailboxes.get(user_id)
+            opened = mailbox is None
+            if opened:
+                if len(self._mailboxes) >= self.max_mailboxes:
+                    return None, False
+                mailbox = self._mailboxes[user_id] = Mailbox(self._last_seq, self.max_events)
+            mailbox.waiting += 1
+            return mailbox, opened
+
+    def wait(self, user_id, after=None, timeout=0):
+        """Events for ``user_id`` after sequence number ``after``, waiting up to ``timeout``
+        seconds for one -> (events, last sequence number to pass back next time), or None
+        when no more mailboxes can be opened.
+
+        ``after`` None starts listening from now and returns no events."""
+        self.reap_idle()
+        mailbox, opened = self._open(user_id)
+        if mailbox is None:
+            return None
+        try:
+            if after is None:
+                return [], mailbox.latest()
+            events = None if opened else mailbox.newer(after, timeout)
+        finally:
+            with self._lock:
+                mailbox.waiting -= 1
+                mailbox.last_active = time.monotonic()
+        if events is None:
+            self.resyncs += 1
+            return [{'seq': None, 'type': 'resync', 'data': {}}], mailbox.latest()
+        return events, events[-1]['seq'] if events else after
+
+    def reap_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [user_id for user_id, mailbox in self._mailboxes.items()
+                    if not mailbox.waiting and mailbox.last_active < cutoff]
+            for user_id in idle:
+                self._mailboxes.pop(user_id).wake()
+
+    def stats(self):
+        return {
+            'mailboxes': len(self._mailboxes),
+            'waiting': sum(mailbox.waiting for mailbox in list(self._mailboxes.values())),
+            'delivered': self.delivered,
+            'resyncs': self.resyncs,
+        }
@@ -0,0 +1,109 @@
+"""
+Vectorized distance engine.
+
+Computes distances from one origin to many lat/lng points in a single
+NumPy pass, instead of calling geopy's geodesic once per row.
+Haversine (spherical) by default, Vincenty on the WGS-84 ellipsoid when
+``accurate=True``.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance from (lat, lng) to every (lats[i], lngs[i]) in km."""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_km(lat, lng, lats, lngs):
+    """Ellipsoidal (Vincenty inverse) distance from (lat, lng) to every point in km.
+
+    Iterates on all points at once; the few nearly-antipodal pairs that
+    never converge fall back to haversine.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    f = WGS84_F
+    L = np.radians(lngs - lng)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lats)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # cos2_alpha == 0 only on the equator line
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) < VINCENTY_TOLERANCE
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        distances = WGS84_B * A * (sigma - delta_sigma)
+
+    if not converged.all():
+        fallback = ~converged
+        distances[fallback] = haversine_km(lat, lng, lats[fallback], lngs[fallback])
+    return distances
+
+
+def distances_km(lat, lng, lats, lngs, accurate=False):
+    """Distances from one origin to arrays of points - Vincenty if ``accurate``."""
+    if accurate:
+        return vincenty_km(lat, lng, lats, lngs)
+    return haversine_km(lat, lng, lats, lngs)
+
+
+def rank_by_distance(rows, lat, lng, accurate=False, sort=True):
+    """Return copies of dict rows annotated with ``distance_km``, closest first.
+
+    Pass ``sort=False`` to keep the input order. Rows without coordinates
+    get ``distance_km = None`` and sort last.
+    """
+    rows = [dict(row) for row in rows]
+    if not rows:
+        return rows
+    located = [i for i, row in enumerate(rows)
+               if row.get('latitude') is not None and row.get('longitude') is not None]
+    for row in rows:
+        row['distance_km'] = None
+    if located:
+        lats = np.fromiter((rows[i]['latitude'] for i in located), dtype=np.float64, count=len(located))
+        lngs = np.fromiter((rows[i]['longitude'] for i in located), dtype=np.float64, count=len(located))
+        distances = distances_km(lat, lng, lats, lngs, accurate=accurate)
+        for i, distance in zip(located, np.round(distances, 3).tolist()):
+            rows[i]['distance_km'] = distance
+    if sort:
+        rows.sort(key=lambda row: (row['distance_km'] is None, row['distance_km'] or 0.0))
+    return rows
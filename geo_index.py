@@ -0,0 +1,190 @@
+"""
+In-process spatial index for nearby lookups.
+
+Points are bucketed into a fixed lat/lng grid, so radius and k-nearest
+queries only touch the cells around the caller instead of scanning the
+whole users table. Cost grows with local density, not with total users.
+"""
+import heapq
+import math
+import threading
+
+from geo_distance import haversine_km
+
+KM_PER_DEG_LAT = 111.32
+
+
+def _km_per_deg_lng(lat):
+    # Clamp so the poles don't turn one cell into the whole planet
+    return KM_PER_DEG_LAT * max(math.cos(math.radians(min(abs(lat), 89.9))), 0.001)
+
+
+def cell_key(lat, lng, cell_deg):
+    """Stable text id of the grid cell holding a point, e.g. '814:-1480'.
+
+    Stored alongside rows (forum_posts.cell) so the backend can filter a
+    page down to a handful of cells with an indexed ``cell=in.(...)``.
+    """
+    return f'{math.floor(lat / cell_deg)}:{math.floor(lng / cell_deg)}'
+
+
+def cells_covering(lat, lng, radius_km, cell_deg):
+    """Cell keys of every grid cell that can hold a point within radius_km."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlng = radius_km / _km_per_deg_lng(abs(lat) + dlat)
+    r0, c0 = math.floor((lat - dlat) / cell_deg), math.floor((lng - dlng) / cell_deg)
+    r1, c1 = math.floor((lat + dlat) / cell_deg), math.floor((lng + dlng) / cell_deg)
+    return [f'{r}:{c}' for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+
+class GeoGridIndex:
+    """Grid index of (id -> lat, lng) points, partitioned by kind.
+
+    ``kind`` is the users.user_type ('person' / 'business'), so each map
+    layer is queried on its own without filtering the other one out.
+    """
+
+    def __init__(self, cell_deg=0.01, clusters=None):
+        self.cell_deg = cell_deg                # ~1.1 km of latitude
+        self.clusters = clusters                # optional map_clusters.ClusterGrid kept in sync
+        self._cells = {}                        # (kind, row, col) -> {id: (lat, lng)}
+        self._kind_cells = {}                   # kind -> {(row, col)} that are non-empty
+        self._points = {}                       # id -> (lat, lng, kind)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def get(self, point_id):
+        """Return (lat, lng, kind) for an indexed id, or None."""
+        return self._points.get(point_id)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def upsert(self, point_id, lat, lng, kind):
+        """Insert or move a point. Points without coordinates are dropped."""
+        with self._lock:
+            self._remove_locked(point_id)
+            if lat is None or lng is None:
+                return
+            lat, lng = float(lat), float(lng)
+            cell = self._cell(lat, lng)
+            self._cells.setdefault((kind,) + cell, {})[point_id] = (lat, lng)
+            self._kind_cells.setdefault(kind, set()).add(cell)
+            self._points[point_id] = (lat, lng, kind)
+            if self.clusters is not None:
+                self.clusters.add(lat, lng, kind)
+
+    def remove(self, point_id):
+        with self._lock:
+            self._remove_locked(point_id)
+
+    def _remove_locked(self, point_id):
+        old = self._points.pop(point_id, None)
+        if old is None:
+            return
+        lat, lng, kind = old
+        if self.clusters is not None:
+            self.clusters.remove(lat, lng, kind)
+        cell = self._cell(lat, lng)
+        bucket = self._cells.get((kind,) + cell)
+        if bucket is not None:
+            bucket.pop(point_id, None)
+            if not bucket:
+                del self._cells[(kind,) + cell]
+                self._kind_cells[kind].discard(cell)
+
+    def _cells_in_box(self, kind, lat0, lng0, lat1, lng1):
+        """Yield the non-empty (row, col) cells overlapping a lat/lng box."""
+        r0, c0 = self._cell(lat0, lng0)
+        r1, c1 = self._cell(lat1, lng1)
+        occupied = self._kind_cells.get(kind, ())
+        # Big boxes over a sparse layer: walking the occupied cells is cheaper
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > len(occupied):
+            return [cell for cell in occupied if r0 <= cell[0] <= r1 and c0 <= cell[1] <= c1]
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1) if (r, c) in occupied]
+
+    def _gather(self, kind, cells, exclude_id=None):
+        # -> ([id], [(lat, lng)]) of the points in ``cells``; caller holds the lock
+        ids, points = [], []
+        for cell in cells:
+            for point_id, point in self._cells[(kind,) + cell].items():
+                if point_id != exclude_id:
+                    ids.append(point_id)
+                    points.append(point)
+        return ids, points
+
+    def within_radius(self, lat, lng, radius_km, kind, limit=None, exclude_id=None):
+        """Return [(id, distance_km)] within ``radius_km``, closest first."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlng = radius_km / _km_per_deg_lng(abs(lat) + dlat)
+        with self._lock:
+            ids, points = self._gather(kind, self._cells_in_box(kind, lat - dlat, lng - dlng, lat + dlat, lng + dlng),
+                                       exclude_id)
+        # One vectorized distance pass over every candidate
+        distances = haversine_km(lat, lng, [p[0] for p in points], [p[1] for p in points]).tolist()
+        hits = [(distance, point_id) for distance, point_id in zip(distances, ids) if distance <= radius_km]
+        hits = heapq.nsmallest(limit, hits) if limit else sorted(hits)
+        return [(point_id, distance) for distance, point_id in hits]
+
+    def within_bbox(self, kind, south, west, north, east, limit=None, exclude_id=None):
+        """Return up to ``limit`` ids inside the lat/lng box."""
+        ids = []
+        with self._lock:
+            for cell in self._cells_in_box(kind, south, west, north, east):
+                for point_id, (plat, plng) in self._cells[(kind,) + cell].items():
+                    if point_id != exclude_id and south <= plat <= north and west <= plng <= east:
+                        ids.append(point_id)
+                        if limit and len(ids) >= limit:
+                            return ids
+        return ids
+
+    def nearest(self, lat, lng, k, kind, max_radius_km=None, exclude_id=None):
+        """Return the ``k`` closest [(id, distance_km)], closest first.
+
+        Rings of cells are visited outwards from the caller's cell and the
+        search stops as soon as no unvisited ring can beat the current k-th
+        best distance.
+        """
+        if k <= 0:
+            return []
+        row0, col0 = self._cell(lat, lng)
+        best = []       # max-heap via negated distance
+        with self._lock:
+            occupied = self._kind_cells.get(kind, set())
+            remaining = len(occupied)
+            ring = 0
+            while remaining > 0:
+                if ring == 0:
+                    ring_cells = [(row0, col0)]
+                elif 8 * ring > remaining:
+                    # The ring is wider than what's left - sweep the leftovers in one go
+                    ring_cells = [c for c in occupied if max(abs(c[0] - row0), abs(c[1] - col0)) >= ring]
+                else:
+                    ring_cells = [(row0 + dr, col0 + dc)
+                                  for dr in range(-ring, ring + 1)
+                                  for dc in ((-ring, ring) if abs(dr) != ring else range(-ring, ring + 1))]
+                swept_all = ring > 0 and 8 * ring > remaining
+                ring_cells = [cell for cell in ring_cells if self._cells.get((kind,) + cell)]
+                remaining -= len(ring_cells)
+                ids, points = self._gather(kind, ring_cells, exclude_id)
+                distances = haversine_km(lat, lng, [p[0] for p in points], [p[1] for p in points]).tolist()
+                for distance, point_id in zip(distances, ids):
+                    if max_radius_km is not None and distance > max_radius_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, point_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, point_id))
+                if swept_all:
+                    break
+                # Anything not visited yet is at least `ring` whole cells away
+                edge_lat = abs(lat) + (ring + 1) * self.cell_deg
+                bound_km = ring * self.cell_deg * min(KM_PER_DEG_LAT, _km_per_deg_lng(edge_lat))
+                if len(best) >= k and -best[0][0] <= bound_km:
+                    break
+                if max_radius_km is not None and bound_km > max_radius_km:
+                    break
+                ring += 1
+        return [(point_id, -neg) for neg, point_id in sorted(best, reverse=True)]
@@ -0,0 +1,529 @@
+"""
+Memory-mapped geo snapshot, shared by every worker process.
+
+With several gunicorn workers, each building its own spatial index means a
+copy of every user location per worker, and a full table scan on every
+cold start. A snapshot is built once and written to a file as flat arrays:
+
+- points sorted by (type, grid cell): id, latitude, longitude, type and
+  business category. The sorted cell column is the cell index. A box query
+  is one ``searchsorted`` slice per row of cells, and distances are then a
+  single vectorized pass.
+- sorted 64-bit id hashes, for ``get``.
+- per-zoom cluster aggregates (count and centroid per cell), the same ones
+  ``map_clusters.ClusterGrid`` keeps in memory.
+
+Workers ``mmap`` the file read-only and use NumPy views straight on the
+mapping. The data then sits once in the page cache however many workers
+read it, and a new worker is warm as soon as it has mapped the file. A
+refresh writes a new file beside the old one and ``os.replace``s it in.
+Workers still holding the old mapping keep a consistent view until they
+remap.
+
+File layout: ``MAGIC``, the arrays (8-byte aligned), a JSON header (sizes,
+types, categories, each array's offset/dtype/length), then 16 bytes with
+the header's offset and length.
+"""
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from geo_distance import haversine_km
+from geo_index import KM_PER_DEG_LAT, GeoGridIndex, _km_per_deg_lng
+from map_clusters import MIN_ZOOM
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process build lock, each worker may build its own
+    fcntl = None
+
+MAGIC = b'PGGEO\x00\x00\x01'
+HALF_EARTH_KM = 20037.5
+_BIAS = 1 << 30
+_COL_MASK = (1 << 31) - 1
+
+
+def _codes(rows, cols):
+    """Grid (row, col) -> int64 codes that sort row-major, so one row of cells is one code range."""
+    return ((np.asarray(rows, dtype=np.int64) + _BIAS) << 31) | (np.asarray(cols, dtype=np.int64) + _BIAS)
+
+
+def _id_hash(point_id):
+    return int.from_bytes(hashlib.blake2b(str(point_id).encode(), digest_size=8).digest(), 'little')
+
+
+def write_snapshot(path, points, cell_deg=0.01, max_cluster_zoom=14, cells_per_tile=4, built_at=None):
+    """Write (id, latitude, longitude, kind, category) points to ``path``, replacing it atomically.
+
+    Points without coordinates are skipped -> number written. ``built_at`` (epoch
+    seconds, default now) should be when reading the points started."""
+    built_at = time.time() if built_at is None else built_at
+    ids, lats, lngs, kinds, categories = [], [], [], [], []
+    for point_id, lat, lng, kind, category in points:
+        if lat is None or lng is None:
+            continue
+        ids.append(str(point_id))
+        lats.append(float(lat))
+        lngs.append(float(lng))
+        kinds.append(kind)
+        categories.append(category)
+
+    kind_names = sorted(set(kinds))
+    category_names = sorted({category for category in categories if category})
+    kind_of = {name: i for i, name in enumerate(kind_names)}
+    category_of = {name: i for i, name in enumerate(category_names)}
+    lat = np.array(lats, dtype=np.float64)
+    lng = np.array(lngs, dtype=np.float64)
+    kind = np.array([kind_of[name] for name in kinds], dtype=np.uint8)
+    category = np.array([category_of.get(name, -1) for name in categories], dtype=np.int32)
+    cell_rows = np.floor(lat / cell_deg).astype(np.int64)
+    cells = _codes(cell_rows, np.floor(lng / cell_deg))
+
+    order = np.lexsort((cells, kind))
+    lat, lng, kind, category, cells, cell_rows = (a[order] for a in (lat, lng, kind, category, cells, cell_rows))
+    encoded = [ids[i].encode() for i in order.tolist()]
+    id_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(raw) for raw in encoded], out=id_offsets[1:])
+    hashes = np.array([_id_hash(raw.decode()) for raw in encoded], dtype=np.uint64)
+    hash_order = np.argsort(hashes, kind='stable')
+
+    arrays = {
+        'lat': lat, 'lng': lng, 'kind': kind, 'category': category, 'cell': cells,
+        'id_offsets': id_offsets, 'id_blob': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'hashes': hashes[hash_order], 'hash_order': hash_order.astype(np.int64),
+    }
+    header = {
+        'built_at': built_at, 'count': len(encoded), 'cell_deg': cell_deg,
+        'kinds': kind_names, 'categories': category_names,
+        'max_cluster_zoom': max_cluster_zoom, 'cells_per_tile': cells_per_tile,
+        'kind_ranges': {}, 'cluster_ranges': {}, 'arrays': {},
+    }
+
+    cluster_parts = {'cluster_cell': [], 'cluster_count': [], 'cluster_lat': [], 'cluster_lng': []}
+    cluster_size = 0
+    for i, name in enumerate(kind_names):
+        start, end = np.searchsorted(kind, [i, i + 1]).tolist()
+        header['kind_ranges'][name] = [start, end, int(cell_rows[start:end].min()), int(cell_rows[start:end].max())]
+        for zoom in range(max_cluster_zoom + 1):
+            size = 360.0 / (2 ** zoom) / cells_per_tile
+            rows = np.floor(lat[start:end] / size).astype(np.int64)
+            codes, inverse = np.unique(_codes(rows, np.floor(lng[start:end] / size)), return_inverse=True)
+            counts = np.bincount(inverse)
+            cluster_parts['cluster_cell'].append(codes)
+            cluster_parts['cluster_count'].append(counts.astype(np.int32))
+            cluster_parts['cluster_lat'].append(np.bincount(inverse, weights=lat[start:end]) / counts)
+            cluster_parts['cluster_lng'].append(np.bincount(inverse, weights=lng[start:end]) / counts)
+            header['cluster_ranges'][f'{zoom}:{name}'] = [cluster_size, cluster_size + len(codes),
+                                                         int(rows.min()), int(rows.max())]
+            cluster_size += len(codes)
+    for name, parts in cluster_parts.items():
+        arrays[name] = np.concatenate(parts) if parts else np.empty(0)
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        for name, array in arrays.items():
+            f.write(b'\0' * (-f.tell() % 8))
+            header['arrays'][name] = [f.tell(), array.dtype.str, len(array)]
+            f.write(np.ascontiguousarray(array).tobytes())
+        header_offset = f.tell()
+        raw_header = json.dumps(header, separators=(',', ':')).encode()
+        f.write(raw_header)
+        f.write(struct.pack('<QQ', header_offset, len(raw_header)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(encoded)
+
+
+class GeoSnapshot:
+    """A mapped snapshot file, queried like a GeoGridIndex (read-only)."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+        self.size = stat.st_size
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a geo snapshot')
+        header_offset, header_length = struct.unpack_from('<QQ', self._map, self.size - 16)
+        header = json.loads(self._map[header_offset:header_offset + header_length])
+        self.built_at = header['built_at']
+        self.cell_deg = header['cell_deg']
+        self._count = header['count']
+        self._kinds = header['kinds']
+        self._categories = header['categories']
+        self._kind_ranges = header['kind_ranges']
+        # Zero-copy views on the mapping
+        for name, (offset, dtype, length) in header['arrays'].items():
+            setattr(self, f'_{name}', np.frombuffer(self._map, dtype=dtype, count=length, offset=offset))
+        self.clusters = SnapshotClusters(self, header)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, point_id):
+        return self._position(point_id) is not None
+
+    def count(self, kind):
+        start, end = self._kind_ranges.get(kind, (0, 0))[:2]
+        return end - start
+
+    def _position(self, point_id):
+        if point_id is None:
+            return None
+        key = np.uint64(_id_hash(point_id))
+        i = int(np.searchsorted(self._hashes, key))
+        while i < len(self._hashes) and self._hashes[i] == key:
+            position = int(self._hash_order[i])
+            if self._point_id(position) == str(point_id):
+                return position
+            i += 1
+        return None
+
+    def _point_id(self, position):
+        return self._id_blob[self._id_offsets[position]:self._id_offsets[position + 1]].tobytes().decode()
+
+    def get(self, point_id):
+        """Return (lat, lng, kind) for an id in the snapshot, or None."""
+        position = self._position(point_id)
+        if position is None:
+            return None
+        return float(self._lat[position]), float(self._lng[position]), self._kinds[self._kind[position]]
+
+    def category(self, point_id):
+        position = self._position(point_id)
+        if position is None or self._category[position] < 0:
+            return None
+        return self._categories[self._category[position]]
+
+    def _candidates(self, kind, south, west, north, east):
+        """Positions of the points in the cells overlapping a box (may poke out of it)."""
+        if kind not in self._kind_ranges:
+            return np.empty(0, dtype=np.int64)
+        start, end, min_row, max_row = self._kind_ranges[kind]
+        return _cell_range_positions(self._cell, start, end, min_row, max_row, self.cell_deg, south, west, north, east)
+
+    def within_radius(self, lat, lng, radius_km, kind, limit=None, exclude_id=None):
+        """Return [(id, distance_km)] within ``radius_km``, closest first."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlng = radius_km / _km_per_deg_lng(abs(lat) + dlat)
+        positions = self._candidates(kind, lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+        distances = haversine_km(lat, lng, self._lat[positions], self._lng[positions])
+        keep = distances <= radius_km
+        excluded = self._position(exclude_id)
+        if excluded is not None:
+            keep &= positions != excluded
+        positions, distances = positions[keep], distances[keep]
+        if limit and len(positions) > limit:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            positions, distances = positions[top], distances[top]
+        order = np.argsort(distances, kind='stable')
+        return [(self._point_id(p), d) for p, d in zip(positions[order].tolist(), distances[order].tolist())]
+
+    def within_bbox(self, kind, south, west, north, east, limit=None, exclude_id=None):
+        """Return up to ``limit`` ids inside the lat/lng box."""
+        positions = self._candidates(kind, south, west, north, east)
+        lats, lngs = self._lat[positions], self._lng[positions]
+        keep = (lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east)
+        excluded = self._position(exclude_id)
+        if excluded is not None:
+            keep &= positions != excluded
+        positions = positions[keep][:limit] if limit else positions[keep]
+        return [self._point_id(p) for p in positions.tolist()]
+
+    def nearest(self, lat, lng, k, kind, max_radius_km=None, exclude_id=None):
+        """Return the ``k`` closest [(id, distance_km)], closest first.
+
+        Searches a radius of one cell, then four times wider until ``k`` points
+        are in it: the k closest points in a circle are the k closest overall."""
+        if k <= 0:
+            return []
+        radius = self.cell_deg * KM_PER_DEG_LAT
+        while True:
+            if max_radius_km is not None:
+                radius = min(radius, max_radius_km)
+            hits = self.within_radius(lat, lng, radius, kind, limit=k, exclude_id=exclude_id)
+            if len(hits) >= k or radius >= HALF_EARTH_KM or radius == max_radius_km:
+                return hits
+            radius *= 4
+
+
+def _cell_range_positions(codes, start, end, min_row, max_row, cell_deg, south, west, north, east):
+    """Positions in codes[start:end] (sorted cell codes) of cells overlapping a box."""
+    r0, r1 = max(math.floor(south / cell_deg), min_row), min(math.floor(north / cell_deg), max_row)
+    if start == end or r0 > r1:
+        return np.empty(0, dtype=np.int64)
+    c0, c1 = math.floor(west / cell_deg), math.floor(east / cell_deg)
+    rows = np.arange(r0, r1 + 1)
+    segment = codes[start:end]
+    lo = np.searchsorted(segment, _codes(rows, c0))
+    hi = np.searchsorted(segment, _codes(rows, c1), side='right')
+    spans = [(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+    if not spans:
+        return np.empty(0, dtype=np.int64)
+    return start + np.concatenate([np.arange(a, b) for a, b in spans])
+
+
+class SnapshotClusters:
+    """The snapshot's cluster aggregates, queried like ClusterGrid."""
+
+    def __init__(self, snapshot, header):
+        self._snapshot = snapshot
+        self._ranges = header['cluster_ranges']
+        self.max_cluster_zoom = header['max_cluster_zoom']
+        self.cells_per_tile = header['cells_per_tile']
+
+    def cell_deg(self, zoom):
+        return 360.0 / (2 ** zoom) / self.cells_per_tile
+
+    def clusters(self, kind, zoom, south, west, north, east):
+        """[{'cell', 'count', 'latitude', 'longitude'}] for the cells overlapping the bbox at ``zoom``."""
+        zoom = max(MIN_ZOOM, min(zoom, self.max_cluster_zoom))
+        if f'{zoom}:{kind}' not in self._ranges:
+            return []
+        snapshot = self._snapshot
+        start, end, min_row, max_row = self._ranges[f'{zoom}:{kind}']
+        positions = _cell_range_positions(snapshot._cluster_cell, start, end, min_row, max_row,
+                                          self.cell_deg(zoom), south, west, north, east)
+        codes = snapshot._cluster_cell[positions]
+        rows, cols = ((codes >> 31) - _BIAS).tolist(), ((codes & _COL_MASK) - _BIAS).tolist()
+        return [
+            {'cell': f'{zoom}/{row}/{col}', 'count': count, 'latitude': round(lat, 6), 'longitude': round(lng, 6)}
+            for row, col, count, lat, lng in zip(rows, cols, snapshot._cluster_count[positions].tolist(),
+                                                 snapshot._cluster_lat[positions].tolist(),
+                                                 snapshot._cluster_lng[positions].tolist())
+        ]
+
+    def count_in_box(self, kind, zoom, south, west, north, east):
+        return sum(cluster['count'] for cluster in self.clusters(kind, zoom, south, west, north, east))
+
+
+class LayeredGeoIndex:
+    """A snapshot plus this worker's own writes since it was taken.
+
+    Written ids shadow their snapshot copy. Cluster counts come from the
+    snapshot alone, so they lag moves by up to one refresh."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.clusters = snapshot.clusters
+        self._overlay = GeoGridIndex(snapshot.cell_deg)
+        self._written = {}      # id -> epoch seconds of the write
+        self._successor = None  # set once a newer snapshot replaced this one
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.snapshot) + len(self._overlay)
+
+    def overlay_size(self):
+        return len(self._written)
+
+    def upsert(self, point_id, lat, lng, kind, written_at=None):
+        with self._lock:
+            if self._successor is not None:
+                # A request that fetched us just before the swap
+                return self._successor.upsert(point_id, lat, lng, kind, written_at)
+            self._overlay.upsert(point_id, lat, lng, kind)
+            self._written[point_id] = time.time() if written_at is None else written_at
+
+    def remove(self, point_id):
+        self.upsert(point_id, None, None, None)
+
+    def on_snapshot(self, snapshot):
+        """A new index over ``snapshot``, keeping the writes it may have missed."""
+        index = LayeredGeoIndex(snapshot)
+        with self._lock:
+            for point_id, written_at in self._written.items():
+                if written_at >= snapshot.built_at:
+                    point = self._overlay.get(point_id)
+                    index.upsert(point_id, *(point or (None, None, None)), written_at=written_at)
+            self._successor = index
+        return index
+
+    def get(self, point_id):
+        if point_id in self._written:
+            return self._overlay.get(point_id)
+        return self.snapshot.get(point_id)
+
+    def _merge(self, snapshot_hits, overlay_hits, limit, key=None):
+        shadowed = self._written
+        hits = [hit for hit in snapshot_hits if (hit[0] if key else hit) not in shadowed] + overlay_hits
+        if key:
+            hits.sort(key=key)
+        return hits[:limit] if limit else hits
+
+    def within_radius(self, lat, lng, radius_km, kind, limit=None, exclude_id=None):
+        extra = len(self._written)
+        return self._merge(
+            self.snapshot.within_radius(lat, lng, radius_km, kind, limit and limit + extra, exclude_id),
+            self._overlay.within_radius(lat, lng, radius_km, kind, limit, exclude_id),
+            limit, key=lambda hit: hit[1])
+
+    def within_bbox(self, kind, south, west, north, east, limit=None, exclude_id=None):
+        extra = len(self._written)
+        return self._merge(
+            self.snapshot.within_bbox(kind, south, west, north, east, limit and limit + extra, exclude_id),
+            self._overlay.within_bbox(kind, south, west, north, east, limit, exclude_id),
+            limit)
+
+    def nearest(self, lat, lng, k, kind, max_radius_km=None, exclude_id=None):
+        extra = len(self._written)
+        return self._merge(
+            self.snapshot.nearest(lat, lng, k + extra, kind, max_radius_km, exclude_id),
+            self._overlay.nearest(lat, lng, k, kind, max_radius_km, exclude_id),
+            k, key=lambda hit: hit[1])
+
+
+class SharedGeoSnapshot:
+    """One snapshot file for every worker process.
+
+    Whichever worker finds it missing or older than ``max_age`` rebuilds it
+    (a lock file keeps the others from doing the same). Building reads every
+    location, so it always runs on a background thread, never in a request:
+    until the first snapshot exists, ``index()`` returns None. Every worker
+    checks at most every ``check_interval`` seconds whether the file was
+    replaced, and remaps it when it was."""
+
+    def __init__(self, path, load_points, max_age=300.0, check_interval=1.0, cell_deg=0.01,
+                 max_cluster_zoom=14, cells_per_tile=4, retry_seconds=10.0, name='geo snapshot'):
+        """``load_points()`` -> iterable of (id, latitude, longitude, kind, category) for a rebuild.
+        A failed build isn't retried for ``retry_seconds``."""
+        self.path = path
+        self.load_points = load_points
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.cell_deg = cell_deg
+        self.max_cluster_zoom = max_cluster_zoom
+        self.cells_per_tile = cells_per_tile
+        self.retry_seconds = retry_seconds
+        self.name = name
+        self._index = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._building = False
+        self._failed_at = None
+        self.builds = 0
+        self.maps = 0
+
+    def current(self):
+        """The mapped index, or None before the first ``index()``."""
+        return self._index
+
+    def index(self):
+        """The current LayeredGeoIndex, remapping the file when it was replaced -> None while
+        the first snapshot is still being built (in the background)."""
+        index = self._index
+        if index is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return index
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not self._remap():
+                self._start(self._first_build)
+            elif time.time() - self._index.snapshot.built_at > self.max_age:
+                self._start(self._refresh)
+            return self._index
+
+    def warm(self):
+        """Map the snapshot, or start building it in the background - e.g. at startup."""
+        self.index()
+
+    def _start(self, target):
+        """Run a build on a background thread unless one is running or just failed (hold ``_lock``)."""
+        if self._building or (self._failed_at is not None
+                              and time.monotonic() - self._failed_at < self.retry_seconds):
+            return
+        self._building = True
+        threading.Thread(target=target, name='geo-snapshot-build', daemon=True).start()
+
+    def _remap(self):
+        """Map the file if it changed since we last did -> is there an index now?"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._index is not None
+        if self._index is not None and self._index.snapshot.file_id == (stat.st_ino, stat.st_mtime_ns):
+            return True
+        snapshot = GeoSnapshot(self.path)
+        # The old mapping is unmapped once the last request still using it lets go
+        self._index = self._index.on_snapshot(snapshot) if self._index is not None else LayeredGeoIndex(snapshot)
+        self.maps += 1
+        return True
+
+    @contextmanager
+    def _build_lock(self, blocking):
+        """Cross-process lock around a rebuild -> yields whether we hold it."""
+        if fcntl is None:
+            yield True
+            return
+        with open(f'{self.path}.lock', 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _build(self):
+        started = time.time()
+        count = write_snapshot(self.path, self.load_points(), self.cell_deg, self.max_cluster_zoom,
+                               self.cells_per_tile, built_at=started)
+        self.builds += 1
+        print(f"🗺️  {self.name}: wrote {count:,} points in {time.time() - started:.1f}s")
+
+    def _first_build(self):
+        try:
+            with self._build_lock(blocking=True):
+                # Another worker may have built it while we waited for the lock
+                with self._lock:
+                    mapped = self._remap()
+                if not mapped:
+                    self._build()
+            with self._lock:
+                self._remap()
+            self._failed_at = None
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            print(f"⚠️  {self.name} build failed: {e}")
+        finally:
+            self._building = False
+
+    def _refresh(self):
+        try:
+            with self._build_lock(blocking=False) as locked:
+                # Skip if another worker is rebuilding, or just did
+                if locked and time.time() - os.stat(self.path).st_mtime > self.max_age:
+                    self._build()
+            self._failed_at = None
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            print(f"⚠️  {self.name} refresh failed: {e}")
+        finally:
+            self._building = False
+
+    def stats(self):
+        index = self._index
+        if index is None:
+            return {'points': 0, 'age_seconds': 0.0, 'file_bytes': 0, 'overlay': 0,
+                    'building': int(self._building), 'builds': self.builds, 'maps': self.maps}
+        return {
+            'points': len(index.snapshot),
+            'age_seconds': round(time.time() - index.snapshot.built_at, 1),
+            'file_bytes': index.snapshot.size,
+            'overlay': index.overlay_size(),
+            'building': int(self._building),
+            'builds': self.builds,
+            'maps': self.maps,
+        }
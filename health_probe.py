@@ -0,0 +1,74 @@
+"""
+Lazy, non-blocking backend health probe.
+
+Replaces the blocking connectivity check that used to run at import time.
+The first probe starts in a background thread, callers wait for it only
+briefly, and while the backend is down the result is re-evaluated in the
+background once it is older than ``interval`` seconds - so an outage at
+boot doesn't pin the process to mock mode forever.
+
+Once a probe has succeeded the backend counts as up for good. A later
+outage must not switch a live process over to mock data, where writes
+would be lost; failing calls are the circuit breaker's job.
+"""
+import threading
+import time
+
+
+class HealthProbe:
+    def __init__(self, check, interval=30.0, first_wait=5.0, name='backend'):
+        """``check()`` should raise (or return False) when the backend is unreachable."""
+        self.check = check
+        self.interval = interval
+        self.first_wait = first_wait
+        self.name = name
+        self.healthy = False
+        self.checked_at = None
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self._first_result = threading.Event()
+
+    def _probe(self):
+        try:
+            healthy = self.check() is not False
+            error = None
+        except Exception as e:
+            healthy, error = False, e
+        if healthy != self.healthy or self.checked_at is None:
+            if healthy:
+                print(f"🚀 {self.name} connected successfully!")
+            else:
+                print(f"⚠️  {self.name} unavailable: {error}")
+        self.healthy, self.last_error, self.checked_at = healthy, error, time.time()
+        with self._lock:
+            self._probing = False
+        self._first_result.set()
+
+    def start(self):
+        """Kick off a background probe unless one is already running."""
+        with self._lock:
+            if self._probing:
+                return
+            self._probing = True
+        threading.Thread(target=self._probe, name=f'{self.name}-health', daemon=True).start()
+
+    def is_up(self):
+        """Has the backend been reachable? Until it has, re-probes in the background when stale."""
+        if self.healthy:
+            return True
+        if self.checked_at is None:
+            self.start()
+            # Only the very first data request waits, and never longer than first_wait
+            self._first_result.wait(self.first_wait)
+        elif time.time() - self.checked_at > self.interval:
+            self.start()
+        return self.healthy
+
+    def status(self):
+        """The last probe's result (for /health) - never starts one."""
+        return {
+            'healthy': self.healthy,
+            'checked_at': self.checked_at,
+            'error': str(self.last_error) if self.last_error else None,
+        }
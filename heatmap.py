@@ -0,0 +1,199 @@
+"""
+Density heatmap: a counter per hexagonal cell, one hex grid per zoom level.
+
+Hexagons are laid out on the Web Mercator plane the map draws on, so they
+look regular on screen. At zoom ``z`` a 256px tile is ``cells_per_tile``
+hexagons wide. Each layer (``person``, ``business``, ``post``) has its own
+counter per cell, at every zoom up to ``max_zoom``. Zooming in further
+reuses the ``max_zoom`` grid.
+
+Counters change incrementally: a new point adds 1 to its cell at every zoom,
+and a move subtracts 1 from the old cells and adds 1 to the new ones. A move
+inside one cell cancels out, which at low zoom is almost every move. Reading
+the map then never touches the points themselves.
+
+A cell belongs to the map tile holding its center. So the cells of one tile
+can be loaded, cached and invalidated together. Stored cell rows look like::
+
+    {'id': '12/person/2540/14221', 'zoom': 12, 'layer': 'person', 'q': 2540, 'r': 14221,
+     'tile_x': 1206, 'tile_y': 1539, 'count': 4}
+"""
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+
+from map_clusters import MIN_ZOOM
+
+LAYERS = ('person', 'business', 'post')
+MAX_LATITUDE = 85.05112878  # Web Mercator's edge
+SQRT3 = math.sqrt(3)
+TILE_PX = 256
+
+
+def _world(lat, lng):
+    """(lat, lng) -> Web Mercator (x, y) in [0, 1), y growing south"""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    sin = math.sin(math.radians(lat))
+    return (lng + 180.0) / 360.0, 0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+
+
+def _lat_lng(x, y):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y)))), x * 360.0 - 180.0
+
+
+def _round_hex(q, r):
+    """Fractional axial coordinates -> the hexagon they fall in (cube rounding)"""
+    s = -q - r
+    rq, rr, rs = round(q), round(r), round(s)
+    dq, dr, ds = abs(rq - q), abs(rr - r), abs(rs - s)
+    if dq > dr and dq > ds:
+        rq = -rr - rs
+    elif dr > ds:
+        rr = -rq - rs
+    return int(rq), int(rr)
+
+
+class HexGrid:
+    def __init__(self, max_zoom=14, cells_per_tile=8):
+        self.max_zoom = max_zoom
+        self.cells_per_tile = cells_per_tile
+
+    def resolution(self, zoom):
+        """The zoom whose grid is shown at map zoom ``zoom``"""
+        return max(MIN_ZOOM, min(zoom, self.max_zoom))
+
+    def _radius(self, zoom):
+        # Pointy-top hexagons, sqrt(3) * radius wide, in world units
+        return 1.0 / (2 ** zoom * self.cells_per_tile * SQRT3)
+
+    def radius_px(self, zoom, map_zoom=None):
+        """Hexagon corner radius in screen pixels when the ``zoom`` grid is drawn at ``map_zoom``"""
+        return self._radius(zoom) * TILE_PX * 2 ** (zoom if map_zoom is None else map_zoom)
+
+    def cell(self, lat, lng, zoom):
+        x, y = _world(lat, lng)
+        size = self._radius(zoom)
+        return _round_hex((SQRT3 / 3 * x - y / 3) / size, (2 / 3 * y) / size)
+
+    def _center(self, zoom, q, r):
+        size = self._radius(zoom)
+        return size * SQRT3 * (q + r / 2), size * 1.5 * r
+
+    def center(self, zoom, q, r):
+        return _lat_lng(*self._center(zoom, q, r))
+
+    def tile(self, zoom, q, r):
+        x, y = self._center(zoom, q, r)
+        return math.floor(x * 2 ** zoom), math.floor(y * 2 ** zoom)
+
+    def tiles(self, zoom, south, west, north, east):
+        """(x0, y0, x1, y1) tile range of cells that can overlap the bbox at grid ``zoom``"""
+        margin = self._radius(zoom)     # a cell centered just outside still pokes in
+        x0, y0 = _world(north, west)
+        x1, y1 = _world(south, east)
+        scale = 2 ** zoom
+        return (math.floor((x0 - margin) * scale), math.floor((y0 - margin) * scale),
+                math.floor((x1 + margin) * scale), math.floor((y1 + margin) * scale))
+
+    def changes(self, layer, old=None, new=None, changes=None):
+        """Counter deltas for a point appearing (``new``), going (``old``) or moving
+        -> Counter {(zoom, layer, q, r): delta}, added to ``changes`` if given"""
+        changes = Counter() if changes is None else changes
+        for point, delta in ((old, -1), (new, 1)):
+            if point is None or None in point[:2]:
+                continue
+            lat, lng = float(point[0]), float(point[1])
+            for zoom in range(MIN_ZOOM, self.max_zoom + 1):
+                changes[(zoom, layer) + self.cell(lat, lng, zoom)] += delta
+        return changes
+
+    def tally(self, points):
+        """Counts for a batch of (layer, lat, lng) -> Counter like ``changes``
+
+        Vectorized per layer and zoom, for seeding millions of rows."""
+        by_layer = {}
+        for layer, lat, lng in points:
+            by_layer.setdefault(layer, []).append((lat, lng))
+        counts = Counter()
+        for layer, coordinates in by_layer.items():
+            lat, lng = np.asarray(coordinates, dtype=np.float64).T
+            sin = np.sin(np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)))
+            x = (lng + 180.0) / 360.0
+            y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+            for zoom in range(MIN_ZOOM, self.max_zoom + 1):
+                size = self._radius(zoom)
+                q, r = (SQRT3 / 3 * x - y / 3) / size, (2 / 3 * y) / size
+                s = -q - r
+                rq, rr, rs = np.round(q), np.round(r), np.round(s)
+                dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+                fix_q = (dq > dr) & (dq > ds)
+                fix_r = ~fix_q & (dr > ds)
+                rq = np.where(fix_q, -rr - rs, rq)
+                rr = np.where(fix_r, -rq - rs, rr)
+                cells, n = np.unique(np.stack([rq, rr], axis=1).astype(np.int64), axis=0, return_counts=True)
+                for (cq, cr), count in zip(cells.tolist(), n.tolist()):
+                    counts[(zoom, layer, cq, cr)] += count
+        return counts
+
+    def rows(self, changes):
+        """Counter deltas -> cell rows with a ``delta`` instead of a ``count`` (zero deltas dropped)"""
+        rows = []
+        for (zoom, layer, q, r), delta in changes.items():
+            if delta:
+                tile_x, tile_y = self.tile(zoom, q, r)
+                rows.append({'id': f'{zoom}/{layer}/{q}/{r}', 'zoom': zoom, 'layer': layer, 'q': q, 'r': r,
+                             'tile_x': tile_x, 'tile_y': tile_y, 'delta': delta})
+        return rows
+
+    def touched_tiles(self, changes):
+        return {(zoom,) + self.tile(zoom, q, r) for zoom, _, q, r in changes}
+
+
+def user_points(users):
+    """users rows -> (layer, lat, lng) for the ones with a location"""
+    for user in users:
+        if user.get('latitude') is not None and user.get('longitude') is not None:
+            yield user['user_type'], user['latitude'], user['longitude']
+
+
+def post_points(posts):
+    for post in posts:
+        if post.get('latitude') is not None and post.get('longitude') is not None:
+            yield 'post', post['latitude'], post['longitude']
+
+
+class HeatCounters:
+    """Cell rows in memory, findable by tile (the memory backend's heatmap table)"""
+
+    def __init__(self):
+        self._cells = {}    # id -> row
+        self._tiles = {}    # (zoom, tile_x, tile_y) -> {id}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cells)
+
+    def add(self, rows):
+        with self._lock:
+            for row in rows:
+                cell = self._cells.get(row['id'])
+                count = (cell['count'] if cell else 0) + row['delta']
+                tile = (row['zoom'], row['tile_x'], row['tile_y'])
+                if count > 0:
+                    cell = self._cells[row['id']] = {key: value for key, value in row.items() if key != 'delta'}
+                    cell['count'] = count
+                    self._tiles.setdefault(tile, set()).add(row['id'])
+                elif cell is not None:
+                    del self._cells[row['id']]
+                    self._tiles[tile].discard(row['id'])
+
+    def in_tiles(self, zoom, x0, y0, x1, y1):
+        with self._lock:
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._tiles):
+                tiles = [tile for tile in self._tiles
+                         if tile[0] == zoom and x0 <= tile[1] <= x1 and y0 <= tile[2] <= y1]
+            else:
+                tiles = [(zoom, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            return [dict(self._cells[cell_id]) for tile in tiles for cell_id in self._tiles.get(tile, ())]
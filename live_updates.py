@@ -0,0 +1,208 @@
+"""
+Live map and forum updates over a spatial pub/sub.
+
+Each subscription has an area (a bbox, or a circle around a point) and the
+event kinds it wants. The broker files subscriptions under the grid cells
+their area covers, so ``publish`` only looks at the subscribers filed
+under the event's own cell(s). The exact area is checked last, and the
+event goes onto each matching subscriber's bounded queue. The app drains
+those queues as Server-Sent Events, or in batches for long-polling clients.
+
+Events are deltas, not pages:
+
+- ``person`` / ``business``: a user appeared or moved. Published at both
+  the old and new position, so a viewport the user left hears about it too.
+- ``post``: a new forum post.
+- ``resync``: the subscriber fell behind (its queue overflowed) and should
+  refetch once.
+
+The broker is in-process. With several workers, a subscriber only hears
+about writes made by its own worker.
+"""
+import collections
+import itertools
+import math
+import threading
+import time
+import uuid
+
+from geo_distance import haversine_km
+from geo_index import KM_PER_DEG_LAT
+
+KINDS = ('person', 'business', 'post')
+
+
+class Area:
+    """A lat/lng box, optionally narrowed to a circle (center + radius_km) inside it."""
+
+    def __init__(self, south, west, north, east, center=None, radius_km=None):
+        self.south, self.west, self.north, self.east = south, west, north, east
+        self.center = center
+        self.radius_km = radius_km
+
+    @classmethod
+    def circle(cls, lat, lng, radius_km):
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlng = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 0.001))
+        return cls(lat - dlat, lng - dlng, lat + dlat, lng + dlng, center=(lat, lng), radius_km=radius_km)
+
+    def contains(self, lat, lng):
+        if not (self.south <= lat <= self.north and self.west <= lng <= self.east):
+            return False
+        return self.center is None or haversine_km(self.center[0], self.center[1], lat, lng) <= self.radius_km
+
+
+class Subscription:
+    def __init__(self, area, kinds, max_queue):
+        self.id = uuid.uuid4().hex
+        self.area = area
+        self.kinds = frozenset(kinds)
+        self.cells = ()
+        self.last_active = time.monotonic()
+        self._events = collections.deque()
+        self._max_queue = max_queue
+        self._overflowed = False
+        self._ready = threading.Condition()
+
+    def push(self, event):
+        with self._ready:
+            if len(self._events) >= self._max_queue:
+                # Too far behind to catch up with deltas - tell the client to refetch instead
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.append(event)
+            self._ready.notify_all()
+
+    def wait(self, timeout):
+        """Queued events (oldest first), waiting up to ``timeout`` seconds for the first one."""
+        with self._ready:
+            if not self._events and not self._overflowed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            if self._overflowed:
+                self._overflowed = False
+                events = [{'id': None, 'type': 'resync', 'data': {}}]
+        self.last_active = time.monotonic()
+        return events
+
+    def wake(self):
+        with self._ready:
+            self._ready.notify_all()
+
+
+class SpatialPubSub:
+    def __init__(self, cell_deg=0.05, max_cells=400, max_queue=500, max_subscribers=1000, idle_timeout=60.0):
+        """``max_cells``: areas covering more cells than this are kept on one 'wide' list
+        and checked against every event instead. ``idle_timeout``: long-poll subscriptions
+        not polled for this long are dropped."""
+        self.cell_deg = cell_deg
+        self.max_cells = max_cells
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.idle_timeout = idle_timeout
+        self._subscriptions = {}                        # id -> Subscription
+        self._by_cell = collections.defaultdict(set)    # (row, col) -> {Subscription}
+        self._wide = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def _cells_for(self, area):
+        r0, c0 = self._cell(area.south, area.west)
+        r1, c1 = self._cell(area.north, area.east)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > self.max_cells:
+            return None
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+    def _file(self, subscription):
+        cells = self._cells_for(subscription.area)
+        if cells is None:
+            self._wide.add(subscription)
+            subscription.cells = ()
+        else:
+            for cell in cells:
+                self._by_cell[cell].add(subscription)
+            subscription.cells = cells
+
+    def _unfile(self, subscription):
+        self._wide.discard(subscription)
+        for cell in subscription.cells:
+            bucket = self._by_cell.get(cell)
+            if bucket is not None:
+                bucket.discard(subscription)
+                if not bucket:
+                    del self._by_cell[cell]
+        subscription.cells = ()
+
+    def subscribe(self, area, kinds=KINDS):
+        """New subscription, or None when the broker is full."""
+        self.reap_idle()
+        subscription = Subscription(area, kinds, self.max_queue)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                return None
+            self._subscriptions[subscription.id] = subscription
+            self._file(subscription)
+        return subscription
+
+    def get(self, subscription_id):
+        return self._subscriptions.get(subscription_id)
+
+    def move(self, subscription, area, kinds=None):
+        """Re-point a subscription at a new area (the map was panned)."""
+        with self._lock:
+            self._unfile(subscription)
+            subscription.area = area
+            if kinds is not None:
+                subscription.kinds = frozenset(kinds)
+            if subscription.id in self._subscriptions:
+                self._file(subscription)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if self._subscriptions.pop(subscription.id, None) is not None:
+                self._unfile(subscription)
+        subscription.wake()
+
+    def reap_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [s for s in list(self._subscriptions.values()) if s.last_active < cutoff]
+        for subscription in idle:
+            self.unsubscribe(subscription)
+
+    def publish(self, kind, points, data):
+        """Send ``data`` to subscribers of ``kind`` whose area holds any of ``points`` -> deliveries."""
+        points = [(float(lat), float(lng)) for lat, lng in points if lat is not None and lng is not None]
+        if not points:
+            return 0
+        with self._lock:
+            candidates = set(self._wide)
+            for lat, lng in points:
+                candidates.update(self._by_cell.get(self._cell(lat, lng), ()))
+            event = {'id': next(self._ids), 'type': kind, 'data': data}
+        delivered = 0
+        for subscription in candidates:
+            if kind in subscription.kinds and any(subscription.area.contains(lat, lng) for lat, lng in points):
+                subscription.push(event)
+                delivered += 1
+        self.published += 1
+        self.delivered += delivered
+        return delivered
+
+    def stats(self):
+        return {
+            'subscribers': len(self._subscriptions),
+            'wide_subscribers': len(self._wide),
+            'cells': len(self._by_cell),
+            'published': self.published,
+            'delivered': self.delivered,
+        }
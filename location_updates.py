@@ -0,0 +1,106 @@
+"""
+Write coalescing for high-frequency location pings.
+
+Phones report a position every few seconds. Writing each one through would
+cost a database round trip per ping. ``LocationBuffer`` keeps only the
+latest position per user and drops pings that moved less than
+``min_move_m`` from the last accepted one. A background thread hands the
+whole batch to ``flush`` every ``interval`` seconds, so the backend sees at
+most one write per user per interval, whatever the ping rate.
+"""
+import threading
+
+from geo_distance import haversine_km
+
+
+class LocationBuffer:
+    def __init__(self, flush, interval=5.0, min_move_m=25.0, name='location flush'):
+        """``flush({user_id: (lat, lng)})`` writes one batch; if it raises or returns False, the
+        batch is kept for the next round (unless newer pings replaced it). ``interval <= 0`` writes
+        every accepted ping straight through (e.g. serverless, where no thread outlives a request)."""
+        self.flush = flush
+        self.interval = interval
+        self.min_move_m = min_move_m
+        self.name = name
+        self._pending = {}      # user_id -> latest accepted (lat, lng), until it's written
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.accepted = 0
+        self.ignored = 0
+        self.flushed = 0
+        self.failures = 0
+
+    def submit(self, user_id, lat, lng, known=None):
+        """Queue a ping -> True if it will be written, False if it was too small a move.
+
+        ``known`` is the caller's last accepted (lat, lng) for the user (e.g. kept in the
+        session). Nothing is remembered per user once a batch is written, so after a flush
+        a ping is compared against ``known`` - without it, it is accepted."""
+        lat, lng = float(lat), float(lng)
+        with self._lock:
+            last = self._pending.get(user_id) or known
+            if last and None not in last and haversine_km(last[0], last[1], lat, lng) * 1000 < self.min_move_m:
+                self.ignored += 1
+                return False
+            self._pending[user_id] = (lat, lng)
+            self.accepted += 1
+        if self.interval <= 0:
+            self.flush_now()
+        else:
+            self._ensure_thread()
+        return True
+
+    def flush_now(self):
+        """Write everything pending -> number of users written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                written = self.flush(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠️  {self.name} failed, retrying next round: {e}")
+                self._requeue(batch)
+                return 0
+            if written is False:    # not now (e.g. a dependency still loading) - try again next round
+                self._requeue(batch)
+                return 0
+            self.flushed += len(batch)
+            return len(batch)
+
+    def _requeue(self, batch):
+        # Newer pings that arrived meanwhile win over the batch's positions
+        with self._lock:
+            for user_id, position in batch.items():
+                self._pending.setdefault(user_id, position)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush_now()
+
+    def stop(self):
+        """Stop the flush thread and write what's left."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.flush_now()
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'accepted': self.accepted,
+            'ignored': self.ignored,
+            'flushed': self.flushed,
+            'failures': self.failures,
+        }
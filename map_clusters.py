@@ -0,0 +1,88 @@
+"""
+Server-side marker clustering for the map.
+
+Keeps a (count, centroid) aggregate per grid cell for every zoom level,
+updated incrementally as points are added or moved, so a viewport query
+at low zoom reads a bounded number of pre-aggregated cells instead of
+every point inside it.
+"""
+import math
+import threading
+
+MIN_ZOOM = 0
+MAX_ZOOM = 22
+
+
+class ClusterGrid:
+    def __init__(self, max_cluster_zoom=14, cells_per_tile=4):
+        """Aggregate zoom levels 0..max_cluster_zoom; ~cells_per_tile cells across a 256px tile."""
+        self.max_cluster_zoom = max_cluster_zoom
+        self.cells_per_tile = cells_per_tile
+        self._cells = {}        # (zoom, kind, row, col) -> [count, sum_lat, sum_lng]
+        self._occupied = {}     # (zoom, kind) -> {(row, col)}
+        self._lock = threading.Lock()
+
+    def cell_deg(self, zoom):
+        # A tile at zoom z spans 360 / 2^z degrees of longitude
+        return 360.0 / (2 ** zoom) / self.cells_per_tile
+
+    def _cell(self, lat, lng, zoom):
+        size = self.cell_deg(zoom)
+        return math.floor(lat / size), math.floor(lng / size)
+
+    def add(self, lat, lng, kind):
+        with self._lock:
+            for zoom in range(self.max_cluster_zoom + 1):
+                cell = self._cell(lat, lng, zoom)
+                agg = self._cells.get((zoom, kind) + cell)
+                if agg is None:
+                    self._cells[(zoom, kind) + cell] = [1, lat, lng]
+                    self._occupied.setdefault((zoom, kind), set()).add(cell)
+                else:
+                    agg[0] += 1
+                    agg[1] += lat
+                    agg[2] += lng
+
+    def remove(self, lat, lng, kind):
+        with self._lock:
+            for zoom in range(self.max_cluster_zoom + 1):
+                cell = self._cell(lat, lng, zoom)
+                agg = self._cells.get((zoom, kind) + cell)
+                if agg is None:
+                    continue
+                agg[0] -= 1
+                agg[1] -= lat
+                agg[2] -= lng
+                if agg[0] <= 0:
+                    del self._cells[(zoom, kind) + cell]
+                    self._occupied[(zoom, kind)].discard(cell)
+
+    def clusters(self, kind, zoom, south, west, north, east):
+        """Clusters of ``kind`` whose cell overlaps the bbox at ``zoom``.
+
+        Returns [{'cell', 'count', 'latitude', 'longitude'}] with the centroid
+        of the points in each cell.
+        """
+        zoom = max(MIN_ZOOM, min(zoom, self.max_cluster_zoom))
+        r0, c0 = self._cell(south, west, zoom)
+        r1, c1 = self._cell(north, east, zoom)
+        result = []
+        with self._lock:
+            occupied = self._occupied.get((zoom, kind), set())
+            if (r1 - r0 + 1) * (c1 - c0 + 1) > len(occupied):
+                cells = [cell for cell in occupied if r0 <= cell[0] <= r1 and c0 <= cell[1] <= c1]
+            else:
+                cells = [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1) if (r, c) in occupied]
+            for row, col in cells:
+                count, sum_lat, sum_lng = self._cells[(zoom, kind, row, col)]
+                result.append({
+                    'cell': f'{zoom}/{row}/{col}',
+                    'count': count,
+                    'latitude': round(sum_lat / count, 6),
+                    'longitude': round(sum_lng / count, 6),
+                })
+        return result
+
+    def count_in_box(self, kind, zoom, south, west, north, east):
+        """Number of points in the cells overlapping the bbox (cells may poke out of it)."""
+        return sum(cluster['count'] for cluster in self.clusters(kind, zoom, south, west, north, east))
@@ -0,0 +1,144 @@
+"""
+Compact map marker payloads, chosen with the ``Accept`` header.
+
+A marker needs an id, a position and a label. Sending each as a JSON object
+with a dozen keys mostly sends key names. Two opt-in formats carry only
+what the map draws, one column per field:
+
+- ``application/vnd.pinggov.columnar+json``: parallel arrays per layer,
+  coordinates rounded to 6 decimals::
+
+      {"meta": {...}, "layers": {"users": {"clustered": false, "count": 2,
+        "id": [...], "label": [...], "latitude": [...], "longitude": [...],
+        "distance_km": [...], "rating": [...]}}}
+
+- ``application/vnd.pinggov.markers``: the same structure in binary. Byte
+  offsets, little-endian::
+
+      0   b'PGM1'
+      4   uint32 header length H
+      8   header: UTF-8 JSON (ids, labels, and each numeric column's byte
+          offset), space-padded so the columns start 4-byte aligned
+      8+H float32 columns (NaN = null), read in JS as
+          ``new Float32Array(buffer, offset, count)``
+
+  float32 keeps coordinates to about a metre. Ids are sent as 16 raw bytes
+  each, at the layer's ``uuid_ids`` offset, instead of as 38 bytes of JSON
+  string each. An id that isn't a canonical UUID (the demo users' ``'1'``,
+  ``'2'``...) gets zero bytes there and is listed in the header under
+  ``other_ids`` as ``{index: id}``.
+
+Layers are ``users`` / ``businesses`` (``/api/nearby``, including viewport
+responses) or ``items`` (a plain list). Clustered layers have the columns
+``latitude``, ``longitude`` and ``count``, and no ids or labels.
+"""
+import json
+import struct
+import uuid
+
+import numpy as np
+
+COLUMNAR_MIMETYPE = 'application/vnd.pinggov.columnar+json'
+BINARY_MIMETYPE = 'application/vnd.pinggov.markers'
+MAGIC = b'PGM1'
+
+POINT_COLUMNS = ('latitude', 'longitude', 'distance_km', 'rating')
+CLUSTER_COLUMNS = ('latitude', 'longitude', 'count')
+DECIMALS = {'latitude': 6, 'longitude': 6, 'distance_km': 3, 'rating': 2, 'count': 0}
+
+
+def negotiate(accept_mimetypes):
+    """The compact mimetype the client asked for, or None for plain JSON (also for */*)."""
+    best = accept_mimetypes.best_match(['application/json', COLUMNAR_MIMETYPE, BINARY_MIMETYPE])
+    return best if best in (COLUMNAR_MIMETYPE, BINARY_MIMETYPE) else None
+
+
+def _layers(result):
+    """A nearby / viewport result -> ({name: (clustered, rows)}, meta)"""
+    if isinstance(result, list):
+        return {'items': (False, result)}, {}
+    layers, meta = {}, {}
+    for name, value in result.items():
+        if name not in ('users', 'businesses'):
+            meta[name] = value
+        elif isinstance(value, dict):
+            layers[name] = (True, value['clusters']) if value['clustered'] else (False, value['points'])
+        else:
+            layers[name] = (False, value)
+    return layers, meta
+
+
+def _column(rows, name):
+    return np.array([np.nan if row.get(name) is None else row[name] for row in rows], dtype=np.float64)
+
+
+def _table(clustered, rows):
+    """One layer -> (strings, numeric columns)"""
+    if clustered:
+        return {}, {name: _column(rows, name) for name in CLUSTER_COLUMNS}
+    strings = {
+        'id': [row['id'] for row in rows],
+        'label': [row.get('business_name') or row.get('username') or '' for row in rows],
+    }
+    return strings, {name: _column(rows, name) for name in POINT_COLUMNS}
+
+
+def encode_columnar(result):
+    layers, meta = _layers(result)
+    document = {'meta': meta, 'layers': {}}
+    for name, (clustered, rows) in layers.items():
+        strings, numbers = _table(clustered, rows)
+        layer = {'clustered': clustered, 'count': len(rows), **strings}
+        for column, values in numbers.items():
+            digits = DECIMALS[column]
+            layer[column] = [None if np.isnan(value) else (int(value) if digits == 0 else round(value, digits))
+                             for value in values.tolist()]
+        document['layers'][name] = layer
+    return json.dumps(document, separators=(',', ':'), default=str).encode()
+
+
+def _uuid_bytes(ids):
+    """-> (16 bytes per id, {index: id} for ids that aren't canonical UUID strings)"""
+    packed, others = [], {}
+    for index, value in enumerate(ids):
+        try:
+            parsed = uuid.UUID(value)
+        except (AttributeError, TypeError, ValueError):
+            parsed = None
+        if parsed is None or str(parsed) != value:
+            others[index] = value
+            parsed = uuid.UUID(int=0)
+        packed.append(parsed.bytes)
+    return b''.join(packed), others
+
+
+def encode_binary(result):
+    layers, meta = _layers(result)
+    header = {'meta': meta, 'layers': {}}
+    blocks = []     # (layer, where the offset goes, bytes)
+    for name, (clustered, rows) in layers.items():
+        strings, numbers = _table(clustered, rows)
+        layer = header['layers'][name] = {'clustered': clustered, 'count': len(rows), **strings, 'columns': {}}
+        for column, values in numbers.items():
+            blocks.append((layer['columns'], column, values.astype('<f4').tobytes()))
+        if strings:
+            packed, layer['other_ids'] = _uuid_bytes(layer.pop('id'))
+            blocks.append((layer, 'uuid_ids', packed))
+
+    # Offsets depend on the header length, which depends on the offsets: reserve room for them first
+    for target, key, _ in blocks:
+        target[key] = 0
+    text = json.dumps(header, separators=(',', ':'), default=str).encode()
+    start = 8 + len(text) + 16 * len(blocks)
+    start += -start % 4
+    offset = start
+    for target, key, data in blocks:
+        target[key] = offset
+        offset += len(data)
+    text = json.dumps(header, separators=(',', ':'), default=str).encode()
+    text += b' ' * (start - 8 - len(text))
+    return b''.join([MAGIC, struct.pack('<I', len(text)), text] + [data for _, _, data in blocks])
+
+
+def encode(result, mimetype):
+    return encode_binary(result) if mimetype == BINARY_MIMETYPE else encode_columnar(result)
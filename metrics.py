@@ -0,0 +1,309 @@
+"""
+Hot-path instrumentation.
+
+- ``timed(phase, ...)`` times a block into a Prometheus-style histogram and
+  into the current request's breakdown.
+- ``init_app`` times every route end to end, times Jinja rendering and JSON
+  encoding, sends the per-request breakdown as a ``Server-Timing`` header
+  (``db;dur=..., render;dur=..., json;dur=..., total;dur=...``) and serves the
+  aggregated histograms at ``/metrics`` in Prometheus text format.
+- ``observe_supabase`` is the SupabaseClient ``on_request`` hook: every REST
+  call is timed and counted by table and operation.
+- With ``PROFILE_TOKEN`` set, a request sent with ``X-Profile: <token>`` is
+  stack-sampled while it runs; the folded stacks (flamegraph.pl /
+  speedscope input) are kept at ``/debug/profiles/<id>``.
+"""
+import collections
+import contextvars
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Seconds; tuned for web requests and database round trips
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SUPABASE_OPERATIONS = {'GET': 'select', 'POST': 'insert', 'PATCH': 'update', 'DELETE': 'delete'}
+PROFILE_INTERVAL = 0.005
+PROFILES_KEPT = 20
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += seconds
+        self.count += 1
+
+
+class Registry:
+    """Histograms and counters keyed by (name, labels), rendered in Prometheus text format."""
+
+    def __init__(self, prefix='pinggov_'):
+        self.prefix = prefix
+        self.help = {}
+        self.histograms = {}    # name -> {labels: Histogram}
+        self.counters = {}      # name -> {labels: value}
+        self.collectors = []    # callables -> [(name, help, labels, value)] gauges
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, help='', **labels):
+        key = _key(labels)
+        with self._lock:
+            self.help.setdefault(name, help)
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, help='', **labels):
+        key = _key(labels)
+        with self._lock:
+            self.help.setdefault(name, help)
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def add_collector(self, collect):
+        """``collect()`` -> [(name, help, labels_dict, value)], read on every scrape as gauges."""
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.histograms.items()):
+                full = self.prefix + name
+                lines += [f'# HELP {full} {self.help[name]}', f'# TYPE {full} histogram']
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{full}_bucket{_labels(key, le=_number(bound))} {cumulative}')
+                    lines.append(f'{full}_bucket{_labels(key, le="+Inf")} {histogram.count}')
+                    lines.append(f'{full}_sum{_labels(key)} {_number(histogram.sum)}')
+                    lines.append(f'{full}_count{_labels(key)} {histogram.count}')
+            for name, series in sorted(self.counters.items()):
+                full = self.prefix + name
+                lines += [f'# HELP {full} {self.help[name]}', f'# TYPE {full} counter']
+                lines += [f'{full}{_labels(key)} {_number(value)}' for key, value in sorted(series.items())]
+        gauges = {}
+        for collect in self.collectors:
+            for name, help, labels, value in collect():
+                gauges.setdefault((name, help), []).append((_key(labels), value))
+        for (name, help), samples in sorted(gauges.items()):
+            full = self.prefix + name
+            lines += [f'# HELP {full} {help}', f'# TYPE {full} gauge']
+            lines += [f'{full}{_labels(key)} {_number(value)}' for key, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+def _key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(key, **extra):
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+registry = Registry()
+
+
+class RequestTimings:
+    """Per-request {phase: [total_seconds, calls]}; shared with fan-out threads."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self):
+        parts = []
+        with self._lock:
+            for phase, (seconds, calls) in self.phases.items():
+                parts.append(f'{phase};dur={seconds * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"')
+        parts.append(f'total;dur={(time.perf_counter() - self.start) * 1000:.1f}')
+        return ', '.join(parts)
+
+
+# Context variables (not flask.g) so pool threads that run in a copied context report into the same request
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def record(phase, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase, metric=None, help='', **labels):
+    """Time a block into the request breakdown (``phase``) and a histogram (``metric``, default ``<phase>_seconds``)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        record(phase, seconds)
+        registry.observe(metric or f'{phase}_seconds', seconds, help=help or f'Time spent in {phase}.', **labels)
+
+
+def observe_supabase(method, path, seconds, status):
+    """SupabaseClient on_request hook: one call to ``path`` (the table) took ``seconds``."""
+    table = path.split('?', 1)[0] or 'root'
+    operation = SUPABASE_OPERATIONS.get(method, method.lower())
+    record('db', seconds)
+    registry.observe('supabase_request_duration_seconds', seconds,
+                     help='Supabase REST calls by table and operation.', table=table, operation=operation)
+    if status is None or status >= 400:
+        registry.inc('supabase_errors_total', help='Failed Supabase REST calls (no response or HTTP >= 400).',
+                     table=table, operation=operation, status=status or 'none')
+
+
+# Sampling profiler
+class StackSampler:
+    """Samples one thread's stack every ``interval`` seconds -> Counter of folded stacks."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+profiles = collections.OrderedDict()   # id -> folded stacks, newest last
+_profiles_lock = threading.Lock()
+
+
+def init_app(app, registry=registry):
+    from flask import Response, abort, g, request, template_rendered, before_render_template
+    from flask.json.provider import DefaultJSONProvider
+
+    profile_token = os.environ.get('PROFILE_TOKEN')
+    metrics_token = os.environ.get('METRICS_TOKEN')
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        # response() rather than dumps(): session cookies are JSON too, and aren't what we're after
+        def response(self, *args, **kwargs):
+            with timed('json', 'json_encode_seconds', 'JSON encoding of responses.'):
+                return super().response(*args, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_timing():
+        g.timings_token = _current.set(RequestTimings())
+        if profile_token and request.headers.get('X-Profile') == profile_token:
+            g.profiler = StackSampler(threading.get_ident()).start()
+
+    def render_started(sender, template, context, **extra):
+        g.setdefault('render_starts', []).append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        starts = g.get('render_starts')
+        if starts:
+            seconds = time.perf_counter() - starts.pop()
+            record('render', seconds)
+            registry.observe('template_render_seconds', seconds, help='Jinja template rendering.',
+                             template=template.name or 'string')
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.after_request
+    def finish_request_timing(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if route != '/metrics':
+            registry.observe('http_request_duration_seconds', time.perf_counter() - timings.start,
+                             help='Flask request handling, end to end.',
+                             route=route, method=request.method, status=response.status_code)
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            profile_id = uuid.uuid4().hex[:12]
+            with _profiles_lock:
+                profiles[profile_id] = profiler.folded()
+                while len(profiles) > PROFILES_KEPT:
+                    profiles.popitem(last=False)
+            response.headers['X-Profile-Id'] = profile_id
+        response.headers['Server-Timing'] = timings.server_timing()
+        return response
+
+    @app.teardown_request
+    def reset_request_timing(exc):
+        token = g.pop('timings_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    def _authorized(token):
+        return not token or request.headers.get('Authorization') == f'Bearer {token}'
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        if not _authorized(metrics_token):
+            abort(401)
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/debug/profiles/<profile_id>')
+    def sampled_profile(profile_id):
+        if not profile_token or not _authorized(profile_token):
+            abort(404)
+        with _profiles_lock:
+            folded = profiles.get(profile_id)
+        if folded is None:
+            abort(404)
+        return Response(folded, mimetype='text/plain')
+
+    return app
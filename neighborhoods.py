@@ -0,0 +1,219 @@
+"""
+Offline neighborhood lookup: which boundary polygon a point is in.
+
+Boundaries come from a local GeoJSON FeatureCollection of ``Polygon`` /
+``MultiPolygon`` features (holes allowed). Each feature needs an ``id``
+(or ``properties.id``) and a ``properties.name``; ``properties.city`` is
+optional. Nothing is geocoded over the network.
+
+Polygons are bulk-loaded into a static R-tree with Sort-Tile-Recursive
+packing: sort the bounding boxes by x, cut them into vertical slices, sort
+each slice by y, and pack runs of ``node_size`` into nodes. Then do the same
+one level up, until one node is left. A lookup only walks the nodes whose
+boxes hold the point, and runs a point-in-polygon test (ray casting) on
+those few candidates. With thousands of polygons that takes microseconds,
+where testing every polygon would take milliseconds. Where polygons overlap,
+the smallest one wins, so a neighborhood inside a larger district is found
+first.
+"""
+import json
+import math
+
+import numpy as np
+
+NUMPY_RING_VERTICES = 64    # longer rings are tested with NumPy instead of a Python loop
+BATCH_MAX_POLYGONS = 256    # locate_many vectorizes per polygon only up to this many
+
+
+def _in_ring(x, y, xs, ys):
+    inside = False
+    j = len(xs) - 1
+    for i in range(len(xs)):
+        yi, yj = ys[i], ys[j]
+        if (yi > y) != (yj > y) and x < (xs[j] - xs[i]) * (y - yi) / (yj - yi) + xs[i]:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _in_ring_numpy(x, y, xs, ys):
+    # xs / ys are closed here (first vertex repeated at the end), so edges are plain slices
+    above = ys > y
+    edges = np.flatnonzero(above[1:] != above[:-1])
+    if not len(edges):
+        return False
+    xi, yi = xs[edges], ys[edges]
+    crossings = x < (xs[edges + 1] - xi) * (y - yi) / (ys[edges + 1] - yi) + xi
+    return bool(np.count_nonzero(crossings) % 2)
+
+
+def _in_ring_points(x, y, xs, ys):
+    """Vectorized over points: which of (x, y) are inside one ring"""
+    inside = np.zeros(len(x), dtype=bool)
+    j = len(xs) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(len(xs)):
+            crosses = (ys[i] > y) != (ys[j] > y)
+            inside ^= crosses & (x < (xs[j] - xs[i]) * (y - ys[i]) / (ys[j] - ys[i]) + xs[i])
+            j = i
+    return inside
+
+
+class _Polygon:
+    """One polygon of a feature (a MultiPolygon has several): outer ring, holes, bbox, area"""
+    __slots__ = ('feature', 'bbox', 'area', 'rings', 'vertices')
+
+    def __init__(self, feature, coordinates):
+        self.feature = feature
+        self.rings = []
+        self.vertices = 0
+        for k, ring in enumerate(coordinates):
+            if len(ring) > 1 and ring[0] == ring[-1]:
+                ring = ring[:-1]
+            xs, ys = [float(p[0]) for p in ring], [float(p[1]) for p in ring]
+            if k == 0:
+                self.bbox = (min(xs), min(ys), max(xs), max(ys))
+                self.area = abs(sum(xs[i - 1] * ys[i] - xs[i] * ys[i - 1] for i in range(len(xs)))) / 2
+            if len(ring) >= NUMPY_RING_VERTICES:
+                xs, ys = np.array(xs + xs[:1]), np.array(ys + ys[:1])
+            self.rings.append((xs, ys))
+            self.vertices += len(ring)
+
+    def contains(self, x, y):
+        for k, (xs, ys) in enumerate(self.rings):
+            test = _in_ring_numpy if isinstance(xs, np.ndarray) else _in_ring
+            if test(x, y, xs, ys) != (k == 0):
+                return False    # outside the outer ring, or inside a hole
+        return True
+
+
+def _pack(boxes, node_size):
+    """Sort-Tile-Recursive: box indices -> groups of at most node_size neighbouring boxes"""
+    count = len(boxes)
+    slices = math.ceil(math.sqrt(math.ceil(count / node_size)))
+    per_slice = slices * node_size
+    by_x = sorted(range(count), key=lambda i: boxes[i][0] + boxes[i][2])
+    groups = []
+    for start in range(0, count, per_slice):
+        by_y = sorted(by_x[start:start + per_slice], key=lambda i: boxes[i][1] + boxes[i][3])
+        groups += [by_y[i:i + node_size] for i in range(0, len(by_y), node_size)]
+    return groups
+
+
+def _union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+class NeighborhoodIndex:
+    def __init__(self, features, node_size=16):
+        """``features``: GeoJSON Feature dicts (see the module docstring)."""
+        self._neighborhoods = {}    # id -> {'id', 'name', 'city'}
+        polygons = []
+        for feature in features:
+            properties = feature.get('properties') or {}
+            neighborhood_id = feature.get('id', properties.get('id'))
+            if neighborhood_id is None:
+                raise ValueError(f'neighborhood feature without an id: {properties}')
+            neighborhood = {'id': str(neighborhood_id), 'name': properties.get('name') or str(neighborhood_id),
+                            'city': properties.get('city')}
+            self._neighborhoods[neighborhood['id']] = neighborhood
+            geometry = feature['geometry']
+            parts = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            polygons += [_Polygon(neighborhood, part) for part in parts]
+        # Smallest first, so the most specific of overlapping polygons is tested first
+        self._polygons = sorted(polygons, key=lambda polygon: polygon.area)
+
+        # levels[0] nodes hold polygon indices, levels[k] nodes hold indices into levels[k - 1]
+        self._levels = []
+        boxes = [polygon.bbox for polygon in self._polygons]
+        while boxes:
+            level = [_union([boxes[i] for i in group]) + (tuple(group),) for group in _pack(boxes, node_size)]
+            self._levels.append(level)
+            if len(level) == 1:
+                break
+            boxes = [node[:4] for node in level]
+
+    @classmethod
+    def from_geojson(cls, path, node_size=16):
+        with open(path, encoding='utf-8') as f:
+            document = json.load(f)
+        return cls(document.get('features', []), node_size=node_size)
+
+    def __len__(self):
+        return len(self._neighborhoods)
+
+    def get(self, neighborhood_id):
+        """{'id', 'name', 'city'} for an id, or None"""
+        return self._neighborhoods.get(neighborhood_id)
+
+    def _candidates(self, x, y):
+        """Polygon indices whose bbox holds the point, smallest polygon first"""
+        frontier = [0] if self._levels else []
+        for level in reversed(self._levels):
+            hits = []
+            for i in frontier:
+                min_x, min_y, max_x, max_y, children = level[i]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    hits.extend(children)
+            frontier = hits
+        return sorted(frontier)
+
+    def locate(self, lat, lng):
+        """The neighborhood holding (lat, lng), or None"""
+        if lat is None or lng is None:
+            return None
+        x, y = float(lng), float(lat)
+        for i in self._candidates(x, y):
+            polygon = self._polygons[i]
+            min_x, min_y, max_x, max_y = polygon.bbox
+            if min_x <= x <= max_x and min_y <= y <= max_y and polygon.contains(x, y):
+                return polygon.feature
+        return None
+
+    def locate_id(self, lat, lng):
+        neighborhood = self.locate(lat, lng)
+        return neighborhood['id'] if neighborhood else None
+
+    def locate_many(self, points):
+        """Neighborhood ids for many (lat, lng) at once (None where outside every polygon or missing)
+
+        Vectorized per polygon over the points in its bbox - for bulk tagging, many points
+        over few polygons. Otherwise one ``locate`` per point is quicker."""
+        ids = [None] * len(points)
+        known = [i for i, (lat, lng) in enumerate(points) if lat is not None and lng is not None]
+        if len(self._polygons) > BATCH_MAX_POLYGONS or len(known) < 4 * len(self._polygons):
+            for i in known:
+                ids[i] = self.locate_id(*points[i])
+            return ids
+        coordinates = np.asarray([points[i] for i in known], dtype=np.float64)
+        y, x = coordinates[:, 0], coordinates[:, 1]
+        open_ = np.ones(len(known), dtype=bool)
+        for polygon in self._polygons:
+            min_x, min_y, max_x, max_y = polygon.bbox
+            candidates = np.flatnonzero(open_ & (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y))
+            if not len(candidates):
+                continue
+            if len(candidates) < polygon.vertices:
+                inside = np.array([polygon.contains(x[i], y[i]) for i in candidates], dtype=bool)
+            else:
+                inside = np.ones(len(candidates), dtype=bool)
+                for k, (xs, ys) in enumerate(polygon.rings):
+                    in_ring = _in_ring_points(x[candidates], y[candidates], xs, ys)
+                    inside &= in_ring if k == 0 else ~in_ring
+            for i in candidates[inside]:
+                ids[known[i]] = polygon.feature['id']
+            open_[candidates[inside]] = False
+        return ids
+
+    def tag(self, rows):
+        """Set ``neighborhood_id`` on rows (with latitude / longitude) that have none -> rows"""
+        untagged = [row for row in rows if row.get('neighborhood_id') is None]
+        ids = self.locate_many([(row.get('latitude'), row.get('longitude')) for row in untagged])
+        for row, neighborhood_id in zip(untagged, ids):
+            row['neighborhood_id'] = neighborhood_id
+        return rows
+
+    def stats(self):
+        return {'neighborhoods': len(self._neighborhoods), 'polygons': len(self._polygons),
+                'tree_levels': len(self._levels)}
@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination on (created_at, id) - or another timestamp column.
+
+Pages are addressed by the last row already seen rather than an offset,
+so fetching page N costs the same as page 1 and rows inserted meanwhile
+never shift the window. Cursors are opaque url-safe strings.
+
+Cursors come back from the client, and their values end up inside a
+PostgREST ``or=(...)`` filter. So a decoded cursor must be an ISO-8601
+timestamp and a uuid or integer id (or, with ``id_parts``, several joined by
+``:``, as in chat summary ids), and nothing else gets through.
+"""
+import base64
+import json
+import re
+from datetime import datetime
+
+TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?(Z|[+-]\d{2}(:?\d{2})?)?')
+ID_PATTERN = re.compile(r'\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+
+def encode_cursor(row, column='created_at'):
+    """Cursor pointing just past ``row`` (a dict with ``column`` and id)."""
+    raw = json.dumps([row[column], row['id']], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def page_limit(limit, default, maximum):
+    """Rows per page: ``default`` when not given, capped at ``maximum``; raises ValueError unless positive."""
+    if limit is not None and limit <= 0:
+        raise ValueError('limit must be positive')
+    return min(limit or default, maximum)
+
+
+def is_timestamp(value):
+    if not isinstance(value, str) or not TIMESTAMP_PATTERN.fullmatch(value):
+        return False
+    try:
+        datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return False    # e.g. month 13
+    return True
+
+
+def is_row_id(value, parts=1):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return parts == 1
+    return isinstance(value, str) and len(value.split(':')) == parts and all(
+        ID_PATTERN.fullmatch(part) for part in value.split(':'))
+
+
+def decode_cursor(cursor, id_parts=1):
+    """Return (created_at, id) from a cursor; raises ValueError if it's malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError('invalid cursor') from e
+    if not is_timestamp(created_at) or not is_row_id(row_id, id_parts):
+        raise ValueError('invalid cursor')
+    return created_at, row_id
+
+
+def sort_key(row):
+    return row['created_at'], str(row['id'])
+
+
+def is_before(row, position):
+    """Does ``row`` come after ``position`` in newest-first order?"""
+    created_at, row_id = position
+    return sort_key(row) < (created_at, str(row_id))
+
+
+def postgrest_before(position, column='created_at', id_parts=1):
+    """PostgREST ``or`` filter selecting rows older than ``position`` (newest-first order)."""
+    created_at, row_id = position
+    if not is_timestamp(created_at) or not is_row_id(row_id, id_parts):
+        raise ValueError('invalid cursor')    # never put unchecked values in a filter
+    return f'({column}.lt."{created_at}",and({column}.eq."{created_at}",id.lt."{row_id}"))'
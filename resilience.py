@@ -0,0 +1,116 @@
+"""
+Keeping a slow backend from taking the app down with it.
+
+- A per-request **deadline**. ``set_deadline`` stores it in a context
+  variable, so it follows the request into fan-out threads. The Supabase
+  client (``deadline=remaining``) caps every timeout, retry and backoff at
+  what is left.
+- A **circuit breaker**. When too many recent calls failed, it opens and
+  calls fail fast (``CircuitOpenError`` in the Supabase client) for
+  ``open_seconds``. Requests then get cached or degraded data instead of
+  each waiting out a timeout. After that, one trial call decides whether it
+  closes again.
+"""
+import collections
+import contextvars
+import threading
+import time
+
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+def set_deadline(seconds):
+    """Give the current context ``seconds`` to finish -> token for ``reset_deadline``."""
+    return _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    def __init__(self, failure_ratio=0.5, min_calls=20, window_calls=50, window=30.0, open_seconds=15.0,
+                 name='backend'):
+        """Judges the last ``window_calls`` calls (at most ``window`` seconds old): opens when
+        there are at least ``min_calls`` of them and ``failure_ratio`` failed."""
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_calls = window_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.name = name
+        self.state = 'closed'
+        self.opened_at = None
+        self._calls = collections.deque()   # (monotonic time, failed), oldest first
+        self._failures = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """May a call go out now? (In half-open state only one trial call at a time may.)"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._trial_running:
+                    self.rejected += 1
+                    return False
+                self._trial_running = True
+            return True
+
+    def record(self, failed):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == 'half_open':
+                self._trial_running = False
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = 'closed'
+                    self._calls.clear()
+                    self._failures = 0
+                    print(f"✅ {self.name} circuit closed again")
+                return
+            if self.state == 'open':
+                return  # a call that was already in flight when we opened
+            self._calls.append((now, failed))
+            self._failures += failed
+            while self._calls and (len(self._calls) > self.window_calls or self._calls[0][0] < now - self.window):
+                self._failures -= self._calls.popleft()[1]
+            if len(self._calls) >= self.min_calls and self._failures >= self.failure_ratio * len(self._calls):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = 'open'
+        self.opened_at = now
+        self.opened += 1
+        self._calls.clear()
+        self._failures = 0
+        print(f"🔌 {self.name} circuit opened - failing fast for {self.open_seconds:g}s")
+
+    def retry_after(self):
+        """Seconds until the next trial call (0 unless open)."""
+        if self.state != 'open':
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def status(self):
+        return {
+            'state': self.state,
+            'retry_after': round(self.retry_after(), 1),
+            'recent_calls': len(self._calls),
+            'recent_failures': self._failures,
+            'rejected': self.rejected,
+            'opened': self.opened,
+        }
@@ -0,0 +1,51 @@
+"""
+Business rating totals, maintained incrementally.
+
+A business row carries the totals of its reviews: ``review_count``,
+``rating_sum``, ``rating_histogram`` (how many 1..5 star reviews) and
+``rating`` (the average, None without reviews). Every write adjusts them by
+the one review that changed. A new review is added in, and an edited one
+moves from its old stars to the new ones. So showing a business's rating
+never reads the reviews table. A reviewer has at most one review per
+business; reviewing again replaces it, so resubmitting is harmless.
+"""
+STARS = (1, 2, 3, 4, 5)
+MAX_COMMENT_LENGTH = 1000
+TOTAL_FIELDS = ('review_count', 'rating_sum', 'rating_histogram', 'rating')
+
+
+def parse_rating(value):
+    """'4' / 4 -> 4; raises ValueError unless it is a whole number of stars from 1 to 5."""
+    try:
+        stars = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('rating must be a number from 1 to 5')
+    if stars not in STARS:
+        raise ValueError('rating must be a whole number from 1 to 5')
+    return int(stars)
+
+
+def totals_of(business):
+    """The rating totals stored on a business row (zeros before its first review)."""
+    count = business.get('review_count') or 0
+    return {
+        'review_count': count,
+        'rating_sum': business.get('rating_sum') or 0,
+        'rating_histogram': list(business.get('rating_histogram') or [0] * len(STARS)),
+        'rating': business.get('rating') if count else None,
+    }
+
+
+def apply_review(totals, stars, previous=None):
+    """Totals after one review: a new one (``previous`` None) or an edit from ``previous`` stars."""
+    count, total = totals['review_count'], totals['rating_sum']
+    histogram = list(totals['rating_histogram'])
+    if previous is None:
+        count += 1
+    else:
+        total -= previous
+        histogram[previous - 1] -= 1
+    total += stars
+    histogram[stars - 1] += 1
+    return {'review_count': count, 'rating_sum': total, 'rating_histogram': histogram,
+            'rating': round(total / count, 2)}
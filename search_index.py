@@ -0,0 +1,207 @@
+"""
+In-memory business search: an inverted index with prefix completion.
+
+``business_name``, ``business_category`` and ``bio`` are tokenized
+(lowercased, accents folded) into postings: word -> rows with a weight. A
+name match counts more than a category match, and a category match more
+than a bio match. Every query token must match. The last token is a
+prefix, so "piz ma" finds "Pizza Mario" as the user types. Prefixes are
+expanded with a binary search over the sorted vocabulary: the same range
+lookup a trie gives, without a Python object per character. A short prefix
+can match thousands of words; it expands to the ones in the most
+businesses (plus the prefix itself, when it is a whole word).
+
+Ranking blends three things: the text score (idf-weighted, with partial
+completions counting less than whole words), ``rating``, and closeness to
+the caller. Each business has a slot in NumPy arrays (coordinates, rating),
+and each word's postings are cached as (slots, weights) arrays. So scoring a
+short prefix that matches most of the index is a few vector operations
+instead of a Python loop per match. The index keeps the rows it returns, so
+a keystroke is answered from memory without a database round trip.
+``add`` / ``remove`` / ``move`` keep it current as businesses register or
+move.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from geo_distance import haversine_km
+
+FIELD_WEIGHTS = {'business_name': 3.0, 'business_category': 2.0, 'bio': 1.0}
+_WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """'Café Délice' -> ['cafe', 'delice']"""
+    if not text:
+        return []
+    folded = unicodedata.normalize('NFKD', str(text).lower())
+    return _WORD.findall(''.join(c for c in folded if not unicodedata.combining(c)))
+
+
+class SearchIndex:
+    def __init__(self, field_weights=FIELD_WEIGHTS, max_expansions=64):
+        """``max_expansions``: vocabulary words a prefix may expand to, most frequent first (keeps
+        1-letter queries cheap)."""
+        self.field_weights = field_weights
+        self.max_expansions = max_expansions
+        self._rows = {}         # id -> row as returned by search
+        self._terms = {}        # id -> {token: weight}
+        self._postings = {}     # token -> {slot: weight}
+        self._arrays = {}       # token -> (slots, weights) as arrays, rebuilt after the posting changes
+        self._vocabulary = []   # sorted tokens
+        self._slots = {}        # id -> slot
+        self._ids = []          # slot -> id (None when free)
+        self._free = []
+        self._lat = np.empty(0)
+        self._lng = np.empty(0)
+        self._rating = np.empty(0)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row):
+        """Index (or re-index) one row; rows without any searchable text are skipped."""
+        terms = {}
+        for field, weight in self.field_weights.items():
+            for token in tokenize(row.get(field)):
+                terms[token] = terms.get(token, 0.0) + weight
+        with self._lock:
+            self._remove_locked(row['id'])
+            if not terms:
+                return
+            slot = self._take_slot(row['id'])
+            self._rows[row['id']] = row
+            self._terms[row['id']] = terms
+            self._place(slot, row)
+            self._rating[slot] = row.get('rating') or 0.0
+            for token, weight in terms.items():
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = {}
+                    bisect.insort(self._vocabulary, token)
+                posting[slot] = weight
+                self._arrays.pop(token, None)
+
+    def _take_slot(self, row_id):
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = row_id
+        else:
+            slot = len(self._ids)
+            self._ids.append(row_id)
+            if slot >= len(self._lat):
+                capacity = max(64, 2 * len(self._lat))
+                self._lat, self._lng, self._rating = (np.resize(array, capacity)
+                                                      for array in (self._lat, self._lng, self._rating))
+        self._slots[row_id] = slot
+        return slot
+
+    def _place(self, slot, row):
+        latitude, longitude = row.get('latitude'), row.get('longitude')
+        self._lat[slot] = np.nan if latitude is None else latitude
+        self._lng[slot] = np.nan if longitude is None else longitude
+
+    def _remove_locked(self, row_id):
+        slot = self._slots.pop(row_id, None)
+        if slot is None:
+            return
+        self._rows.pop(row_id)
+        for token in self._terms.pop(row_id):
+            posting = self._postings[token]
+            del posting[slot]
+            self._arrays.pop(token, None)
+            if not posting:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        self._ids[slot] = None
+        self._free.append(slot)
+
+    def move(self, row_id, latitude, longitude):
+        """New position for an indexed row; its terms stay as they are."""
+        with self._lock:
+            row = self._rows.get(row_id)
+            if row is not None:
+                row = self._rows[row_id] = {**row, 'latitude': latitude, 'longitude': longitude}
+                self._place(self._slots[row_id], row)
+
+    def complete(self, prefix):
+        """Vocabulary words starting with ``prefix`` - at most ``max_expansions``: the prefix itself
+        if it is a word, then those in the most rows."""
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        words = self._vocabulary[start:end]
+        if len(words) <= self.max_expansions:
+            return words
+        exact = [prefix] if prefix in self._postings else []
+        return exact + heapq.nlargest(self.max_expansions - len(exact), (word for word in words if word != prefix),
+                                      key=lambda word: len(self._postings[word]))
+
+    def _posting_arrays(self, word):
+        arrays = self._arrays.get(word)
+        if arrays is None:
+            posting = self._postings[word]
+            arrays = self._arrays[word] = (np.fromiter(posting.keys(), dtype=np.intp, count=len(posting)),
+                                           np.fromiter(posting.values(), dtype=np.float64, count=len(posting)))
+        return arrays
+
+    def _term_scores(self, token, prefix):
+        """Dense per-slot score of one query token (best matching word per row), or None on no match."""
+        words = self.complete(token) if prefix else ([token] if token in self._postings else [])
+        if not words:
+            return None
+        scores = np.zeros(len(self._ids))
+        for word in words:
+            slots, weights = self._posting_arrays(word)
+            # Rarer words say more; a completion counts for the share of the word that was typed
+            boost = math.log(1 + len(self._rows) / len(slots)) * len(token) / len(word)
+            scores[slots] = np.maximum(scores[slots], weights * boost)
+        return scores
+
+    def search(self, query, latitude, longitude, limit=10, prefix=True, distance_scale_km=5.0,
+               weights=(0.6, 0.2, 0.2)):
+        """Best ``limit`` rows for ``query`` -> copies with ``distance_km`` and ``score``.
+
+        ``weights`` = (text, rating, proximity); proximity is 1 at the caller and 0.5 at
+        ``distance_scale_km``."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            total = None
+            for i, token in enumerate(tokens):
+                term = self._term_scores(token, prefix and i == len(tokens) - 1)
+                if term is None:
+                    return []
+                # Every token has to match
+                total = term if total is None else np.where((total > 0) & (term > 0), total + term, 0.0)
+            candidates = np.flatnonzero(total)
+            if not len(candidates):
+                return []
+            text = total[candidates]
+            distances = haversine_km(latitude, longitude, self._lat[candidates], self._lng[candidates])
+            proximity = np.nan_to_num(1.0 / (1.0 + distances / distance_scale_km))
+            blended = (weights[0] * text / text.max() + weights[1] * np.clip(self._rating[candidates] / 5.0, 0.0, 1.0)
+                       + weights[2] * proximity)
+            if len(candidates) > limit:
+                top = np.argpartition(-blended, limit)[:limit]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-blended[top], kind='stable')]
+            rows = [self._rows[self._ids[candidates[i]]] for i in top]
+        return [
+            {**row, 'distance_km': None if np.isnan(distances[i]) else round(float(distances[i]), 3),
+             'score': round(float(blended[i]), 4)}
+            for row, i in zip(rows, top)
+        ]
+
+    def stats(self):
+        return {'documents': len(self._rows), 'vocabulary': len(self._vocabulary)}
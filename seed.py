@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Bulk seeding engine.
+
+Generates synthetic users and forum posts spread over realistic city
+clusters and loads them with array-bodied, batched inserts (one POST per
+batch instead of one per row).
+
+    python seed.py --demo                            # the fixed test accounts
+    python seed.py --users 100000 --posts 1000000    # production-scale fixtures
+    python seed.py --users 20000 --posts 100000 --target mock
+    python seed.py --backfill-heatmap                # count rows loaded before the heatmap existed
+    python seed.py --backfill-neighborhoods          # tag rows saved before neighborhood_id existed
+
+``--target mock`` loads into the in-process mock backend and only reports
+timings - handy for sizing a run before pointing it at Supabase.
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from geo_index import cell_key
+from review_stats import totals_of
+
+DEFAULT_BATCH_SIZE = 1000
+DEMO_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, 'demo.pinggov')  # demo row ids are uuid5(DEMO_NAMESPACE, email)
+
+# (name, lat, lng, spread in degrees, weight) - neighbourhood centres people cluster around
+CITY_CLUSTERS = {
+    'New York': [
+        ('Times Square', 40.7589, -73.9851, 0.004, 3),
+        ("Hell's Kitchen", 40.7505, -73.9934, 0.005, 2),
+        ('Central Park South', 40.7614, -73.9776, 0.004, 2),
+        ('Upper West Side', 40.7831, -73.9712, 0.008, 3),
+        ('Greenwich Village', 40.7282, -73.9942, 0.005, 2),
+        ('Tribeca', 40.7180, -74.0134, 0.004, 1),
+        ('Financial District', 40.7061, -74.0087, 0.004, 2),
+        ('Williamsburg', 40.7081, -73.9571, 0.008, 2),
+        ('Astoria', 40.7644, -73.9235, 0.010, 1),
+    ],
+    'Los Angeles': [
+        ('Downtown LA', 34.0407, -118.2468, 0.010, 2),
+        ('Hollywood', 34.0928, -118.3287, 0.010, 2),
+        ('Santa Monica', 34.0195, -118.4912, 0.010, 1),
+    ],
+    'Chicago': [
+        ('The Loop', 41.8786, -87.6251, 0.008, 2),
+        ('Wicker Park', 41.9088, -87.6796, 0.008, 1),
+    ],
+    'London': [
+        ('Soho', 51.5136, -0.1365, 0.006, 2),
+        ('Shoreditch', 51.5265, -0.0780, 0.006, 1),
+    ],
+    'Mexico City': [
+        ('Roma Norte', 19.4194, -99.1621, 0.008, 2),
+        ('Polanco', 19.4330, -99.1910, 0.008, 1),
+    ],
+}
+
+BUSINESS_CATEGORIES = ['Restaurant', 'Cafe', 'Retail', 'Grocery', 'Fitness', 'Bar', 'Salon', 'Services']
+BUSINESS_WORDS = ['Corner', 'Central', 'Urban', 'Golden', 'Fresh', 'Local', 'Sunset', 'Union', 'Park', 'Harbor']
+BIO_SNIPPETS = [
+    'Love exploring the neighborhood!', 'Coffee enthusiast', 'Weekend photographer', 'Always hungry',
+    'New in town, say hi', 'Runner and dog person', 'Local foodie', 'Looking for live music',
+]
+POST_SNIPPETS = [
+    'Anyone know what is happening at the park today?', 'New coffee shop opened around the corner!',
+    'Street closed for a festival this weekend.', 'Lost a black cat near the station, please DM.',
+    'Best lunch spots nearby? Tired of tourist traps!', 'Free yoga class tomorrow morning, all welcome.',
+    'Farmers market is back on Saturday.', 'Power outage on my block, anyone else?',
+]
+
+# Same columns for every user row - PostgREST bulk inserts need uniform keys
+USER_COLUMNS = ('id', 'username', 'email', 'password', 'user_type', 'latitude', 'longitude', 'bio',
+                'business_name', 'business_category', 'rating', 'review_count', 'rating_sum', 'rating_histogram',
+                'neighborhood_id', 'created_at')
+
+
+def _neighbourhoods():
+    return [spot for spots in CITY_CLUSTERS.values() for spot in spots]
+
+
+def generate_users(count, password_hash, business_ratio=0.15, seed=None, start=None):
+    """Yield ``count`` synthetic user rows clustered around real neighbourhoods."""
+    rng = random.Random(seed)
+    spots = _neighbourhoods()
+    weights = [spot[4] for spot in spots]
+    start = start or datetime.utcnow() - timedelta(days=365)
+    for i in range(count):
+        name, lat, lng, spread, _ = rng.choices(spots, weights)[0]
+        is_business = rng.random() < business_ratio
+        row = dict.fromkeys(USER_COLUMNS)
+        row.update({
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'username': f'{"biz" if is_business else "user"}_{i}',
+            'email': f'seed{i}@example.com',
+            'password': password_hash,
+            'user_type': 'business' if is_business else 'person',
+            'latitude': round(rng.gauss(lat, spread), 6),
+            'longitude': round(rng.gauss(lng, spread), 6),
+            'bio': rng.choice(BIO_SNIPPETS),
+            **totals_of({}),
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'created_at': (start + timedelta(seconds=rng.randrange(365 * 86400))).isoformat(),
+        })
+        if is_business:
+            category = rng.choice(BUSINESS_CATEGORIES)
+            row['business_name'] = f'{rng.choice(BUSINESS_WORDS)} {category} {name}'
+            row['business_category'] = category
+            row['rating'] = None  # a business's rating is its reviews' average - set by the first review
+        yield row
+
+
+def generate_posts(count, users, cell_deg, seed=None, start=None):
+    """Yield ``count`` posts by random ``users``, placed near their author."""
+    rng = random.Random(seed)
+    start = start or datetime.utcnow() - timedelta(days=90)
+    authors = [user for user in users if user.get('latitude') is not None]
+    for _ in range(count):
+        author = rng.choice(authors)
+        lat = round(author['latitude'] + rng.gauss(0, 0.002), 6)
+        lng = round(author['longitude'] + rng.gauss(0, 0.002), 6)
+        yield {
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'user_id': author['id'],
+            'content': rng.choice(POST_SNIPPETS),
+            'latitude': lat,
+            'longitude': lng,
+            'cell': cell_key(lat, lng, cell_deg),
+            'created_at': (start + timedelta(seconds=rng.randrange(90 * 86400))).isoformat(),
+        }
+
+
+def demo_dataset(password_hash, business_password_hash, cell_deg, seed=None):
+    """The fixed test accounts and posts listed in the README -> (users, posts).
+
+    Ids are derived from the emails (and post number), so loading the demo again hits the
+    ``on_conflict=id`` ignore and changes nothing."""
+    rng = random.Random(seed)
+    spots = CITY_CLUSTERS['New York']
+    people = [
+        ('john_nyc', 'john@example.com', 'Love exploring NYC neighborhoods!'),
+        ('sarah_manhattan', 'sarah@example.com', 'Coffee enthusiast and local foodie'),
+        ('mike_downtown', 'mike@example.com', 'Photographer capturing city life'),
+        ('emma_uptown', 'emma@example.com', 'Yoga instructor and wellness coach'),
+        ('alex_midtown', 'alex@example.com', 'Tech worker, always looking for good lunch spots'),
+        ('lisa_village', 'lisa@example.com', 'Artist and gallery owner'),
+        ('david_tribeca', 'david@example.com', 'Finance professional, weekend explorer'),
+    ]
+    businesses = [
+        ('joes_coffee', 'info@joescoffee.com', "Joe's Coffee Shop", 'Restaurant', 'Best coffee in the neighborhood since 1995'),
+        ('central_gym', 'info@centralgym.com', 'Central Park Fitness', 'Fitness', 'Premium fitness center with park views'),
+        ('marios_pizza', 'mario@mariospizza.com', "Mario's Authentic Pizza", 'Restaurant', 'Authentic Italian pizza made fresh daily'),
+        ('book_corner', 'hello@bookcorner.com', 'The Book Corner', 'Retail', 'Independent bookstore with rare finds'),
+        ('fresh_market', 'contact@freshmarket.com', 'Fresh Market NYC', 'Grocery', 'Organic produce and local goods'),
+    ]
+    now = datetime.utcnow()
+    users = []
+    for i, (username, email, bio) in enumerate(people):
+        _, lat, lng, _, _ = spots[i % len(spots)]
+        row = dict.fromkeys(USER_COLUMNS)
+        row.update({
+            'id': str(uuid.uuid5(DEMO_NAMESPACE, email)), 'username': username, 'email': email, 'password': password_hash,
+            'user_type': 'person', 'latitude': lat + rng.uniform(-0.001, 0.001),
+            'longitude': lng + rng.uniform(-0.001, 0.001), 'bio': bio, **totals_of({}), 'rating': 4.5,
+            'created_at': now.isoformat(),
+        })
+        users.append(row)
+    for i, (username, email, business_name, category, bio) in enumerate(businesses):
+        _, lat, lng, _, _ = spots[i % len(spots)]
+        row = dict.fromkeys(USER_COLUMNS)
+        row.update({
+            'id': str(uuid.uuid5(DEMO_NAMESPACE, email)), 'username': username, 'email': email,
+            'password': business_password_hash,
+            'user_type': 'business', 'latitude': lat + rng.uniform(-0.0005, 0.0005),
+            'longitude': lng + rng.uniform(-0.0005, 0.0005), 'bio': bio, 'business_name': business_name,
+            'business_category': category, **totals_of({}), 'created_at': now.isoformat(),
+        })
+        users.append(row)
+
+    contents = [
+        "Anyone know what's happening at Washington Square Park today? Lots of music!",
+        'New coffee shop opened on 8th Ave! Great espresso and friendly staff ☕',
+        'Looking for a good photographer for headshots. Any recommendations?',
+        'Yoga class in Central Park tomorrow morning at 8 AM. All levels welcome! 🧘‍♀️',
+        'Best lunch spots near Times Square? Tired of tourist traps!',
+        'Art gallery opening this Friday in SoHo. Contemporary local artists featured.',
+        'Anyone interested in a weekend food tour of Chinatown?',
+    ]
+    posts = []
+    for i, content in enumerate(contents):
+        author = users[i]
+        posts.append({
+            'id': str(uuid.uuid5(DEMO_NAMESPACE, f'{author["email"]}/post/{i}')),
+            'user_id': author['id'], 'content': content,
+            'latitude': author['latitude'], 'longitude': author['longitude'],
+            'cell': cell_key(author['latitude'], author['longitude'], cell_deg),
+            'created_at': (now - timedelta(minutes=10 * i)).isoformat(),
+        })
+    return users, posts
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_batch(supabase, table, batch, returning=None):
+    """POST one batch, skipping ids that are already there.
+
+    With ``returning`` (a PostgREST select) -> the rows actually inserted, with those columns.
+    """
+    params = {'on_conflict': 'id'}
+    if returning:
+        params['select'] = returning
+    prefer = 'return=representation' if returning else 'return=minimal'
+    inserted = supabase.post(table, json=batch, params=params,
+                             headers={'Prefer': f'{prefer},resolution=ignore-duplicates'}, idempotent=True)
+    return inserted or []
+
+
+def bulk_insert(supabase, table, rows, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """Insert ``rows`` with one array-bodied POST per batch -> number of rows sent.
+
+    Rows carry their own ids and duplicates are ignored, so a batch whose
+    response was lost can safely be retried.
+    """
+    sent = 0
+    for batch in batched(rows, batch_size):
+        insert_batch(supabase, table, batch)
+        sent += len(batch)
+        if on_batch:
+            on_batch(table, sent)
+    return sent
+
+
+def backfill_heatmap(backend, batch_size=DEFAULT_BATCH_SIZE):
+    """Count every existing user and post into an empty ``heatmap_cells`` table -> cells written.
+
+    A one-off scan for rows loaded before the heatmap existed; after that every write keeps it current."""
+    from heatmap import post_points, user_points
+
+    counts = Counter()
+    for table, columns, points in (('users', 'id,latitude,longitude,user_type', user_points),
+                                   ('forum_posts', 'id,latitude,longitude', post_points)):
+        last_id = None
+        while True:
+            params = {'select': columns, 'order': 'id.asc', 'limit': batch_size}
+            if last_id is not None:
+                params['id'] = f'gt.{last_id}'
+            rows = backend.client.get(table, params)
+            counts.update(backend.heat_grid.tally(points(rows)))
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1]['id']
+    cells = backend.heat_grid.rows(counts)
+    backend.add_heat(cells)
+    return len(cells)
+
+
+def backfill_neighborhoods(backend, batch_size=DEFAULT_BATCH_SIZE):
+    """Set ``neighborhood_id`` on users and posts saved without one -> rows tagged.
+
+    One PATCH per neighborhood per page of rows, not one per row. Rows outside every
+    polygon stay null, so running it again only re-reads those."""
+    tagged = 0
+    for table in ('users', 'forum_posts'):
+        last_id = None
+        while True:
+            params = {'select': 'id,latitude,longitude', 'neighborhood_id': 'is.null', 'order': 'id.asc',
+                      'limit': batch_size}
+            if last_id is not None:
+                params['id'] = f'gt.{last_id}'
+            rows = backend.client.get(table, params)
+            ids = backend.neighborhoods.locate_many([(row['latitude'], row['longitude']) for row in rows])
+            by_neighborhood = {}
+            for row, neighborhood_id in zip(rows, ids):
+                if neighborhood_id is not None:
+                    by_neighborhood.setdefault(neighborhood_id, []).append(row['id'])
+            for neighborhood_id, row_ids in by_neighborhood.items():
+                backend.client.patch(table, params={'id': f'in.({",".join(row_ids)})'},
+                                     json={'neighborhood_id': neighborhood_id})
+                tagged += len(row_ids)
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1]['id']
+    return tagged
+
+
+def _progress(table, sent):
+    print(f'\r  {table}: {sent:,} rows', end='', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--demo', action='store_true', help='load the fixed README test accounts')
+    parser.add_argument('--users', type=int, default=0, help='synthetic users to generate')
+    parser.add_argument('--posts', type=int, default=0, help='synthetic forum posts to generate')
+    parser.add_argument('--business-ratio', type=float, default=0.15)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=42, help='random seed (same seed -> same dataset)')
+    parser.add_argument('--target', choices=('supabase', 'mock'), default='supabase')
+    parser.add_argument('--backfill-heatmap', action='store_true',
+                        help='fill an empty heatmap_cells table from the rows already in Supabase')
+    parser.add_argument('--backfill-neighborhoods', action='store_true',
+                        help='tag users and posts already in Supabase with their neighborhood')
+    args = parser.parse_args(argv)
+
+    # Imported here so `import seed` stays cheap and app.py can import this module
+    import app
+
+    if args.backfill_heatmap:
+        if not app.SUPABASE_CONFIGURED:
+            print('❌ SUPABASE_URL / SUPABASE_KEY are not set')
+            return 1
+        start = time.perf_counter()
+        cells = backfill_heatmap(app.supabase_backend, args.batch_size)
+        print(f'✅ Wrote {cells:,} heatmap cells in {time.perf_counter() - start:.1f}s')
+        return 0
+
+    if args.backfill_neighborhoods:
+        if not app.SUPABASE_CONFIGURED:
+            print('❌ SUPABASE_URL / SUPABASE_KEY are not set')
+            return 1
+        start = time.perf_counter()
+        tagged = backfill_neighborhoods(app.supabase_backend, args.batch_size)
+        print(f'✅ Tagged {tagged:,} rows with {len(app.neighborhoods):,} neighborhoods '
+              f'in {time.perf_counter() - start:.1f}s')
+        return 0
+
+    if args.demo:
+        users, posts = demo_dataset(app.hash_password('password123'), app.hash_password('business123'),
+                                    app.FORUM_CELL_DEG, seed=args.seed)
+    else:
+        users = list(generate_users(args.users, app.hash_password('password123'),
+                                    business_ratio=args.business_ratio, seed=args.seed))
+        posts = generate_posts(args.posts, users, app.FORUM_CELL_DEG, seed=args.seed) if users else []
+
+    start = time.perf_counter()
+    if args.target == 'mock':
+        counts = app.seed_mock_backend(users, posts)
+    else:
+        if not app.SUPABASE_CONFIGURED:
+            print('❌ SUPABASE_URL / SUPABASE_KEY are not set (use --target mock to seed in memory)')
+            return 1
+        # Through the backend, so the heatmap counters are filled in as well
+        counts = {
+            'users': app.supabase_backend.bulk_insert('users', users, args.batch_size, on_batch=_progress),
+            'forum_posts': app.supabase_backend.bulk_insert('forum_posts', posts, args.batch_size,
+                                                            on_batch=_progress),
+        }
+        print()
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f'✅ Seeded {counts["users"]:,} users and {counts["forum_posts"]:,} posts into {args.target} '
+          f'in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Single-flight: identical calls that overlap share one execution.
+
+The first caller for a key (the leader) runs the call. Callers that arrive
+while it is still running wait for it, and get the same result or the same
+exception. Nothing is kept once the call finishes, so unlike a cache this
+never serves anything older than the call the caller joined. Results are
+shared between callers, so treat them as read-only.
+"""
+import collections
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, max_wait=30.0):
+        """``max_wait``: how long a caller waits for someone else's call when it has no ``timeout`` of its own."""
+        self.max_wait = max_wait
+        self._calls = {}    # key -> _Call in flight
+        self._lock = threading.Lock()
+        self.leaders = collections.Counter()     # group -> calls that ran
+        self.collapsed = collections.Counter()   # group -> calls that joined one already running
+
+    def do(self, key, call, timeout=None, group=None):
+        """``call()``, or the result of the identical call already running for ``key``.
+
+        Waiting for someone else's call raises ``TimeoutError`` after ``timeout`` seconds
+        (``max_wait`` when None), so a caller never blocks forever on a stuck leader."""
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = _Call()
+                self.leaders[group] += 1
+            else:
+                self.collapsed[group] += 1
+        if leader:
+            try:
+                flight.result = call()
+                return flight.result
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                flight.done.set()
+        if not flight.done.wait(self.max_wait if timeout is None else timeout):
+            raise TimeoutError('gave up waiting for an identical call in flight')
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
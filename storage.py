@@ -0,0 +1,630 @@
+"""
+Pluggable storage backends.
+
+The app talks to one ``StorageBackend`` interface:
+
+- ``SupabaseBackend`` - the production store, over the PostgREST API.
+- ``MemoryBackend``  - an indexed in-process store for development, tests
+  and benchmarks: hash indexes on id/email/username, a spatial index on
+  lat/lng, a time-ordered post index per grid cell and per neighborhood,
+  a time-ordered review index per business, time-ordered messages per
+  conversation, conversation summaries ordered by last message per person
+  and heatmap counters per tile.
+  Lookups are O(1) and feed pages O(log n), so it behaves at realistic
+  scale with no network.
+
+Both count bulk-inserted users and posts into their heatmap cells, and tag
+rows without a ``neighborhood_id`` with the polygon they fall in (when given
+a ``NeighborhoodIndex``). So a seeded store has a heatmap and area labels
+without a scan.
+"""
+import bisect
+import heapq
+import threading
+from collections import Counter
+
+from chat import SUMMARY_FIELDS, apply_message, summary_id
+from geo_index import GeoGridIndex, cell_key
+from heatmap import HeatCounters, HexGrid, post_points, user_points
+from pagination import postgrest_before
+from review_stats import TOTAL_FIELDS, apply_review, totals_of
+from seed import DEFAULT_BATCH_SIZE, batched, insert_batch
+from supabase_client import SupabaseError
+
+POST_AUTHOR_FIELDS = ('username', 'user_type', 'business_name')
+REVIEWER_FIELDS = ('username',)
+REVIEW_SELECT = 'id,business_id,reviewer_id,rating,comment,created_at,updated_at,reviewer:users!reviewer_id(username)'
+HEAT_SELECT = 'id,zoom,layer,q,r,tile_x,tile_y,count'
+CHAT_SELECT = 'id,conversation,sender_id,receiver_id,message,created_at'
+CONVERSATION_SELECT = ','.join(SUMMARY_FIELDS) + ',other:users!other_id(username,user_type,business_name)'
+
+
+def _entry_key(entry):
+    # Post index entries are (created_at, str(id), row) - order on the first two
+    return entry[:2]
+
+
+# What the heatmap needs of an inserted row (see _heat_points)
+HEAT_POINT_COLUMNS = {'users': 'user_type,latitude,longitude', 'forum_posts': 'latitude,longitude'}
+
+
+def _heat_points(table, rows):
+    return user_points(rows) if table == 'users' else post_points(rows)
+
+
+def _tag_neighborhoods(neighborhoods, rows):
+    if neighborhoods is not None:
+        neighborhoods.tag(rows)
+    return rows
+
+
+class StorageBackend:
+    """Everything the app needs from a data store."""
+
+    name = 'base'
+
+    def ping(self):
+        """Raise if the store is unreachable."""
+
+    def get_user(self, field, value):
+        """The user whose ``field`` (id / email / username) equals ``value``, or None."""
+        raise NotImplementedError
+
+    def get_users(self, user_ids, columns=None):
+        """Users for a list of ids, in any order; ``columns`` is a hint to skip the rest."""
+        raise NotImplementedError
+
+    def get_users_in_box(self, user_type, south, west, north, east, columns=None):
+        """Users of one type with south <= latitude < north and west <= longitude < east."""
+        raise NotImplementedError
+
+    def create_user(self, row):
+        """Insert a users row and return it."""
+        raise NotImplementedError
+
+    def update_locations(self, positions, neighborhoods=None):
+        """Write a batch of {user_id: (latitude, longitude)} moves, and each user's new
+        ``neighborhood_id`` from ``neighborhoods`` {user_id: id} if given."""
+        raise NotImplementedError
+
+    def iter_user_locations(self):
+        """Yield (id, latitude, longitude, user_type, business_category) for every user."""
+        raise NotImplementedError
+
+    def iter_users(self, user_type, columns=None):
+        """Yield every user row of one type."""
+        raise NotImplementedError
+
+    def spatial_index(self):
+        """A live GeoGridIndex of user locations if the store keeps one, else None."""
+        return None
+
+    def has_users(self):
+        raise NotImplementedError
+
+    def create_post(self, row):
+        """Insert a forum_posts row and return it with its ``users`` author embed."""
+        raise NotImplementedError
+
+    def get_posts(self, cells=None, before=None, limit=10, neighborhood=None):
+        """Newest-first page of posts from ``cells`` (all posts if None) - or only the ones
+        tagged with ``neighborhood`` if given - older than the ``before`` (created_at, id)
+        position, with the ``users`` author embed."""
+        raise NotImplementedError
+
+    def submit_review(self, row):
+        """Insert a reviews row, or replace the reviewer's earlier review of that business
+        (keeping its id and created_at), and update the business's rating totals in the
+        same step -> (review, totals). The review has ``updated_at`` set if it replaced one."""
+        raise NotImplementedError
+
+    def get_reviews(self, business_id, before=None, limit=10):
+        """Newest-first page of a business's reviews older than the ``before``
+        (created_at, id) position, with the ``reviewer`` embed."""
+        raise NotImplementedError
+
+    def send_message(self, row):
+        """Insert a chats row and update both participants' conversation summaries in the
+        same step -> (message, {owner_id: summary}). See chat.py."""
+        raise NotImplementedError
+
+    def get_messages(self, conversation, before=None, limit=10):
+        """Newest-first page of a conversation's messages older than the ``before``
+        (created_at, id) position."""
+        raise NotImplementedError
+
+    def get_conversations(self, owner_id, before=None, limit=10):
+        """Page of someone's conversation summaries, latest message first, older than the
+        ``before`` (last_message_at, id) position, with the ``other`` person embed."""
+        raise NotImplementedError
+
+    def mark_read(self, owner_id, other_id):
+        """Zero the unread count of ``owner_id``'s summary of the conversation."""
+        raise NotImplementedError
+
+    def add_heat(self, rows):
+        """Add each row's ``delta`` to the ``count`` of its heatmap cell (see heatmap.py)."""
+        raise NotImplementedError
+
+    def get_heat(self, zoom, x0, y0, x1, y1):
+        """Heatmap cells with a positive count at grid ``zoom`` whose tile is in the range."""
+        raise NotImplementedError
+
+    def bulk_insert(self, table, rows):
+        """Insert many rows at once, skipping ids already present and adding the new users
+        and posts to the heatmap -> number of rows sent."""
+        raise NotImplementedError
+
+
+class SupabaseBackend(StorageBackend):
+    name = 'supabase'
+
+    def __init__(self, client, post_select, page_size=1000, heat_grid=None, neighborhoods=None):
+        self.client = client
+        self.post_select = post_select
+        self.page_size = page_size
+        self.heat_grid = heat_grid or HexGrid()
+        self.neighborhoods = neighborhoods
+        self.location_rpc = True
+        self.review_rpc = True
+        self.heat_rpc = True
+        self.chat_rpc = True
+
+    def ping(self):
+        self.client.ping(timeout=5)
+
+    def get_user(self, field, value):
+        return self.client.select_one('users', {field: f'eq.{value}'}, hedge=True)
+
+    def get_users(self, user_ids, columns=None):
+        if not user_ids:
+            return []
+        params = {'id': f'in.({",".join(user_ids)})'}
+        if columns:
+            params['select'] = ','.join(columns)
+        return self.client.get('users', params, hedge=True)
+
+    def get_users_in_box(self, user_type, south, west, north, east, columns=None):
+        select = ','.join(dict.fromkeys(('id',) + tuple(columns))) if columns else '*'
+        box = f'(latitude.gte.{south},latitude.lt.{north},longitude.gte.{west},longitude.lt.{east})'
+        rows, last_id = [], None
+        while True:
+            params = {'select': select, 'user_type': f'eq.{user_type}', 'and': box,
+                      'order': 'id.asc', 'limit': self.page_size}
+            if last_id is not None:
+                params['id'] = f'gt.{last_id}'
+            page = self.client.get('users', params)
+            rows += page
+            if len(page) < self.page_size:
+                return rows
+            last_id = page[-1]['id']
+
+    def create_user(self, row):
+        created = self.client.post('users', json=row)
+        return created[0] if created else row
+
+    def update_locations(self, positions, neighborhoods=None):
+        rows = [{'id': user_id, 'latitude': lat, 'longitude': lng} for user_id, (lat, lng) in positions.items()]
+        if neighborhoods is not None:
+            for row in rows:
+                row['neighborhood_id'] = neighborhoods.get(row['id'])
+        if self.location_rpc:
+            # One round trip for the whole batch (see update_user_locations in the README)
+            try:
+                self.client.post('rpc/update_user_locations', json={'locations': rows},
+                                 headers={'Prefer': 'return=minimal'}, idempotent=True)
+                return
+            except SupabaseError as e:
+                if e.status != 404:
+                    raise
+                print("⚠️  rpc/update_user_locations is not installed - updating locations one row at a time")
+                self.location_rpc = False
+        for row in rows:
+            self.client.patch('users', params={'id': f'eq.{row["id"]}'},
+                              json={key: value for key, value in row.items() if key != 'id'})
+
+    def iter_user_locations(self):
+        # Keyset paging on id - every page is an index range scan
+        last_id = None
+        while True:
+            params = {'select': 'id,latitude,longitude,user_type,business_category', 'order': 'id.asc',
+                      'limit': self.page_size}
+            if last_id is not None:
+                params['id'] = f'gt.{last_id}'
+            rows = self.client.get('users', params)
+            for row in rows:
+                yield row['id'], row['latitude'], row['longitude'], row['user_type'], row.get('business_category')
+            if len(rows) < self.page_size:
+                return
+            last_id = rows[-1]['id']
+
+    def iter_users(self, user_type, columns=None):
+        select = ','.join(dict.fromkeys(('id',) + tuple(columns))) if columns else '*'
+        last_id = None
+        while True:
+            params = {'select': select, 'user_type': f'eq.{user_type}', 'order': 'id.asc', 'limit': self.page_size}
+            if last_id is not None:
+                params['id'] = f'gt.{last_id}'
+            rows = self.client.get('users', params)
+            yield from rows
+            if len(rows) < self.page_size:
+                return
+            last_id = rows[-1]['id']
+
+    def has_users(self):
+        return bool(self.client.get('users', {'select': 'id', 'limit': 1}))
+
+    def create_post(self, row):
+        created = self.client.post('forum_posts', json=row, params={'select': self.post_select})
+        return created[0] if created else row
+
+    def get_posts(self, cells=None, before=None, limit=10, neighborhood=None):
+        params = {'select': self.post_select, 'order': 'created_at.desc,id.desc', 'limit': limit}
+        if neighborhood is not None:
+            params['neighborhood_id'] = f'eq.{neighborhood}'
+        elif cells is not None:
+            params['cell'] = f'in.({",".join(sorted(cells))})'
+        if before:
+            params['or'] = postgrest_before(before)
+        return self.client.get('forum_posts', params, hedge=True)
+
+    def submit_review(self, row):
+        if self.review_rpc:
+            # Review and totals in one transaction (see submit_review in the README)
+            try:
+                saved = self.client.post('rpc/submit_review', json={'review': row}, idempotent=True)
+                return saved['review'], saved['totals']
+            except SupabaseError as e:
+                if e.status != 404:
+                    raise
+                print("⚠️  rpc/submit_review is not installed - updating rating totals from the app")
+                self.review_rpc = False
+        # Not atomic: two reviews of one business landing together can lose an update
+        previous = self.client.select_one('reviews', {
+            'select': REVIEW_SELECT, 'business_id': f'eq.{row["business_id"]}', 'reviewer_id': f'eq.{row["reviewer_id"]}'})
+        business = self.client.select_one('users', {'select': ','.join(TOTAL_FIELDS), 'id': f'eq.{row["business_id"]}'})
+        if previous is None:
+            created = self.client.post('reviews', json=row, params={'select': REVIEW_SELECT},
+                                       headers={'Prefer': 'return=representation'})
+            review = created[0] if created else row
+        else:
+            changes = {'rating': row['rating'], 'comment': row['comment'], 'updated_at': row['created_at']}
+            self.client.patch('reviews', params={'id': f'eq.{previous["id"]}'}, json=changes)
+            review = {**previous, **changes}
+        totals = apply_review(totals_of(business or {}), row['rating'], previous and previous['rating'])
+        self.client.patch('users', params={'id': f'eq.{row["business_id"]}'}, json=totals)
+        return review, totals
+
+    def get_reviews(self, business_id, before=None, limit=10):
+        params = {'select': REVIEW_SELECT, 'business_id': f'eq.{business_id}',
+                  'order': 'created_at.desc,id.desc', 'limit': limit}
+        if before:
+            params['or'] = postgrest_before(before)
+        return self.client.get('reviews', params, hedge=True)
+
+    def send_message(self, row):
+        if self.chat_rpc:
+            # Message and both summaries in one transaction (see send_message in the README)
+            try:
+                saved = self.client.post('rpc/send_message', json={'message': row}, idempotent=True)
+                return saved['message'], saved['conversations']
+            except SupabaseError as e:
+                if e.status != 404:
+                    raise
+                print("⚠️  rpc/send_message is not installed - updating conversation summaries from the app")
+                self.chat_rpc = False
+        # Not atomic: two messages in one conversation landing together can lose a count
+        created = self.client.post('chats', json=row, params={'select': CHAT_SELECT})
+        message = created[0] if created else row
+        owners = (row['sender_id'], row['receiver_id'])
+        ids = ','.join(f'"{summary_id(owner, other)}"' for owner, other in (owners, owners[::-1]))
+        current = {summary['owner_id']: summary for summary in self.client.get(
+            'conversations', {'select': ','.join(SUMMARY_FIELDS), 'id': f'in.({ids})'})}
+        summaries = {owner: apply_message(current.get(owner), message, owner) for owner in owners}
+        self.client.post('conversations', json=list(summaries.values()), params={'on_conflict': 'id'},
+                         headers={'Prefer': 'return=minimal,resolution=merge-duplicates'})
+        return message, summaries
+
+    def get_messages(self, conversation, before=None, limit=10):
+        params = {'select': CHAT_SELECT, 'conversation': f'eq.{conversation}',
+                  'order': 'created_at.desc,id.desc', 'limit': limit}
+        if before:
+            params['or'] = postgrest_before(before)
+        return self.client.get('chats', params, hedge=True)
+
+    def get_conversations(self, owner_id, before=None, limit=10):
+        params = {'select': CONVERSATION_SELECT, 'owner_id': f'eq.{owner_id}',
+                  'order': 'last_message_at.desc,id.desc', 'limit': limit}
+        if before:
+            params['or'] = postgrest_before(before, 'last_message_at', id_parts=2)
+        return self.client.get('conversations', params, hedge=True)
+
+    def mark_read(self, owner_id, other_id):
+        self.client.patch('conversations', params={'id': f'eq.{summary_id(owner_id, other_id)}',
+                                                   'unread_count': 'gt.0'}, json={'unread_count': 0})
+
+    def add_heat(self, rows):
+        for batch in batched(rows, self.page_size):
+            if self.heat_rpc:
+                # Increments in one statement (see add_heat in the README). Not idempotent: never retried
+                try:
+                    self.client.post('rpc/add_heat', json={'cells': batch}, headers={'Prefer': 'return=minimal'})
+                    continue
+                except SupabaseError as e:
+                    if e.status != 404:
+                        raise
+                    print("⚠️  rpc/add_heat is not installed - updating heatmap counters from the app")
+                    self.heat_rpc = False
+            # Not atomic: two workers bumping one cell together can lose an update
+            ids = ','.join(f'"{row["id"]}"' for row in batch)
+            counts = {cell['id']: cell['count'] for cell in self.client.get(
+                'heatmap_cells', {'select': 'id,count', 'id': f'in.({ids})'})}
+            cells = [{**{key: value for key, value in row.items() if key != 'delta'},
+                      'count': counts.get(row['id'], 0) + row['delta']} for row in batch]
+            self.client.post('heatmap_cells', json=cells, params={'on_conflict': 'id'},
+                             headers={'Prefer': 'return=minimal,resolution=merge-duplicates'})
+
+    def get_heat(self, zoom, x0, y0, x1, y1):
+        tiles = f'(tile_x.gte.{x0},tile_x.lte.{x1},tile_y.gte.{y0},tile_y.lte.{y1})'
+        rows, last_id = [], None
+        while True:
+            params = {'select': HEAT_SELECT, 'zoom': f'eq.{zoom}', 'and': tiles, 'count': 'gt.0',
+                      'order': 'id.asc', 'limit': self.page_size}
+            if last_id is not None:
+                params['id'] = f'gt.{last_id}'
+            page = self.client.get('heatmap_cells', params, hedge=True)
+            rows += page
+            if len(page) < self.page_size:
+                return rows
+            last_id = page[-1]['id']
+
+    def bulk_insert(self, table, rows, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+        # Counted per batch as they stream past, so millions of generated rows are never all in memory.
+        # Only the rows the insert hands back are counted: ids already present are skipped by it
+        counts, sent = Counter(), 0
+        for batch in batched(rows, batch_size):
+            inserted = insert_batch(self.client, table, _tag_neighborhoods(self.neighborhoods, batch),
+                                    returning=HEAT_POINT_COLUMNS[table])
+            sent += len(batch)
+            counts.update(self.heat_grid.tally(_heat_points(table, inserted)))
+            if on_batch:
+                on_batch(table, sent)
+        self.add_heat(self.heat_grid.rows(counts))
+        return sent
+
+
+class MemoryBackend(StorageBackend):
+    name = 'memory'
+
+    def __init__(self, post_cell_deg, index_factory=GeoGridIndex, heat_grid=None, neighborhoods=None):
+        self.post_cell_deg = post_cell_deg
+        self.heat_grid = heat_grid or HexGrid()
+        self.neighborhoods = neighborhoods
+        self._heat = HeatCounters()
+        self._users = {}                                    # id -> row
+        self._user_keys = {'email': {}, 'username': {}}     # value -> id
+        self._geo = index_factory()
+        self._posts = []                                    # sorted [(created_at, id, row)]
+        self._post_ids = set()
+        self._posts_by_cell = {}                            # cell -> sorted [(created_at, id, row)]
+        self._posts_by_neighborhood = {}                    # neighborhood_id -> sorted [(created_at, id, row)]
+        self._reviews = {}                                  # (business_id, reviewer_id) -> row
+        self._reviews_by_business = {}                      # business_id -> sorted [(created_at, id, row)]
+        self._chats = {}                                    # conversation -> sorted [(created_at, id, row)]
+        self._conversations = {}                            # summary id -> row
+        self._conversations_by_owner = {}                   # owner_id -> sorted [(last_message_at, id, row)]
+        self._lock = threading.RLock()
+
+    # Users
+    def get_user(self, field, value):
+        if field == 'id':
+            return self._users.get(value)
+        user_id = self._user_keys[field].get(value)
+        return self._users.get(user_id) if user_id is not None else None
+
+    def get_users(self, user_ids, columns=None):
+        return [self._users[user_id] for user_id in user_ids if user_id in self._users]
+
+    def get_users_in_box(self, user_type, south, west, north, east, columns=None):
+        rows = self.get_users(self._geo.within_bbox(user_type, south, west, north, east))
+        return [row for row in rows if row['latitude'] < north and row['longitude'] < east]
+
+    def create_user(self, row):
+        with self._lock:
+            self._put_user(row)
+        return row
+
+    def _put_user(self, row):
+        old = self._users.get(row['id'])
+        if old is not None:
+            for field, keys in self._user_keys.items():
+                keys.pop(old.get(field), None)
+        self._users[row['id']] = row
+        for field, keys in self._user_keys.items():
+            if row.get(field) is not None:
+                keys[row[field]] = row['id']
+        self._geo.upsert(row['id'], row.get('latitude'), row.get('longitude'), row['user_type'])
+
+    def update_locations(self, positions, neighborhoods=None):
+        with self._lock:
+            for user_id, (lat, lng) in positions.items():
+                row = self._users.get(user_id)
+                if row is not None:
+                    # A new row, not an in-place edit - cached copies of the old one stay consistent
+                    row = {**row, 'latitude': lat, 'longitude': lng}
+                    if neighborhoods is not None:
+                        row['neighborhood_id'] = neighborhoods.get(user_id)
+                    self._put_user(row)
+
+    def iter_user_locations(self):
+        for row in list(self._users.values()):
+            yield row['id'], row.get('latitude'), row.get('longitude'), row['user_type'], row.get('business_category')
+
+    def iter_users(self, user_type, columns=None):
+        for row in list(self._users.values()):
+            if row['user_type'] == user_type:
+                yield row
+
+    def spatial_index(self):
+        return self._geo
+
+    def has_users(self):
+        return bool(self._users)
+
+    # Posts
+    def _post_cell(self, row):
+        if row.get('cell'):
+            return row['cell']
+        if row.get('latitude') is None or row.get('longitude') is None:
+            return None
+        return cell_key(float(row['latitude']), float(row['longitude']), self.post_cell_deg)
+
+    def _with_author(self, row):
+        author = self._users.get(row.get('user_id')) or {}
+        return {**row, 'cell': self._post_cell(row),
+                'users': {field: author.get(field) for field in POST_AUTHOR_FIELDS}}
+
+    def create_post(self, row):
+        row = self._with_author(row)
+        entry = (row['created_at'], str(row['id']), row)
+        with self._lock:
+            self._post_ids.add(row['id'])
+            bisect.insort(self._posts, entry, key=_entry_key)
+            if row['cell'] is not None:
+                bisect.insort(self._posts_by_cell.setdefault(row['cell'], []), entry, key=_entry_key)
+            if row.get('neighborhood_id') is not None:
+                bisect.insort(self._posts_by_neighborhood.setdefault(row['neighborhood_id'], []), entry,
+                              key=_entry_key)
+        return row
+
+    def get_posts(self, cells=None, before=None, limit=10, neighborhood=None):
+        with self._lock:
+            if neighborhood is not None:
+                lists = [self._posts_by_neighborhood.get(neighborhood, [])]
+            else:
+                lists = [self._posts] if cells is None else [self._posts_by_cell[c] for c in cells
+                                                             if c in self._posts_by_cell]
+            # Each list only needs its newest `limit` entries older than the cursor
+            tails = []
+            for entries in lists:
+                end = len(entries)
+                if before:
+                    end = bisect.bisect_left(entries, (before[0], str(before[1])), key=_entry_key)
+                tails.append(entries[max(0, end - limit):end][::-1])
+        newest_first = heapq.merge(*tails, key=_entry_key, reverse=True)
+        return [entry[2] for entry, _ in zip(newest_first, range(limit))]
+
+    # Reviews
+    def submit_review(self, row):
+        key = (row['business_id'], row['reviewer_id'])
+        with self._lock:
+            entries = self._reviews_by_business.setdefault(row['business_id'], [])
+            previous = self._reviews.get(key)
+            if previous is None:
+                reviewer = self._users.get(row['reviewer_id']) or {}
+                review = {**row, 'updated_at': None,
+                          'reviewer': {field: reviewer.get(field) for field in REVIEWER_FIELDS}}
+                bisect.insort(entries, (review['created_at'], str(review['id']), review), key=_entry_key)
+            else:
+                review = {**previous, 'rating': row['rating'], 'comment': row['comment'], 'updated_at': row['created_at']}
+                position = bisect.bisect_left(entries, (previous['created_at'], str(previous['id'])), key=_entry_key)
+                entries[position] = (previous['created_at'], str(previous['id']), review)
+            self._reviews[key] = review
+            business = self._users[row['business_id']]
+            totals = apply_review(totals_of(business), row['rating'], previous and previous['rating'])
+            self._put_user({**business, **totals})
+        return review, totals
+
+    def get_reviews(self, business_id, before=None, limit=10):
+        with self._lock:
+            entries = self._reviews_by_business.get(business_id, [])
+            end = len(entries)
+            if before:
+                end = bisect.bisect_left(entries, (before[0], str(before[1])), key=_entry_key)
+            return [entry[2] for entry in entries[max(0, end - limit):end][::-1]]
+
+    # Chats
+    def _put_conversation(self, summary):
+        entries = self._conversations_by_owner.setdefault(summary['owner_id'], [])
+        old = self._conversations.get(summary['id'])
+        if old is not None:
+            del entries[bisect.bisect_left(entries, (old['last_message_at'], old['id']), key=_entry_key)]
+        self._conversations[summary['id']] = summary
+        bisect.insort(entries, (summary['last_message_at'], summary['id'], summary), key=_entry_key)
+
+    def send_message(self, row):
+        owners = (row['sender_id'], row['receiver_id'])
+        with self._lock:
+            bisect.insort(self._chats.setdefault(row['conversation'], []),
+                          (row['created_at'], str(row['id']), row), key=_entry_key)
+            summaries = {}
+            for owner, other in (owners, owners[::-1]):
+                summaries[owner] = apply_message(self._conversations.get(summary_id(owner, other)), row, owner)
+                self._put_conversation(summaries[owner])
+        return row, summaries
+
+    def get_messages(self, conversation, before=None, limit=10):
+        with self._lock:
+            entries = self._chats.get(conversation, [])
+            end = len(entries)
+            if before:
+                end = bisect.bisect_left(entries, (before[0], str(before[1])), key=_entry_key)
+            return [entry[2] for entry in entries[max(0, end - limit):end][::-1]]
+
+    def get_conversations(self, owner_id, before=None, limit=10):
+        with self._lock:
+            entries = self._conversations_by_owner.get(owner_id, [])
+            end = len(entries)
+            if before:
+                end = bisect.bisect_left(entries, (before[0], str(before[1])), key=_entry_key)
+            page = [entry[2] for entry in entries[max(0, end - limit):end][::-1]]
+        return [{**summary, 'other': {field: (self._users.get(summary['other_id']) or {}).get(field)
+                                      for field in POST_AUTHOR_FIELDS}} for summary in page]
+
+    def mark_read(self, owner_id, other_id):
+        with self._lock:
+            summary = self._conversations.get(summary_id(owner_id, other_id))
+            if summary and summary['unread_count']:
+                self._put_conversation({**summary, 'unread_count': 0})
+
+    # Heatmap
+    def add_heat(self, rows):
+        self._heat.add(rows)
+
+    def get_heat(self, zoom, x0, y0, x1, y1):
+        return self._heat.in_tiles(zoom, x0, y0, x1, y1)
+
+    def bulk_insert(self, table, rows):
+        rows = _tag_neighborhoods(self.neighborhoods, rows if isinstance(rows, list) else list(rows))
+        inserted = []
+        with self._lock:
+            if table == 'users':
+                for row in rows:
+                    if row['id'] not in self._users:
+                        self._put_user(row)
+                        inserted.append(row)
+            elif table == 'forum_posts':
+                touched = set()
+                for row in rows:
+                    if row['id'] in self._post_ids:
+                        continue
+                    inserted.append(row)
+                    self._post_ids.add(row['id'])
+                    row = self._with_author(row)
+                    entry = (row['created_at'], str(row['id']), row)
+                    self._posts.append(entry)
+                    if row['cell'] is not None:
+                        self._posts_by_cell.setdefault(row['cell'], []).append(entry)
+                        touched.add(('cell', row['cell']))
+                    if row.get('neighborhood_id') is not None:
+                        self._posts_by_neighborhood.setdefault(row['neighborhood_id'], []).append(entry)
+                        touched.add(('neighborhood', row['neighborhood_id']))
+                # One sort per list instead of an insort per row
+                self._posts.sort(key=_entry_key)
+                for kind, key in touched:
+                    index = self._posts_by_cell if kind == 'cell' else self._posts_by_neighborhood
+                    index[key].sort(key=_entry_key)
+            else:
+                raise ValueError(f'unknown table {table}')
+        self.add_heat(self.heat_grid.rows(self.heat_grid.tally(_heat_points(table, inserted))))
+        return len(rows)
@@ -0,0 +1,257 @@
+"""
+Pooled Supabase REST client.
+
+One ``requests.Session`` per process, so connections (TCP + TLS) are kept
+alive and reused instead of re-handshaking on every query. Every call has
+connect/read timeouts, and idempotent reads retry with jittered
+exponential backoff.
+
+Optional hooks (see resilience.py): ``deadline()`` returns the seconds the
+current request has left, and every timeout and backoff is capped to it. A
+``breaker`` makes calls fail fast while the backend is down. Reads sent
+with ``hedge=True`` get a second, parallel attempt once the first is slower
+than the recent p95. Whichever answers first wins.
+
+GETs are single-flight: identical reads (same path, same params) that overlap
+share one round trip, so a burst of page loads doesn't turn into a burst of
+identical queries.
+"""
+import collections
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from single_flight import SingleFlight
+
+# Worth retrying: the request never reached PostgREST, or it was shed under load
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+
+class SupabaseError(Exception):
+    """A Supabase REST call failed (after any retries)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class DeadlineExceeded(SupabaseError):
+    """The request ran out of time before (or while) calling Supabase."""
+
+
+class CircuitOpenError(SupabaseError):
+    """The circuit breaker is open - Supabase was not called."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SupabaseClient:
+    def __init__(self, url, key, pool_size=10, keep_alive=True, connect_timeout=3.05,
+                 read_timeout=10.0, max_retries=2, backoff_base=0.1, backoff_max=2.0, on_request=None,
+                 deadline=None, breaker=None, hedge_reads=True, hedge_ratio=0.05, hedge_min_delay=0.01,
+                 single_flight=True):
+        """``on_request(method, path, seconds, status)`` is called after every HTTP attempt
+        (status is None when no response came back) - the hook for metrics.
+        At most ``hedge_ratio`` of hedgeable reads get a second attempt."""
+        self.url = url.rstrip('/')
+        self.rest_url = f'{self.url}/rest/v1'
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_request = on_request
+        self.deadline = deadline
+        self.breaker = breaker
+        self.hedge_reads = hedge_reads
+        self.hedge_ratio = hedge_ratio
+        self.hedge_min_delay = hedge_min_delay
+        self._read_latencies = collections.deque(maxlen=200)  # recent successful GETs, seconds
+        self._hedge_pool = ThreadPoolExecutor(max_workers=4 * pool_size, thread_name_prefix='supabase-hedge')
+        self.hedgeable_reads = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._hedge_lock = threading.Lock()     # the counters above are bumped from many threads
+        # A joined call waits no longer than the leader's own worst case: every attempt timing out
+        max_wait = (connect_timeout + read_timeout) * (max_retries + 1) + backoff_max * max_retries
+        self.single_flight = SingleFlight(max_wait) if single_flight else None
+
+        self.session = requests.Session()
+        # Retries are handled here (reads only), not by urllib3 for every verb
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'apikey': key,
+            'Authorization': f'Bearer {key}',
+            'Content-Type': 'application/json',
+            'Prefer': 'return=representation',
+            'Connection': 'keep-alive' if keep_alive else 'close',
+        })
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries out so clients don't stampede in sync
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _remaining(self):
+        return self.deadline() if self.deadline is not None else None
+
+    def _send(self, method, path, params=None, json=None, headers=None, timeout=None):
+        timeout = timeout or self.timeout
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        left = self._remaining()
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded(f'{method} {path} skipped: request deadline exceeded')
+            connect_timeout, read_timeout = min(connect_timeout, left), min(read_timeout, left)
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError(f'{method} {path} skipped: Supabase circuit is open', self.breaker.retry_after())
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self.session.request(
+                method, f'{self.rest_url}/{path}', params=params, json=json,
+                headers=headers, timeout=(connect_timeout, read_timeout)
+            )
+        except requests.RequestException as e:
+            raise SupabaseError(f'{method} {path} failed: {e}') from e
+        finally:
+            seconds = time.perf_counter() - start
+            status = response.status_code if response is not None else None
+            if self.on_request is not None:
+                self.on_request(method, path, seconds, status)
+            if self.breaker is not None:
+                # Client errors (bad filter, conflict) say nothing about the backend's health
+                self.breaker.record(status is None or status >= 500 or status == 429)
+            if method == 'GET' and status is not None and status < 400:
+                self._read_latencies.append(seconds)
+        if response.status_code >= 400:
+            raise SupabaseError(f'{method} {path} returned {response.status_code}: {response.text[:200]}',
+                                status=response.status_code)
+        return response.json() if response.content else None
+
+    def _send_with_retries(self, method, path, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return self._send(method, path, **kwargs)
+            except (DeadlineExceeded, CircuitOpenError):
+                raise
+            except SupabaseError as e:
+                retryable = e.status is None or e.status in RETRYABLE_STATUSES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                backoff = self._backoff(attempt)
+                left = self._remaining()
+                if left is not None and backoff >= left:
+                    raise  # no time left for another attempt
+            time.sleep(backoff)
+            attempt += 1
+
+    def hedge_delay(self):
+        """When to send the second attempt of a hedged read: the recent p95 GET latency."""
+        latencies = sorted(self._read_latencies)
+        if len(latencies) < 20:
+            return None  # not enough data to know what "slow" is yet
+        return max(self.hedge_min_delay, latencies[int(len(latencies) * 0.95) - 1])
+
+    def _hedged(self, method, path, delay, **kwargs):
+        # Attempts run on the hedge pool in a copy of this context (deadline, request timings)
+        attempt = lambda: self._hedge_pool.submit(contextvars.copy_context().run, self._send_with_retries,
+                                                  method, path, **kwargs)
+        primary = attempt()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            with self._hedge_lock:
+                self.hedges -= 1    # no second attempt after all - give the budget back
+            return primary.result()
+        backup = attempt()
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self._hedge_lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def get(self, path, params=None, timeout=None, hedge=False):
+        """GET /rest/v1/<path> and return the decoded JSON, retrying transient failures.
+
+        ``hedge=True`` (idempotent, latency-sensitive reads) may send a second attempt
+        in parallel when the first is slower than usual. The rows returned may be shared
+        with concurrent identical calls - don't modify them."""
+        if self.single_flight is None:
+            return self._get(path, params, timeout, hedge)
+        key = (path, tuple(sorted((name, str(value)) for name, value in (params or {}).items())))
+        try:
+            return self.single_flight.do(key, lambda: self._get(path, params, timeout, hedge),
+                                         timeout=self._remaining(), group=path)
+        except TimeoutError:
+            raise DeadlineExceeded(f'GET {path} timed out waiting for an identical query in flight')
+
+    def _get(self, path, params, timeout, hedge):
+        if hedge and self.hedge_reads:
+            delay = self.hedge_delay()
+            closed = self.breaker is None or self.breaker.state == 'closed'
+            with self._hedge_lock:
+                self.hedgeable_reads += 1
+                # Counted when budgeted, so concurrent reads can't all spend the same hedge
+                hedging = delay is not None and closed and self.hedges < self.hedge_ratio * self.hedgeable_reads
+                if hedging:
+                    self.hedges += 1
+            if hedging:
+                return self._hedged('GET', path, delay, params=params, timeout=timeout)
+        return self._send_with_retries('GET', path, params=params, timeout=timeout)
+
+    def select_one(self, path, params=None, timeout=None, hedge=False):
+        rows = self.get(path, params=params, timeout=timeout, hedge=hedge)
+        return rows[0] if rows else None
+
+    def post(self, path, json=None, params=None, headers=None, timeout=None, idempotent=False):
+        """POST (insert). Only retried when the caller vouches it is ``idempotent``
+        (e.g. rows with their own ids and ``resolution=ignore-duplicates``)."""
+        send = self._send_with_retries if idempotent else self._send
+        return send('POST', path, params=params, json=json, headers=headers, timeout=timeout)
+
+    def patch(self, path, params=None, json=None, timeout=None):
+        return self._send('PATCH', path, params=params, json=json, timeout=timeout)
+
+    def ping(self, timeout=5):
+        """Cheap reachability check against the REST root (body is not parsed)."""
+        try:
+            response = self.session.get(f'{self.rest_url}/', timeout=timeout)
+        except requests.RequestException as e:
+            raise SupabaseError(f'ping failed: {e}') from e
+        if response.status_code >= 500:
+            raise SupabaseError(f'ping returned {response.status_code}', status=response.status_code)
+        return True
+
+    def stats(self):
+        return {
+            'hedgeable_reads': self.hedgeable_reads,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_delay_ms': round((self.hedge_delay() or 0) * 1000, 1),
+        }
+
+    def single_flight_stats(self):
+        """{table: (queries sent, identical queries that shared one)}"""
+        if self.single_flight is None:
+            return {}
+        flights = self.single_flight
+        return {path: (flights.leaders[path], flights.collapsed[path])
+                for path in set(flights.leaders) | set(flights.collapsed)}
+
+    def close(self):
+        self.session.close()
+        self._hedge_pool.shutdown(wait=False)
@@ -0,0 +1,142 @@
+"""
+Stale-while-revalidate cache.
+
+Entries are fresh for ``fresh_for`` seconds and are then served stale, right
+away, while a background worker reloads them. An entry older than
+``max_stale`` is normally not served: the caller waits for a reload. So a
+hot key costs nothing on the request path, and entries are at most
+``max_stale`` seconds old. The one exception: if that reload fails, the
+expired entry is served anyway ("stale-if-error"). An outage then
+degrades to old data instead of errors.
+
+``load_many(keys)`` loads several keys in one go (e.g. one query for a
+block of map cells) and must return a value for every key it was given.
+The cache is an LRU bounded to ``max_entries`` keys. ``invalidate`` drops
+keys after a write. A reload that was already running when its key was
+invalidated is thrown away, so it can't put the old data back.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StaleWhileRevalidateCache:
+    def __init__(self, load_many, fresh_for=60.0, max_stale=600.0, max_entries=2000, workers=2, name='swr-refresh'):
+        self.load_many = load_many
+        self.fresh_for = fresh_for
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (loaded_at, value), least recently used first
+        self._epochs = {}               # key -> invalidation count, to spot reloads that raced a write
+        self._generation = 0            # bumped by clear()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.stale_if_error = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        return self.get_many([key])[key]
+
+    def get_many(self, keys):
+        """{key: value} for every key - loading missing or too-old keys in one ``load_many`` call."""
+        now = time.monotonic()
+        found, stale, missing = {}, [], []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                age = now - entry[0] if entry is not None else None
+                if entry is None or age > self.max_stale:
+                    missing.append(key)
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+                if age > self.fresh_for:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        stale.append(key)
+                else:
+                    self.hits += 1
+            epochs = {key: self._epoch(key) for key in missing + stale}
+        if stale:
+            self._pool.submit(self._refresh, stale, epochs)
+        if missing:
+            try:
+                loaded = self.load_many(missing)
+            except Exception:
+                with self._lock:
+                    expired = {key: self._entries[key][1] for key in missing if key in self._entries}
+                if len(expired) < len(missing):
+                    raise
+                self.stale_if_error += len(expired)
+                found.update(expired)
+                return found
+            self._store(loaded, epochs)
+            found.update(loaded)
+        return found
+
+    def _refresh(self, keys, epochs):
+        try:
+            self._store(self.load_many(keys), epochs)
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_failures += 1
+            print(f"⚠️  Background cache refresh failed, serving stale entries: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keys)
+
+    def _store(self, loaded, epochs):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in loaded.items():
+                if self._epoch(key) != epochs.get(key):
+                    continue    # invalidated while loading
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _epoch(self, key):
+        return self._generation, self._epochs.get(key, 0)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._epochs[key] = self._epochs.get(key, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._epochs.clear()
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            'refreshes': self.refreshes,
+            'refresh_failures': self.refresh_failures,
+            'stale_if_error': self.stale_if_error,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
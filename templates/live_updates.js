@@ -0,0 +1,65 @@
+        // Live deltas from /api/live (Server-Sent Events), falling back to long-polling /api/live/poll.
+        // onEvent gets {id, type, data}; type 'resync' means "refetch once, you may have missed something".
+        function subscribeLive(query, onEvent) {
+            var stopped = false;
+            var source = null;
+            var pollSubscription = null;
+
+            function poll() {
+                if (stopped) {
+                    return;
+                }
+                var url = '/api/live/poll?' + query + (pollSubscription ? '&sub=' + pollSubscription : '');
+                fetch(url, {cache: 'no-store'})
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error('HTTP ' + response.status);
+                        }
+                        return response.json();
+                    })
+                    .then(data => {
+                        pollSubscription = data.subscription;
+                        data.events.forEach(onEvent);
+                        poll();
+                    })
+                    .catch(() => setTimeout(poll, 5000));
+            }
+
+            if (window.EventSource) {
+                var failures = 0;
+                var dropped = false;
+                source = new EventSource('/api/live?' + query);
+                ['person', 'business', 'post', 'resync'].forEach(function(type) {
+                    source.addEventListener(type, function(event) {
+                        onEvent({id: event.lastEventId, type: type, data: JSON.parse(event.data)});
+                    });
+                });
+                source.onopen = function() {
+                    failures = 0;
+                    if (dropped) {
+                        // Reconnected: anything published while we were away is gone
+                        dropped = false;
+                        onEvent({id: null, type: 'resync', data: {}});
+                    }
+                };
+                source.onerror = function() {
+                    dropped = true;
+                    if (++failures >= 3) {
+                        source.close();
+                        source = null;
+                        poll();
+                    }
+                };
+            } else {
+                poll();
+            }
+
+            return {
+                close: function() {
+                    stopped = true;
+                    if (source) {
+                        source.close();
+                    }
+                }
+            };
+        }
@@ -0,0 +1,59 @@
+"""
+The app under test runs against a local PostgREST stand-in
+(benchmarks/fake_postgrest.py) loaded with the demo accounts, so the
+Supabase code paths are exercised through the Flask test client, offline.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fake_postgrest import FakePostgREST, seed_fixtures  # noqa: E402
+
+# The app reads its configuration at import, so the server has to be up first
+postgrest = FakePostgREST().start()
+seed_fixtures(postgrest, users=200, posts=300)
+os.environ.update({
+    'SUPABASE_URL': postgrest.url,
+    'SUPABASE_KEY': 'local',
+    'GEO_SNAPSHOT_PATH': os.path.join(tempfile.mkdtemp(prefix='pinggov-tests-'), 'geo.snapshot'),
+    'LOCATION_FLUSH_SECONDS': '0',
+})
+
+import app as pinggov  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def server():
+    return postgrest
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    deadline = time.monotonic() + 10
+    while not pinggov.supabase_health.is_up():
+        assert time.monotonic() < deadline, 'the app never connected to the fake PostgREST'
+        time.sleep(0.1)
+    return pinggov
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def user_by_email(server, email):
+    return next(row for row in server.tables['users'].rows.values() if row['email'] == email)
+
+
+def login(client, server, email, password='password123'):
+    """Log ``client`` in as the account with ``email`` -> its users row."""
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302, response.get_data(as_text=True)[:200]
+    return user_by_email(server, email)
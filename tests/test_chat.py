@@ -0,0 +1,57 @@
+from conftest import login, user_by_email
+
+
+def summary_with(client, other_id):
+    conversations = client.get('/api/conversations').get_json()['conversations']
+    return next(c for c in conversations if c['other_id'] == other_id)
+
+
+def test_conversation_summaries(client, server):
+    lisa, david = user_by_email(server, 'lisa@example.com'), user_by_email(server, 'david@example.com')
+    login(client, server, 'lisa@example.com')
+    for i in range(3):
+        response = client.post(f'/api/conversations/{david["id"]}', json={'message': f'hello {i}'})
+        assert response.status_code == 201
+        assert response.get_json()['conversation']['message_count'] == i + 1
+
+    sent = summary_with(client, david['id'])
+    assert (sent['last_message'], sent['message_count'], sent['unread_count']) == ('hello 2', 3, 0)
+    assert sent['other']['username'] == 'david_tribeca'
+
+    login(client, server, 'david@example.com')
+    received = summary_with(client, lisa['id'])
+    assert (received['last_message'], received['message_count'], received['unread_count']) == ('hello 2', 3, 3)
+    assert received['other']['username'] == 'lisa_village'
+
+    # Reading the history doesn't mark it read; the explicit POST does
+    history = client.get(f'/api/conversations/{lisa["id"]}').get_json()
+    assert [m['message'] for m in history['messages']] == ['hello 2', 'hello 1', 'hello 0']
+    assert summary_with(client, lisa['id'])['unread_count'] == 3
+    assert client.post(f'/api/conversations/{lisa["id"]}/read').status_code == 200
+    assert summary_with(client, lisa['id'])['unread_count'] == 0
+
+    client.post(f'/api/conversations/{lisa["id"]}', json={'message': 'hi back'})
+    login(client, server, 'lisa@example.com')
+    latest = client.get('/api/conversations').get_json()['conversations'][0]
+    assert (latest['other_id'], latest['last_message'], latest['message_count'], latest['unread_count']) == \
+        (david['id'], 'hi back', 4, 1)
+
+
+def test_message_history_pages(client, server):
+    emma = user_by_email(server, 'emma@example.com')
+    login(client, server, 'mike@example.com')
+    for i in range(5):
+        client.post(f'/api/conversations/{emma["id"]}', json={'message': f'm{i}'})
+    first = client.get(f'/api/conversations/{emma["id"]}?limit=2').get_json()
+    second = client.get(f'/api/conversations/{emma["id"]}?limit=2&cursor={first["next_cursor"]}').get_json()
+    third = client.get(f'/api/conversations/{emma["id"]}?limit=2&cursor={second["next_cursor"]}').get_json()
+    assert [m['message'] for page in (first, second, third) for m in page['messages']] == ['m4', 'm3', 'm2', 'm1', 'm0']
+    assert third['next_cursor'] is None
+
+
+def test_invalid_messages(client, server):
+    john = login(client, server, 'john@example.com')
+    sarah = user_by_email(server, 'sarah@example.com')
+    assert client.post(f'/api/conversations/{sarah["id"]}', json={'message': ''}).status_code == 400
+    assert client.post(f'/api/conversations/{sarah["id"]}', json={'message': 'x' * 2001}).status_code == 400
+    assert client.post(f'/api/conversations/{john["id"]}', json={'message': 'hi me'}).status_code == 400
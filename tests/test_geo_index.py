@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from geo_distance import haversine_km
+from geo_index import GeoGridIndex
+
+CENTER = (40.7580, -73.9855)
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = random.Random(7)
+    return {str(i): (CENTER[0] + rng.uniform(-0.2, 0.2), CENTER[1] + rng.uniform(-0.2, 0.2),
+                     'business' if i % 4 == 0 else 'person') for i in range(2000)}
+
+
+@pytest.fixture(scope='module')
+def index(points):
+    index = GeoGridIndex(cell_deg=0.01)
+    for point_id, (lat, lng, kind) in points.items():
+        index.upsert(point_id, lat, lng, kind)
+    return index
+
+
+def brute_force(points, lat, lng, kind, exclude_id=None):
+    return sorted((haversine_km(lat, lng, plat, plng), point_id) for point_id, (plat, plng, pkind) in points.items()
+                  if pkind == kind and point_id != exclude_id)
+
+
+@pytest.mark.parametrize('radius_km', [0.3, 2.0, 9.0])
+@pytest.mark.parametrize('kind', ['person', 'business'])
+def test_within_radius_matches_brute_force(index, points, radius_km, kind):
+    expected = [point_id for distance, point_id in brute_force(points, *CENTER, kind) if distance <= radius_km]
+    hits = index.within_radius(*CENTER, radius_km, kind)
+    assert [point_id for point_id, _ in hits] == expected
+    assert all(points[point_id][2] == kind for point_id, _ in hits)
+
+
+def test_within_radius_limit_and_exclude(index, points):
+    expected = brute_force(points, *CENTER, 'person', exclude_id='1')
+    hits = index.within_radius(*CENTER, 5.0, 'person', limit=10, exclude_id='1')
+    assert [point_id for point_id, _ in hits] == [point_id for _, point_id in expected[:10]]
+    assert [distance for _, distance in hits] == pytest.approx([distance for distance, _ in expected[:10]])
+
+
+@pytest.mark.parametrize('k', [1, 5, 50])
+@pytest.mark.parametrize('origin', [CENTER, (40.95, -73.80), (41.5, -73.0)])
+def test_nearest_matches_brute_force(index, points, k, origin):
+    expected = brute_force(points, *origin, 'business')[:k]
+    assert [point_id for point_id, _ in index.nearest(*origin, k, 'business')] == [i for _, i in expected]
+
+
+def test_nearest_respects_max_radius(index, points):
+    hits = index.nearest(*CENTER, 100, 'person', max_radius_km=1.0)
+    assert hits and all(distance <= 1.0 for _, distance in hits)
+    assert len(hits) == len([d for d, _ in brute_force(points, *CENTER, 'person') if d <= 1.0])
+
+
+def test_moved_and_removed_points():
+    index = GeoGridIndex(cell_deg=0.01)
+    index.upsert('a', *CENTER, 'person')
+    index.upsert('a', CENTER[0] + 0.5, CENTER[1], 'person')
+    assert index.within_radius(*CENTER, 1.0, 'person') == []
+    assert [point_id for point_id, _ in index.nearest(*CENTER, 1, 'person')] == ['a']
+    index.remove('a')
+    assert index.nearest(*CENTER, 1, 'person') == []
+    assert index.get('a') is None
@@ -0,0 +1,82 @@
+import base64
+import json
+
+import pytest
+
+from conftest import login
+from pagination import decode_cursor, encode_cursor, page_limit
+
+
+def raw_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    row = {'created_at': '2024-05-01T12:30:00.123456+00:00', 'id': '6f1c2e8a-3b7d-4c1e-9a2f-0d5e6b7c8d9e'}
+    assert decode_cursor(encode_cursor(row)) == (row['created_at'], row['id'])
+    assert decode_cursor(encode_cursor({'created_at': '2024-05-01 12:30', 'id': 7})) == ('2024-05-01 12:30', 7)
+
+
+@pytest.mark.parametrize('cursor', [
+    'garbage',
+    raw_cursor('2024-05-01T12:30:00', 'x") or id.gt.("'),
+    raw_cursor('2024-13-01T12:30:00', 1),
+    raw_cursor('yesterday', 1),
+    raw_cursor('2024-05-01T12:30:00', True),
+    raw_cursor('2024-05-01T12:30:00', 1, 2),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_summary_cursor_ids_have_two_parts():
+    owner_other = '1:2'
+    assert decode_cursor(raw_cursor('2024-05-01T12:30:00', owner_other), id_parts=2)[1] == owner_other
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor('2024-05-01T12:30:00', owner_other))
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor('2024-05-01T12:30:00', '1'), id_parts=2)
+
+
+def test_page_limit():
+    assert page_limit(None, 20, 100) == 20
+    assert page_limit(500, 20, 100) == 100
+    assert page_limit(5, 20, 100) == 5
+    for limit in (0, -5):
+        with pytest.raises(ValueError):
+            page_limit(limit, 20, 100)
+
+
+@pytest.mark.parametrize('path', [
+    '/api/forum?cursor=garbage',
+    '/api/forum?limit=0',
+    '/api/forum?limit=-5',
+    '/api/forum?scope=neighborhood&limit=-5',
+    '/api/conversations?cursor=garbage',
+    '/api/conversations?limit=0',
+])
+def test_bad_paging_parameters_get_400(client, server, path):
+    login(client, server, 'john@example.com')
+    response = client.get(path)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def forum_chain(client, limit):
+    posts, cursor = [], None
+    while True:
+        page = client.get(f'/api/forum?limit={limit}' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        posts += page['posts']
+        cursor = page['next_cursor']
+        if not cursor:
+            return posts
+
+
+def test_forum_pages_chain_without_gaps_or_repeats(client, server):
+    login(client, server, 'john@example.com')
+    small, large = forum_chain(client, 7), forum_chain(client, 50)
+    assert len(small) > 7
+    assert [post['id'] for post in small] == [post['id'] for post in large]
+    assert len({post['id'] for post in small}) == len(small)
+    assert [post['created_at'] for post in small] == sorted((post['created_at'] for post in small), reverse=True)
@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import login, user_by_email
+from review_stats import apply_review, totals_of
+
+
+def test_apply_review_adds_and_moves_stars():
+    totals = apply_review(totals_of({}), 5)
+    totals = apply_review(totals, 2)
+    assert totals == {'review_count': 2, 'rating_sum': 7, 'rating_histogram': [0, 1, 0, 0, 1], 'rating': 3.5}
+    edited = apply_review(totals, 4, previous=2)
+    assert edited == {'review_count': 2, 'rating_sum': 9, 'rating_histogram': [0, 0, 0, 1, 1], 'rating': 4.5}
+
+
+def test_totals_of_an_unreviewed_business():
+    assert totals_of({'rating': 4.2}) == {'review_count': 0, 'rating_sum': 0,
+                                          'rating_histogram': [0, 0, 0, 0, 0], 'rating': None}
+
+
+def test_review_totals_through_the_api(client, server):
+    business = user_by_email(server, 'hello@bookcorner.com')
+    path = f'/api/businesses/{business["id"]}/reviews'
+    for email, stars in (('mike@example.com', 5), ('emma@example.com', 3), ('alex@example.com', 4)):
+        login(client, server, email)
+        assert client.post(path, json={'rating': stars, 'comment': f'{stars} stars'}).status_code == 201
+
+    # alex changes their mind: the review is replaced, not added
+    response = client.post(path, json={'rating': 1, 'comment': 'changed'})
+    assert response.status_code == 200
+    expected = {'review_count': 3, 'rating_sum': 9, 'rating_histogram': [1, 0, 1, 0, 1], 'rating': 3.0}
+    assert response.get_json()['totals'] == expected
+
+    page = client.get(path).get_json()
+    assert page['totals'] == expected
+    assert sorted(review['rating'] for review in page['reviews']) == [1, 3, 5]
+    stored = server.tables['users'].rows[business['id']]
+    assert totals_of(stored) == expected
+
+
+@pytest.mark.parametrize('body, status', [
+    ({'rating': 4.5}, 400),
+    ({'rating': 9}, 400),
+    ({'rating': 'five'}, 400),
+])
+def test_invalid_reviews_are_rejected(client, server, body, status):
+    business = user_by_email(server, 'info@centralgym.com')
+    login(client, server, 'john@example.com')
+    assert client.post(f'/api/businesses/{business["id"]}/reviews', json=body).status_code == status
+
+
+def test_businesses_cannot_review_themselves_or_people(client, server):
+    business = login(client, server, 'info@centralgym.com', password='business123')
+    assert client.post(f'/api/businesses/{business["id"]}/reviews', json={'rating': 5}).status_code == 403
+    person = user_by_email(server, 'john@example.com')
+    assert client.post(f'/api/businesses/{person["id"]}/reviews', json={'rating': 5}).status_code == 404
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from conftest import login, user_by_email
+from supabase_client import SupabaseError
+
+
+@pytest.fixture
+def indexes_ready(app_module):
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            app_module.get_geo_index()
+            app_module.get_search_index()
+            return
+        except SupabaseError:
+            assert time.monotonic() < deadline, 'the indexes never finished loading'
+            time.sleep(0.05)
+
+
+def search(client, query, latitude, longitude):
+    response = client.get(f'/api/search?q={query}&lat={latitude}&lng={longitude}')
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_a_moved_business_is_found_at_its_new_place(client, server, indexes_ready):
+    market = user_by_email(server, 'contact@freshmarket.com')
+    origin = (market['latitude'], market['longitude'])
+    login(client, server, 'contact@freshmarket.com', password='business123')
+    hit = next(r for r in search(client, 'fresh market', *origin) if r['id'] == market['id'])
+    assert hit['distance_km'] < 0.1
+
+    assert client.post('/api/location', json={'latitude': origin[0] + 0.1, 'longitude': origin[1]}).status_code == 202
+    assert server.tables['users'].rows[market['id']]['latitude'] == pytest.approx(origin[0] + 0.1)
+    moved = next(r for r in search(client, 'fresh market', *origin) if r['id'] == market['id'])
+    assert moved['distance_km'] == pytest.approx(11.1, abs=0.2)
+    assert moved['business_name'] == 'Fresh Market NYC'
@@ -0,0 +1,41 @@
+import seed
+from heatmap import MIN_ZOOM, HexGrid
+from storage import MemoryBackend
+
+
+def table_sizes(server):
+    return {name: len(server.tables[name].rows) for name in ('users', 'forum_posts')}
+
+
+def heat_total(server):
+    return sum(cell['count'] for cell in server.tables['heatmap_cells'].rows.values())
+
+
+def test_reloading_the_demo_changes_nothing(app_module, server):
+    before = table_sizes(server), heat_total(server)
+    assert seed.main(['--demo']) == 0
+    assert (table_sizes(server), heat_total(server)) == before
+
+
+def test_seeding_twice_with_one_seed_inserts_once(app_module, server):
+    args = ['--users', '40', '--posts', '60', '--seed', '7']
+    sizes, heat = table_sizes(server), heat_total(server)
+    assert seed.main(args) == 0
+    once = table_sizes(server), heat_total(server)
+    assert once[0] == {'users': sizes['users'] + 40, 'forum_posts': sizes['forum_posts'] + 60}
+    assert once[1] > heat
+    assert seed.main(args) == 0
+    assert (table_sizes(server), heat_total(server)) == once
+
+
+def test_memory_backend_skips_ids_it_already_has():
+    backend = MemoryBackend(0.05, heat_grid=HexGrid())
+    users = list(seed.generate_users(30, 'x', seed=3))
+    posts = list(seed.generate_posts(50, users, 0.05, seed=3))
+    for _ in range(2):
+        backend.bulk_insert('users', users)
+        backend.bulk_insert('forum_posts', posts)
+    assert len(list(backend.iter_users('person'))) + len(list(backend.iter_users('business'))) == 30
+    assert len(backend.get_posts(limit=1000)) == 50
+    last_tile = 2 ** MIN_ZOOM - 1
+    assert sum(cell['count'] for cell in backend.get_heat(MIN_ZOOM, 0, 0, last_tile, last_tile)) == 30 + 50
@@ -0,0 +1,14 @@
+import pytest
+
+import bench_startup
+
+
+@pytest.mark.parametrize('mode', [[], ['--unreachable']], ids=['mock', 'unreachable'])
+def test_first_response_within_budget(mode):
+    assert bench_startup.main(['--runs', '2', *mode]) == 0
+
+
+def test_health_shows_the_supabase_probe(client):
+    health = client.get('/health').get_json()
+    assert health['supabase_health']['healthy'] is True
+    assert health['supabase_health']['error'] is None
@@ -0,0 +1,96 @@
+"""
+Bounded LRU + TTL cache of user rows.
+
+Rows are stored once by id and can be looked up by id, email or username.
+Writers call ``invalidate`` so a registration or profile/location update
+is never served stale from this process; the TTL bounds staleness for
+writes made by other workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+LOOKUP_FIELDS = ('id', 'email', 'username')
+
+
+class UserCache:
+    def __init__(self, max_entries=10000, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._rows = OrderedDict()          # id -> (expires_at, row), oldest first
+        self._aliases = {'email': {}, 'username': {}}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.request_hits = 0               # served from the per-request memo (see app.cached_user)
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, field, value):
+        """Return the cached row for ``field == value`` or None on a miss."""
+        with self._lock:
+            user_id = value if field == 'id' else self._aliases[field].get(value)
+            entry = self._rows.get(user_id) if user_id is not None else None
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(user_id)
+                self.misses += 1
+                return None
+            self._rows.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, row):
+        if not row or row.get('id') is None:
+            return
+        with self._lock:
+            self._drop(row['id'])
+            self._rows[row['id']] = (time.monotonic() + self.ttl, row)
+            for field, aliases in self._aliases.items():
+                if row.get(field) is not None:
+                    aliases[row[field]] = row['id']
+            while len(self._rows) > self.max_entries:
+                self._drop(next(iter(self._rows)))
+                self.evictions += 1
+
+    def invalidate(self, user_id=None, email=None, username=None):
+        """Forget a user by any of its keys (all of them are dropped together)."""
+        with self._lock:
+            for field, value in (('email', email), ('username', username)):
+                if value is not None:
+                    alias_id = self._aliases[field].pop(value, None)
+                    if alias_id is not None:
+                        self._drop(alias_id)
+            if user_id is not None:
+                self._drop(user_id)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            for aliases in self._aliases.values():
+                aliases.clear()
+
+    def _drop(self, user_id):
+        entry = self._rows.pop(user_id, None)
+        if entry is None:
+            return
+        row = entry[1]
+        for field, aliases in self._aliases.items():
+            if aliases.get(row.get(field)) == user_id:
+                del aliases[row[field]]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._rows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'request_hits': self.request_hits,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }